@@ -1,4 +1,5 @@
 from nepta.dataformat.attachments import Compression
 from nepta.dataformat.attachments import Types as AttachmentTypes
+from nepta.dataformat.cache import SectionCache
 from nepta.dataformat.package import DataPackage, FileFlags
 from nepta.dataformat.section import Section
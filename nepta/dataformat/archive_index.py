@@ -0,0 +1,117 @@
+import io
+import logging
+import os
+import posixpath
+from functools import lru_cache
+from tarfile import TarFile
+
+from nepta.dataformat.compression import SeekPoints, get_codec
+from nepta.dataformat.exceptions import DataFormatBadTypeError, DataFormatFileNotFoundError
+
+logger = logging.getLogger(__name__)
+
+_MAX_LINKS = 16
+
+
+class _MemberFile(io.RawIOBase):
+    # readable window of decompressed stream of archive containing content of single member
+
+    def __init__(self, stream, size):
+        super().__init__()
+        self._stream = stream
+        self._remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self._remaining:
+            return 0
+        view = memoryview(b)[: self._remaining]
+        n = self._stream.readinto(view)
+        if not n:
+            raise EOFError('Archive ended before the end of member')
+        self._remaining -= n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+class ArchiveIndex:
+    """
+    Index of members of compressed tar archive, members are read by seeking to their offsets without extraction of
+    the archive. The index is built by single pass through the archive. Codecs supporting random access (gz) record
+    seek points during the pass, so reading of member resumes decompression close to the member, other codecs
+    decompress the archive only up to the end of the member.
+
+    Use `get_archive_index` to share indexes of unchanged archives.
+
+    :param path: path of archive
+    :param codec: codec of archive, see `nepta.dataformat.compression`
+    """
+
+    def __init__(self, path, codec):
+        self.path = path
+        self.codec = codec
+        self._seek_points = SeekPoints()
+        logger.info(f'Indexing archive: {path}')
+        with codec.open_stream(path, self._seek_points) as stream, TarFile.open(fileobj=stream, mode='r:') as tf:
+            self.members = {tarinfo.name: tarinfo for tarinfo in tf}
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def getnames(self):
+        return list(self.members)
+
+    def getmember(self, name):
+        """
+        Return `TarInfo` of member, links are followed.
+        """
+        for _ in range(_MAX_LINKS):
+            try:
+                tarinfo = self.members[name]
+            except KeyError:
+                raise DataFormatFileNotFoundError(f'{name} is not in archive {self.path}') from None
+            if tarinfo.issym():
+                name = posixpath.normpath(posixpath.join(posixpath.dirname(name), tarinfo.linkname))
+            elif tarinfo.islnk():
+                name = tarinfo.linkname
+            else:
+                return tarinfo
+        raise DataFormatBadTypeError(f'Too many levels of links of {name} in archive {self.path}')
+
+    def open(self, name):
+        """
+        Open member for binary reading.
+        """
+        tarinfo = self.getmember(name)
+        if not tarinfo.isfile() or tarinfo.issparse():
+            raise DataFormatBadTypeError(f'{name} is not a regular file in archive {self.path}')
+        stream = self.codec.open_stream(self.path, self._seek_points)
+        try:
+            stream.seek(tarinfo.offset_data)
+        except BaseException:
+            stream.close()
+            raise
+        return io.BufferedReader(_MemberFile(stream, tarinfo.size))
+
+    def read(self, name):
+        with self.open(name) as f:
+            return f.read()
+
+
+@lru_cache(maxsize=32)
+def _cached_index(path, codec_name, mtime_ns, size):  # noqa: ARG001
+    return ArchiveIndex(path, get_codec(codec_name))
+
+
+def get_archive_index(path, codec):
+    """
+    Return cached index of archive, the index is built again when the archive is changed.
+    """
+    stat = os.stat(path)
+    return _cached_index(os.path.abspath(path), codec.name, stat.st_mtime_ns, stat.st_size)
@@ -1,15 +1,34 @@
+import io
 import logging
 import os
+import posixpath
 import re
 import shutil
-from dataclasses import dataclass
+import stat
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import MISSING, dataclass, fields
 from enum import Enum
-from tarfile import TarFile
+from tarfile import BLOCKSIZE, DIRTYPE, NUL, TarInfo
+from tempfile import SpooledTemporaryFile
 from uuid import uuid4
 
-from nepta.dataformat.decorators import readonly_check_methods
-from nepta.dataformat.exceptions import DataFormatBadTypeError, DataFormatDuplicateKeyError
+from nepta.dataformat.archive_index import get_archive_index
+from nepta.dataformat.cas import ContentStore
+from nepta.dataformat.compression import get_codec
+from nepta.dataformat.decorators import readonly_check_methods, track_changes_methods
+from nepta.dataformat.exceptions import (
+    DataFormatBadTypeError,
+    DataFormatCompressionError,
+    DataFormatDuplicateKeyError,
+    DataFormatFileExistsError,
+    DataFormatFileNotFoundError,
+)
 from nepta.dataformat.section import Section
+from nepta.dataformat.series import SeriesReader, SeriesWriter, create_series
+from nepta.dataformat.vfs import LOCAL_FS
 from nepta.dataformat.xml_file import XMLFile
 
 logger = logging.getLogger(__name__)
@@ -18,9 +37,7 @@ logger = logging.getLogger(__name__)
 class _EnumFinder(Enum):
     @classmethod
     def from_value(cls, value):
-        for _, member in cls.__members__.items():
-            if member.value == value:
-                return member
+        return cls._value2member_map_.get(value)
 
     def __str__(self):
         return self.value
@@ -31,13 +48,25 @@ class Types(_EnumFinder):
     DIRECTORY = 'Directory'
     COMMAND = 'Command'
     URL = 'Url'
+    SERIES = 'Series'  # binary file of numeric samples, see `nepta.dataformat.series`
 
 
 class Compression(_EnumFinder):
+    """
+    Compression of attachment archives, the value is suffix of the archive. Each compression is implemented by codec
+    registered in `nepta.dataformat.compression`, ZSTD and LZ4 codecs require optional libraries.
+    """
+
     NONE = 'None'
     ZIP = 'gz'
     BZIP2 = 'bz2'
     XZ = 'xz'
+    ZSTD = 'zst'
+    LZ4 = 'lz4'
+
+    @property
+    def codec(self):
+        return get_codec(self.value)
 
 
 @dataclass(frozen=True)
@@ -57,8 +86,20 @@ class Path:
             return f.read()
 
     def write(self, content):
-        with open(os.path.join(self.root_dir, self.path), 'w') as f:
-            f.write(content)
+        # content is written into new file, so other hardlinks of deduplicated file are not changed
+        path = os.path.join(self.root_dir, self.path)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(content)
+            if os.path.exists(path):
+                # mode of the file is kept, only deduplicated file made read-only by `ContentStore` is writable again
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode) | stat.S_IWUSR)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
 
 @dataclass(frozen=True)
@@ -69,6 +110,8 @@ class Attachment:
     uuid: str
     alias: str = None
     compression: Compression = Compression.NONE
+    typecode: str = None  # `array` typecode of samples of series
+    compression_level: int = None  # None means the default level of the codec
 
     @property
     def archive_path(self):
@@ -77,9 +120,465 @@ class Attachment:
         else:
             return self.path.full_path
 
+    def open_archive(self):
+        """
+        Open compressed attachment for reading, return `TarFile` of its archive.
+        """
+        if self.compression is Compression.NONE:
+            raise DataFormatBadTypeError(f'Attachment {self.uuid} is not compressed')
+        return self.compression.codec.tar_reader(self.archive_path)
+
+    def _archive_index(self):
+        return get_archive_index(self.archive_path, self.compression.codec)
+
+    def members(self):
+        """
+        Return sorted names of files of directory attachment relative to the attachment. Names of compressed
+        attachment are listed from cached index of its archive, see `ArchiveIndex`.
+        """
+        if self.name is not Types.DIRECTORY:
+            raise DataFormatBadTypeError(f'Attachment {self.uuid} is not a directory')
+        if self.compression is Compression.NONE:
+            return sorted(
+                os.path.relpath(os.path.join(root, file), self.path.full_path).replace(os.sep, '/')
+                for root, _, files in os.walk(self.path.full_path)
+                for file in files
+            )
+        prefix = f'{self.uuid}/'
+        return sorted(
+            name[len(prefix) :]
+            for name, tarinfo in self._archive_index().members.items()
+            if name.startswith(prefix) and not tarinfo.isdir()
+        )
+
+    def open_member(self, name=None):
+        """
+        Open file of attachment for binary reading. File of compressed attachment is read directly from its archive
+        without extraction, offsets of members are cached in index of the archive, see `ArchiveIndex`.
+
+        :param name: path of file relative to directory attachment, None for file attachment
+        """
+        name = _member_name(self, name)
+        if self.compression is not Compression.NONE:
+            return self._archive_index().open(name)
+        path = os.path.join(self.path.root_dir, os.path.dirname(self.path.path), name)
+        if not os.path.isfile(path):
+            raise DataFormatFileNotFoundError(f'{name} is not a file of attachment {self.uuid}')
+        return open(path, 'rb')
+
+    def read_member(self, name=None):
+        """
+        Read content of file of attachment, see `open_member`.
+        """
+        with self.open_member(name) as f:
+            return f.read()
+
+    def open_writer(self, size=None, spool_size=None):
+        """
+        Open writer streaming content of compressed attachment directly into its archive, see `AttachmentWriter`.
+        """
+        if self.compression is Compression.NONE:
+            raise DataFormatBadTypeError(f'Attachment {self.uuid} is not compressed, write its path directly')
+        if os.path.exists(self.path.full_path):
+            raise DataFormatFileExistsError(f'Attachment {self.uuid} already has uncompressed content')
+        return AttachmentWriter(self, size, spool_size)
+
+    def _check_series(self):
+        if self.name is not Types.SERIES:
+            raise DataFormatBadTypeError(f'Attachment {self.uuid} is not a series')
+
+    def series_reader(self):
+        """
+        Open memory mapped reader of samples of series attachment, see `SeriesReader`.
+        """
+        self._check_series()
+        return SeriesReader(self.path.full_path)
+
+    def series_writer(self, buffer_size=4096):
+        """
+        Open writer appending samples to series attachment, see `SeriesWriter`.
+        """
+        self._check_series()
+        return SeriesWriter(self.path.full_path, buffer_size)
+
+
+def _member_name(attachment, name):
+    # name of archive member of attachment file, i.e. relative to directory containing the attachment
+    if attachment.name is not Types.DIRECTORY:
+        if name is not None:
+            raise DataFormatBadTypeError(f'Attachment {attachment.uuid} is not a directory')
+        return attachment.uuid
+
+    if name is None:
+        raise DataFormatBadTypeError('Files of directory attachment need a name')
+    name = posixpath.normpath(name.replace(os.sep, '/'))
+    if name.startswith(('/', '..')) or name == '.':
+        raise DataFormatBadTypeError(f'Invalid name of file of attachment: {name}')
+    return f'{attachment.uuid}/{name}'
+
+
+def _tmp_archive(archive):
+    return f'{archive}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def _publish_archive(f, tmp_archive, archive):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(tmp_archive, archive)
+
+
+def _compress(source, archive, compression, level=None):
+    """
+    Compress file or directory into tar archive and remove the source. Archive is written into temporary file first,
+    so neither interrupted compression nor failure leaves incomplete archive or removes the source.
+    """
+    logger.info(f'Compressing attachment: {source}')
+    tmp_archive = _tmp_archive(archive)
+    try:
+        with open(tmp_archive, 'wb') as f:
+            # archive name is passed to keep the same metadata (e.g. gzip header) as if it was written directly
+            with get_codec(compression).tar_writer(archive, f, level) as tf:
+                tf.add(source, os.path.basename(source))
+            _publish_archive(f, tmp_archive, archive)
+    except BaseException:
+        if os.path.exists(tmp_archive):
+            os.remove(tmp_archive)
+        raise
+
+    if os.path.isdir(source):
+        shutil.rmtree(source)
+    else:
+        os.remove(source)
+
+
+class _ArchiveMember(io.RawIOBase):
+    # writable stream of single member of archive, content of declared size is streamed directly into the compressed
+    # stream of the archive after its header, content of unknown size is spooled and added by `TarFile.addfile` when
+    # the member is closed
+
+    def __init__(self, writer, tarinfo, size, spool_size):
+        super().__init__()
+        self._writer = writer
+        self._tarinfo = tarinfo
+        self._remaining = size
+        if size is None:
+            self._spool = SpooledTemporaryFile(spool_size, dir=os.path.dirname(writer.attachment.archive_path))
+        else:
+            self._spool = None
+            tar = writer._tar
+            tarinfo.size = size
+            header = tarinfo.tobuf(tar.format, tar.encoding, tar.errors)
+            tar.fileobj.write(header)
+            tar.offset += len(header)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('write to closed member')
+        if self._spool is not None:
+            return self._spool.write(data)
+        if len(data) > self._remaining:
+            self._writer._failed = True
+            raise ValueError(f'Member {self._tarinfo.name} exceeds its size {self._tarinfo.size}')
+        self._writer._tar.fileobj.write(data)
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        tar = self._writer._tar
+        self._writer._member = None
+        if self._spool is not None:
+            with self._spool:
+                self._tarinfo.size = self._spool.tell()
+                self._spool.seek(0)
+                tar.addfile(self._tarinfo, self._spool)
+            return
+
+        # the same padding and bookkeeping as `TarFile.addfile`, the archive stays well-formed even if it fails
+        written = self._tarinfo.size - self._remaining
+        blocks, remainder = divmod(written, BLOCKSIZE)
+        if remainder:
+            tar.fileobj.write(NUL * (BLOCKSIZE - remainder))
+            blocks += 1
+        tar.offset += blocks * BLOCKSIZE
+        tar.members.append(self._tarinfo)
+        if self._remaining:
+            self._writer._failed = True
+            raise ValueError(f'Member {self._tarinfo.name} is incomplete, {self._remaining} bytes are missing')
+
+
+class AttachmentWriter:
+    """
+    Writer streaming content of compressed attachment directly into its archive, so the attachment is never stored
+    uncompressed and it does not need to be compressed by `AttachmentCollection.save`. The archive has the same format
+    as archive created by the save. It is written into temporary file and published when the writer is closed, the
+    writer is context manager which discards the archive if its block fails.
+
+    Content of file (command, url) attachment is written by `write` or `add`, members of directory attachment are
+    written by `open` or `add`. Tar format needs size of each member before its content, so content of unknown size is
+    spooled, in memory up to `spool_size` and in temporary file next to the archive above it. Pass `size` to stream
+    the content directly into the archive without spooling, content of different size fails the writer.
+
+    :param attachment: compressed attachment
+    :param size: size of content of file attachment, if known in advance, content of different size is rejected
+    :param spool_size: max size of member spooled in memory
+    """
+
+    SPOOL_SIZE = 16 * 1024 * 1024
+
+    def __init__(self, attachment, size=None, spool_size=None):
+        self.attachment = attachment
+        self.size = size
+        self.spool_size = self.SPOOL_SIZE if spool_size is None else spool_size
+        self._member = None
+        self._members = 0
+        self._failed = False
+        self._dirs = {''}
+
+        archive = attachment.archive_path
+        self._tmp_archive = _tmp_archive(archive)
+        self._file = open(self._tmp_archive, 'wb')
+        try:
+            self._tar = attachment.compression.codec.tar_writer(archive, self._file, attachment.compression_level)
+            if self.is_directory:
+                self._add_dir(attachment.uuid)
+        except BaseException:
+            self._file.close()
+            os.remove(self._tmp_archive)
+            raise
 
-@readonly_check_methods('new', 'save', '__setattr__')
+    @property
+    def is_directory(self):
+        return self.attachment.name is Types.DIRECTORY
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def _add_dir(self, name):
+        tarinfo = TarInfo(name)
+        tarinfo.type = DIRTYPE
+        tarinfo.mode = 0o755
+        tarinfo.mtime = time.time()
+        self._tar.addfile(tarinfo)
+        self._dirs.add(name)
+
+    def _member_name(self, name):
+        if self.closed:
+            raise ValueError('Attachment writer is closed')
+        if self._member is not None:
+            self._member.close()
+
+        name = _member_name(self.attachment, name)
+        if not self.is_directory and self._members:
+            raise DataFormatBadTypeError(f'Content of attachment {self.attachment.uuid} was already written')
+        parent = posixpath.dirname(name)
+        missing = []
+        while parent not in self._dirs:
+            missing.append(parent)
+            parent = posixpath.dirname(parent)
+        for parent in reversed(missing):
+            self._add_dir(parent)
+        self._members += 1
+        return name
+
+    def open(self, name=None, size=None):
+        """
+        Open writable stream of new member, previously opened member is closed.
+
+        :param name: path of member relative to directory attachment, None for file attachment
+        :param size: size of content, if known in advance, content of different size is rejected
+        """
+        tarinfo = TarInfo(self._member_name(name))
+        tarinfo.mode = 0o644
+        tarinfo.mtime = time.time()
+        self._member = _ArchiveMember(self, tarinfo, size, self.spool_size)
+        return self._member
+
+    def add(self, path, name=None):
+        """
+        Add existing file or directory as member, e.g. output of a tool.
+
+        :param path: path of added file or directory
+        :param name: path of member relative to directory attachment, None for file attachment
+        """
+        self._tar.add(path, self._member_name(name))
+
+    def write(self, data):
+        """
+        Write next chunk of content of file attachment.
+        """
+        if self._member is None:
+            self.open(size=self.size)
+        return self._member.write(data)
+
+    def close(self):
+        """
+        Finish the archive and replace archive of the attachment by it.
+        """
+        if self.closed:
+            return
+        try:
+            if self._member is not None:
+                self._member.close()
+            if self._failed:
+                raise ValueError(f'Archive of attachment {self.attachment.uuid} is incomplete')
+            self._tar.close()
+            _publish_archive(self._file, self._tmp_archive, self.attachment.archive_path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """
+        Discard the archive, archive of the attachment is not changed.
+        """
+        if self._member is not None:
+            self._member.discard()
+            self._member = None
+        self._file.close()
+        if os.path.exists(self._tmp_archive):
+            os.remove(self._tmp_archive)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# values of fields of attachments missing in metadata, as they are written into metadata
+_FIELD_DEFAULTS = {
+    field.name: None if field.default in (None, MISSING) else str(field.default) for field in fields(Attachment)
+}
+# typecode of series attachments missing in metadata
+_SERIES_TYPECODE = 'd'
+
+
+def _load_attachment(root_dir, params):
+    params = dict(params)
+    params['path'] = Path(root_dir, params['path'])
+    params['name'] = Types.from_value(params['name'])
+    if 'compression' in params:
+        params['compression'] = Compression.from_value(params['compression'])
+    if 'compression_level' in params:
+        params['compression_level'] = int(params['compression_level'])
+    if params['name'] is Types.SERIES:
+        params.setdefault('typecode', _SERIES_TYPECODE)
+    return Attachment(**params)
+
+
+def _dump_attachment(attachment):
+    # fields at their defaults are not written, so metadata stay readable by older versions
+    params = dict(attachment.__dict__)
+    for field in ('alias', 'typecode', 'compression_level'):
+        if params[field] is None:
+            params.pop(field)
+    if params.get('typecode') == _SERIES_TYPECODE:
+        params.pop('typecode')
+    return params
+
+
+def _record_value(record, field):
+    value = record.get(field, _FIELD_DEFAULTS[field])
+    if value is None and field == 'typecode' and record['name'] == Types.SERIES.value:
+        return _SERIES_TYPECODE
+    return value
+
+
+class _AttachmentList:
+    """
+    List of attachments, attachments loaded from metadata are created on first access. Indexes of values of fields
+    are built on first lookup and kept updated by `append`.
+    """
+
+    __slots__ = ('_root_dir', '_records', '_attachments', '_indexes')
+
+    def __init__(self, root_dir, records=()):
+        self._root_dir = root_dir
+        self._records = list(records)
+        self._attachments = [None] * len(self._records)
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self._attachments)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        attachment = self._attachments[item]
+        if attachment is None:
+            attachment = self._attachments[item] = _load_attachment(self._root_dir, self._records[item])
+        return attachment
+
+    def __iter__(self):
+        for i in range(len(self._attachments)):
+            yield self[i]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def append(self, attachment):
+        self._records.append(None)
+        self._attachments.append(attachment)
+        for field, index in self._indexes.items():
+            index.setdefault(self._value(len(self) - 1, field), []).append(len(self) - 1)
+
+    def _value(self, i, field):
+        attachment = self._attachments[i]
+        if attachment is None:
+            return _record_value(self._records[i], field)
+        value = getattr(attachment, field)
+        return None if value is None else str(value)
+
+    def index(self, field):
+        """
+        Return index of field, mapping of values (as stored in metadata) to lists of positions of attachments.
+        """
+        index = self._indexes.get(field)
+        if index is None:
+            if field not in _FIELD_DEFAULTS:
+                raise DataFormatBadTypeError(f'Attachments have no field {field}')
+            index = self._indexes[field] = {}
+            for i in range(len(self)):
+                index.setdefault(self._value(i, field), []).append(i)
+        return index
+
+    def positions(self, field, value):
+        return self.index(field).get(None if value is None else str(value), ())
+
+    def records(self):
+        """
+        Yield params of attachments as they are stored in metadata, without creating the attachments.
+        """
+        for record, attachment in zip(self._records, self._attachments):
+            yield _dump_attachment(attachment) if record is None else record
+
+
+@readonly_check_methods('new', 'new_from', 'save', 'deduplicate', '__setattr__')
+@track_changes_methods('new', 'new_from', '__setattr__')
 class AttachmentCollection:
+    """
+    Collection of attachments of package, use `open` or `create`.
+
+    :param collection: `_AttachmentList` or sequence of `Attachment` objects
+    :param alias_map: deprecated and ignored, aliases are indexed from the collection
+    """
+
     META_FILE = 'attachments.xml'
     ATTCH_DIR = 'attachments'
     ELEM_NAME = 'attachment'
@@ -89,36 +588,59 @@ class AttachmentCollection:
     FILE_MAX_LEN = 50
 
     @classmethod
-    def open(cls, path, readonly=False):
-        attachment_metas = XMLFile.open(os.path.join(path, cls.META_FILE))
-        collection = []
-        alias_map = {}
-
-        for attachment in attachment_metas.root:
-            attachment.params['path'] = Path(path, attachment.params['path'])
-            attachment.params['name'] = Types.from_value(attachment.params['name'])
-            if 'compression' in attachment.params.keys():
-                attachment.params['compression'] = Compression.from_value(attachment.params['compression'])
-            collection.append(Attachment(**attachment.params))
-            if 'alias' in attachment.params.keys():
-                alias_map[attachment.params['alias']] = collection[-1]
-
-        return cls(path, attachment_metas, collection, alias_map, readonly)
+    def open(cls, path, readonly=False, content_store=None, fs=None):
+        """
+        Open collection of attachments. Only params of attachments are loaded from metadata, `Attachment` objects are
+        created on first access.
+
+        :param fs: filesystem of the package (see `nepta.dataformat.vfs`), only metadata are read through it
+        """
+        fs = fs or LOCAL_FS
+        readonly = readonly or not fs.writable
+        meta_path = os.path.join(path, cls.META_FILE)
+        attachment_metas = XMLFile.open(meta_path, readonly, fs=fs)
+        records = [section.params for section in attachment_metas.root if section.name == cls.ELEM_NAME]
+        return cls(
+            path, attachment_metas, _AttachmentList(path, records), readonly=readonly, content_store=content_store
+        )
 
     @classmethod
-    def create(cls, path):
+    def create(cls, path, content_store=None):
         os.mkdir(os.path.join(path, cls.ATTCH_DIR))
         att_meta = XMLFile.create(os.path.join(path, cls.META_FILE))
         att_meta.root = Section(cls.ROOT_NAME)
-        return cls(path, att_meta, [], {}, False)
-
-    def __init__(self, path, att_meta, collection, alias_map, readonly):
+        collection = cls(path, att_meta, _AttachmentList(path), content_store=content_store)
+        collection._modified = True
+        return collection
+
+    def __init__(self, path, att_meta, collection, alias_map=None, readonly=False, *, content_store=None):
+        if alias_map is not None:
+            warnings.warn(
+                'alias_map argument of AttachmentCollection is deprecated and ignored', DeprecationWarning, stacklevel=2
+            )
+        if not isinstance(collection, _AttachmentList):
+            attachments = collection
+            collection = _AttachmentList(path)
+            for att in attachments:
+                collection.append(att)
         self.path = path
         self.att_meta = att_meta
         self.collection = collection
-        self.alias_map = alias_map
+        self.content_store = content_store
+        self._new = []
+        self._alias_map = None
+        self._modified = False
         self._readonly = readonly
 
+    @property
+    def modified(self):
+        """
+        True if any attachment was added since the collection was opened or saved or if any compressed attachment
+        still has uncompressed content, which is compressed by `save` (e.g. content written after the collection was
+        reopened or content whose compression failed).
+        """
+        return self._modified or bool(self._uncompressed())
+
     def __str__(self):
         return f'{self.__class__.__name__}: {self.path}{self.SPACE}{self.SPACE.join(map(str, self.collection))}'
 
@@ -129,39 +651,140 @@ class AttachmentCollection:
         return len(self.collection)
 
     def __getitem__(self, item):
-        return self.alias_map[item]
+        positions = self.collection.positions('alias', item)
+        if not positions:
+            raise KeyError(item)
+        return self.collection[positions[-1]]
+
+    @property
+    def alias_map(self):
+        """
+        Mapping of aliases to attachments, it is cached until new attachment is added.
+        """
+        cached = self._alias_map
+        if cached is not None and cached[0] == len(self.collection):
+            return cached[1]
+        index = self.collection.index('alias')
+        alias_map = {alias: self.collection[positions[-1]] for alias, positions in index.items() if alias is not None}
+        # collection may be readonly, the cache is not its change
+        object.__setattr__(self, '_alias_map', (len(self.collection), alias_map))
+        return alias_map
+
+    def filter(self, **fields):
+        """
+        Return attachments with given values of fields, e.g. `filter(origin='dmesg', name=Types.COMMAND)`. Values of
+        fields are indexed on first lookup, so lookups take constant time.
+        """
+        positions = None
+        for field, value in fields.items():
+            found = self.collection.positions(field, value)
+            positions = set(found) if positions is None else positions.intersection(found)
+        if positions is None:
+            return list(self.collection)
+        return [self.collection[i] for i in sorted(positions)]
+
+    def by_uuid(self, uuid):
+        """
+        Return attachment of given uuid or None.
+        """
+        positions = self.collection.positions('uuid', uuid)
+        return self.collection[positions[0]] if positions else None
 
     def _save_xml(self):
         self.att_meta.root = Section(self.ROOT_NAME)
-        for attachment in self.collection:
-            attachments_params = dict(attachment.__dict__)
-            if attachment.alias is None:
-                attachments_params.pop('alias')
-            self.att_meta.root.subsections.append(Section(self.ELEM_NAME, attachments_params))
+        sections = self.att_meta.root.subsections
+        sections.extend_records(self.ELEM_NAME, self.collection.records())
         self.att_meta.save()
 
-    def _compression(self):
-        for att in self.collection:
-            if att.compression is not Compression.NONE and os.path.exists(att.path.full_path):
-                logger.info(f'Compressing attachment: {att}')
-
-                old_path = att.path.full_path
-                new_path = att.archive_path
-
-                # compress file/directory
-                with TarFile.open(new_path, f'w:{att.compression.value}') as tf:
-                    tf.add(old_path, os.path.basename(old_path))
-
-                # delete the source
-                if os.path.isdir(old_path):
-                    shutil.rmtree(old_path)
-                else:
-                    os.remove(old_path)
-
-    def save(self):
+    def _uncompressed(self):
+        # compressed attachments with uncompressed content on disk
+        positions = sorted(
+            i
+            for value, value_positions in self.collection.index('compression').items()
+            if value != Compression.NONE.value
+            for i in value_positions
+        )
+        return [att for att in map(self.collection.__getitem__, positions) if os.path.exists(att.path.full_path)]
+
+    def _compression(self, max_workers=None, use_processes=False):
+        jobs = self._uncompressed()
+        if not jobs:
+            return
+
+        errors = {}
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = min(max_workers, len(jobs))
+        if max_workers <= 1:
+            for att in jobs:
+                try:
+                    _compress(att.path.full_path, att.archive_path, att.compression.value, att.compression_level)
+                except Exception as e:
+                    errors[att] = e
+        else:
+            executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+            with executor_cls(max_workers) as executor:
+                futures = {
+                    executor.submit(
+                        _compress, att.path.full_path, att.archive_path, att.compression.value, att.compression_level
+                    ): att
+                    for att in jobs
+                }
+                for future in as_completed(futures):
+                    if future.exception() is not None:
+                        errors[futures[future]] = future.exception()
+
+        for att, e in errors.items():
+            logger.error(f'Cannot compress attachment {att}: {e}')
+        if errors:
+            raise DataFormatCompressionError(errors)
+
+    def save(self, max_workers=None, use_processes=False):
+        """
+        Save attachments metadata and compress attachments. Attachments are compressed concurrently, source of each
+        attachment is removed only after its archive is completely written. If any compression fails, the remaining
+        attachments are still compressed and `DataFormatCompressionError` with failures is raised, sources of failed
+        attachments are kept, so they are compressed again by the next save.
+
+        :param max_workers: number of concurrent compressions, defaults to number of CPUs
+        :param use_processes: compress in process pool instead of thread pool
+        """
         logger.info('Saving attachment collection')
         self._save_xml()
-        self._compression()
+        self._compression(max_workers, use_processes)
+        if self.content_store is not None:
+            self._deduplicate(self._new, self.content_store)
+        self._new = []
+        self._modified = False
+
+    @staticmethod
+    def _deduplicate(attachments, store):
+        count = 0
+        for att in attachments:
+            if att.compression is not Compression.NONE or att.name is Types.SERIES:
+                continue  # archives differ by names of members, series are appended in place
+            if os.path.isfile(att.path.full_path):
+                store.put(att.path.full_path)
+                count += 1
+            for root, _, files in os.walk(att.path.full_path):
+                for file in files:
+                    path = os.path.join(root, file)
+                    if not os.path.islink(path):
+                        store.put(path)
+                        count += 1
+        return count
+
+    def deduplicate(self, content_store=None):
+        """
+        Deduplicate files of all uncompressed attachments, files of identical content are replaced by hardlinks and
+        made read-only, see `ContentStore`. Files of attachments created since the collection was opened are
+        deduplicated by `save` automatically if the collection has content store.
+
+        :param content_store: store used instead of store of the collection, in-memory store deduplicating files
+            within the collection is used if neither is set
+        :return: number of processed files
+        """
+        return self._deduplicate(self.collection, content_store or self.content_store or ContentStore())
 
     @classmethod
     def slugify(cls, name):
@@ -172,22 +795,72 @@ class AttachmentCollection:
             logger.warning(f'File name too long!!! Shortening to {value}')
         return value
 
-    def new(self, att_type, origin, alias=None, compression=Compression.NONE):
-        if alias in self.alias_map:
+    def new(self, att_type, origin, alias=None, compression=Compression.NONE, *, compression_level=None, typecode='d'):
+        """
+        Create new attachment. Attachment of `Types.SERIES` is created as empty series file, which can be filled by
+        `Attachment.series_writer` and referenced from sections by its uuid.
+
+        :param att_type: type of attachment
+        :param origin: origin of attachment, e.g. command or file name
+        :param alias: optional unique alias of attachment
+        :param compression: compression of attachment applied when the collection is saved
+        :param compression_level: level of compression (e.g. 1-9 for gz/bz2, 0-9 for xz), None means default level
+        :param typecode: `array` typecode of samples of series attachment (ignored by other types)
+        """
+        if alias is not None and self.collection.positions('alias', alias):
             raise DataFormatDuplicateKeyError
         if not isinstance(att_type, Types):
             raise DataFormatBadTypeError
+        if att_type is Types.SERIES and compression is not Compression.NONE:
+            raise DataFormatBadTypeError('Series attachments cannot be compressed, they are memory mapped')
+        if compression is not Compression.NONE:
+            compression.codec.check(compression_level)
 
         new_uuid = str(uuid4())
         new_dir = os.path.join(self.ATTCH_DIR, att_type.value, self.slugify(origin))
         new_path = os.path.join(new_dir, new_uuid)
 
-        new_att = Attachment(origin, att_type, Path(self.path, new_path), new_uuid, alias, compression)
-
-        self.collection.append(new_att)
-        if alias:
-            self.alias_map[alias] = new_att
+        if att_type is not Types.SERIES:
+            typecode = None
+        new_att = Attachment(
+            origin, att_type, Path(self.path, new_path), new_uuid, alias, compression, typecode, compression_level
+        )
 
         os.makedirs(os.path.join(self.path, new_dir))
+        if att_type is Types.SERIES:
+            create_series(new_att.path.full_path, typecode)
+
+        self.collection.append(new_att)
+        self._new.append(new_att)
+        self._alias_map = None
 
         return new_att
+
+    def new_from(self, source, origin=None, alias=None, compression=Compression.NONE, compression_level=None):
+        """
+        Create new file or directory attachment with copy of `source`. Compressed attachment is streamed directly into
+        its archive. Files of uncompressed attachment are copied through content store of the collection, so the
+        content already present in the store is only linked and not written again.
+
+        :param source: path of copied file or directory
+        :param origin: origin of attachment, defaults to `source`
+        """
+        att_type = Types.DIRECTORY if os.path.isdir(source) else Types.FILE
+        att = self.new(att_type, origin or source, alias, compression, compression_level=compression_level)
+        if compression is not Compression.NONE:
+            with att.open_writer() as writer:
+                if att_type is Types.DIRECTORY:
+                    for name in sorted(os.listdir(source)):
+                        writer.add(os.path.join(source, name), name)
+                else:
+                    writer.add(source)
+        elif self.content_store is None:
+            if att_type is Types.DIRECTORY:
+                shutil.copytree(source, att.path.full_path, symlinks=True)
+            else:
+                shutil.copyfile(source, att.path.full_path)
+        elif att_type is Types.DIRECTORY:
+            shutil.copytree(source, att.path.full_path, symlinks=True, copy_function=self.content_store.copy)
+        else:
+            self.content_store.copy(source, att.path.full_path)
+        return att
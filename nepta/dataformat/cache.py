@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import marshal
+import os
+import sys
+
+from nepta.dataformat.section import FrozenSection, Section
+
+logger = logging.getLogger(__name__)
+
+
+class SectionCache:
+    """
+    Binary cache of parsed section trees. Cached tree is stored either next to the XML file (hidden sidecar file) or
+    in the shared cache directory. Cache entry is keyed by path, size and mtime of the XML file and by the cache
+    format version, so stale entries are never used and the XML file is parsed instead.
+
+    :param cache_dir: shared cache directory, if None cache is stored next to the XML file
+    :param max_size: maximal size of the cache in bytes, the least recently used entries are evicted first
+    """
+
+    FORMAT_VERSION = 2
+    SUFFIX = '.cache'
+    MAGIC = b'NDFC'
+
+    def __init__(self, cache_dir=None, max_size=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, path):
+        if self.cache_dir is None:
+            head, tail = os.path.split(path)
+            return os.path.join(head, f'.{tail}{self.SUFFIX}')
+        digest = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest + self.SUFFIX)
+
+    def _key(self, path):
+        st = os.stat(path)
+        return (
+            self.FORMAT_VERSION,
+            marshal.version,
+            tuple(sys.version_info[:2]),
+            os.path.realpath(path),
+            st.st_size,
+            st.st_mtime_ns,
+        )
+
+    @staticmethod
+    def _dump_records(root):
+        # section tree is serialized as flat list of (name, params, number of subsections) in post-order, so it can
+        # be rebuilt bottom-up without recursion
+        records = []
+        stack = [root]
+        while stack:
+            sec = stack.pop()
+            subsections = sec._subsection_list()
+            # frozen trees hold list values as tuples, cache stores them as lists for writable trees
+            params = tuple((k, list(v) if type(v) is tuple else v) for k, v in sec._param_map().items())
+            records.append((sec.name, params, len(subsections)))
+            stack.extend(subsections)
+        records.reverse()
+        return records
+
+    @staticmethod
+    def _build_tree(records, readonly):
+        stack = []
+        build = FrozenSection._build if readonly else Section._build
+        for name, record_params, sub_count in records:
+            params = record_params
+            if readonly:
+                # list values of frozen sections are immutable
+                params = [(k, tuple(v) if type(v) is list else v) for k, v in record_params]
+            if sub_count:
+                sec = build(name, params, stack[-sub_count:])
+                del stack[-sub_count:]
+            else:
+                sec = build(name, params, ())
+            stack.append(sec)
+        return stack[0]
+
+    def load(self, path, readonly=False):
+        """
+        Return cached section tree of XML file or None if there is no valid cache entry.
+        """
+        cache_path = self.cache_path(path)
+        try:
+            with open(cache_path, 'rb') as f:
+                if f.read(len(self.MAGIC)) != self.MAGIC or marshal.load(f) != self._key(path):
+                    logger.debug(f'Cache of {path} is stale')
+                    return None
+                # loading from bytes is much faster than from file object
+                records = marshal.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning(f'Cannot read cache {cache_path}: {e}')
+            return None
+
+        try:
+            # mtime of cache entry is used for LRU eviction
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return self._build_tree(records, readonly)
+
+    def store(self, path, root):
+        """
+        Store section tree of XML file into the cache.
+        """
+        cache_path = self.cache_path(path)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        try:
+            data = self.MAGIC + marshal.dumps(self._key(path)) + marshal.dumps(self._dump_records(root))
+            if len(data) > self.max_size:
+                logger.debug(f'Section tree of {path} is too big to be cached')
+                return
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError) as e:
+            logger.warning(f'Cannot write cache {cache_path}: {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        if self.cache_dir is not None:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries of shared cache directory until it fits into maximal size.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.SUFFIX) and entry.is_file():
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,133 @@
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import threading
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1024 * 1024
+_WRITE_BITS = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+
+
+def file_digest(path):
+    """
+    Return hex sha256 digest of content of file.
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _make_readonly(path):
+    mode = os.stat(path).st_mode
+    if mode & _WRITE_BITS:
+        os.chmod(path, mode & ~_WRITE_BITS)
+
+
+def _replace_by_link(target, path):
+    # hardlink is created under temporary name first, so `path` is replaced atomically
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.link(target, tmp)
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class ContentStore:
+    """
+    Content-addressed store deduplicating files of attachments. Files of identical content are hardlinks of single
+    inode, which is made read-only, so the content cannot be modified in place through any of the links (e.g.
+    `Path.write` replaces the file instead).
+
+    Store with `root` keeps objects in directory `root/ab/cdef...` named by sha256 of their content, it can be shared
+    by all packages of results root, but it must be on the same filesystem. Store without root deduplicates only
+    files added through the same store instance, e.g. within one package.
+
+    :param root: directory of objects of the store, None for in-memory store
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self._files = {}
+        self._lock = threading.Lock()
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.root!r})'
+
+    def object_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def _lookup(self, digest):
+        if self.root is not None:
+            path = self.object_path(digest)
+            return path if os.path.exists(path) else None
+        with self._lock:
+            path = self._files.get(digest)
+        return path if path is not None and os.path.exists(path) else None
+
+    def _register(self, digest, path):
+        # register file as object of digest, return path of already registered object if there is some
+        if self.root is None:
+            with self._lock:
+                existing = self._files.setdefault(digest, path)
+                if existing == path or not os.path.exists(existing):
+                    self._files[digest] = path
+                    return None
+            return existing
+
+        obj = self.object_path(digest)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        try:
+            os.link(path, obj)
+        except FileExistsError:
+            return obj
+        return None
+
+    def put(self, path):
+        """
+        Deduplicate existing file, it is replaced by hardlink of object of the same content or it becomes the object.
+        Files on different filesystem than the store are kept as they are.
+
+        :return: sha256 digest of the file
+        """
+        return self._put(path, file_digest(path))
+
+    def _put(self, path, digest):
+        try:
+            existing = self._register(digest, path)
+            if existing is not None and not os.path.samefile(existing, path):
+                _replace_by_link(existing, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            logger.warning(f'Cannot deduplicate {path}, it is not on filesystem of {self}')
+            return digest
+        _make_readonly(path)
+        return digest
+
+    def copy(self, source, path):
+        """
+        Copy file into new file `path`. If the store contains the content, the file is linked and nothing is written.
+
+        :return: sha256 digest of the file
+        """
+        digest = file_digest(source)
+        existing = self._lookup(digest)
+        if existing is not None:
+            try:
+                os.link(existing, path)
+                return digest
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        shutil.copyfile(source, path)
+        return self._put(path, digest)
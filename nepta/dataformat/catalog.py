@@ -0,0 +1,197 @@
+import logging
+import os
+import sqlite3
+from xml.etree.ElementTree import ParseError
+
+from nepta.dataformat.exceptions import BaseDataFormatError, DataFormatBadTypeError
+from nepta.dataformat.package import DataPackage, FileFlags
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA_VERSION = 1
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    packed INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metas (
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS metas_key_value ON metas(key, value);
+CREATE INDEX IF NOT EXISTS metas_package ON metas(package_id);
+CREATE TABLE IF NOT EXISTS attachments (
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    uuid TEXT,
+    name TEXT,
+    alias TEXT,
+    origin TEXT,
+    compression TEXT
+);
+CREATE INDEX IF NOT EXISTS attachments_package ON attachments(package_id);
+CREATE INDEX IF NOT EXISTS attachments_alias ON attachments(alias);
+CREATE INDEX IF NOT EXISTS attachments_name ON attachments(name);
+"""
+ATTACHMENT_FIELDS = ('uuid', 'name', 'alias', 'origin', 'compression')
+_INSERT_ATTACHMENT = (
+    f'INSERT INTO attachments (package_id, {", ".join(ATTACHMENT_FIELDS)}) VALUES (?{", ?" * len(ATTACHMENT_FIELDS)})'
+)
+
+
+class Catalog:
+    """
+    Persistent SQLite catalog of packages, it indexes meta.xml values and summaries of attachments of packages, so
+    packages can be found by queries without opening them. The catalog is updated by `refresh`, which opens only
+    packages changed since the last refresh (by modification times of their files).
+
+    :param path: path of database file, ':memory:' for in-memory catalog
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, _SCHEMA_VERSION):
+            self._conn.close()
+            raise DataFormatBadTypeError(f'Catalog {path} has unsupported schema version {version}')
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.path!r})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM packages').fetchone()[0]
+
+    def __contains__(self, path):
+        return self._package_id(path) is not None
+
+    def _package_id(self, path):
+        row = self._conn.execute('SELECT id FROM packages WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, root, max_workers=1):
+        """
+        Synchronize catalog with packages in directory tree (see `DataPackage.discover`). New and changed packages
+        are indexed, packages which no longer exist in the tree are removed. Packages which cannot be read are
+        skipped with warning.
+
+        :param root: root directory of the tree
+        :param max_workers: number of directories listed concurrently by discovery
+        :return: tuple of numbers of indexed and removed packages
+        """
+        root = os.path.abspath(root)
+        known = dict(
+            self._conn.execute(
+                "SELECT path, mtime_ns FROM packages WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (root, _like_prefix(root)),
+            )
+        )
+        indexed = 0
+        with self._conn:
+            for entry in DataPackage.discover(root, max_workers, packed=True):
+                path = os.path.abspath(entry.path)
+                try:
+                    mtime_ns = entry.mtime_ns()
+                    if known.pop(path, None) == mtime_ns:
+                        continue
+                    self._index(entry, path, mtime_ns)
+                    indexed += 1
+                except (OSError, ParseError, BaseDataFormatError) as e:
+                    logger.warning(f'Cannot index package {path}: {e}')
+                    self._conn.execute('DELETE FROM packages WHERE path = ?', (path,))
+            self._conn.executemany('DELETE FROM packages WHERE path = ?', ((path,) for path in known))
+        logger.info(f'Catalog refreshed: {indexed} package(s) indexed, {len(known)} removed')
+        return indexed, len(known)
+
+    def _index(self, entry, path, mtime_ns):
+        with entry.open(FileFlags.META | FileFlags.ATTACHMENTS) as package:
+            metas = [(key, None if value is None else str(value)) for key, value in package.metas]
+            attachments = [{} for _ in range(len(package.attachments))]
+            for field in ATTACHMENT_FIELDS:
+                for value, positions in package.attachments.collection.index(field).items():
+                    for i in positions:
+                        attachments[i][field] = value
+
+        self._conn.execute('DELETE FROM packages WHERE path = ?', (path,))
+        package_id = self._conn.execute(
+            'INSERT INTO packages (path, packed, mtime_ns) VALUES (?, ?, ?)', (path, entry.packed, mtime_ns)
+        ).lastrowid
+        self._conn.executemany(
+            'INSERT INTO metas (package_id, key, value) VALUES (?, ?, ?)',
+            ((package_id, key, value) for key, value in metas),
+        )
+        self._conn.executemany(
+            _INSERT_ATTACHMENT,
+            ((package_id, *(att.get(field) for field in ATTACHMENT_FIELDS)) for att in attachments),
+        )
+
+    def find(self, root=None, attachment=None, **metas):
+        """
+        Return sorted paths of packages matching all given meta values, e.g.
+        `catalog.find(Family='RHEL9', SpecificTag='X')`.
+
+        :param root: return only packages in this directory tree
+        :param attachment: dict of attachment fields (see `ATTACHMENT_FIELDS`), packages have to contain at least
+            one attachment matching all of them, e.g. `{'alias': 'dmesg'}`
+        """
+        conditions, args = [], []
+        for key, value in metas.items():
+            conditions.append('id IN (SELECT package_id FROM metas WHERE key = ? AND value = ?)')
+            args.extend((key, str(value)))
+        if attachment:
+            unknown = set(attachment).difference(ATTACHMENT_FIELDS)
+            if unknown:
+                raise DataFormatBadTypeError(f'Attachments have no fields {", ".join(sorted(unknown))}')
+            fields = ' AND '.join(f'{field} = ?' for field in attachment)
+            conditions.append(f'id IN (SELECT package_id FROM attachments WHERE {fields})')
+            args.extend(str(value) for value in attachment.values())
+        if root is not None:
+            root = os.path.abspath(root)
+            conditions.append("(path = ? OR path LIKE ? ESCAPE '\\')")
+            args.extend((root, _like_prefix(root)))
+
+        where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        return [row[0] for row in self._conn.execute(f'SELECT path FROM packages{where} ORDER BY path', args)]
+
+    def metas(self, path):
+        """
+        Return indexed meta values of package.
+        """
+        return dict(
+            self._conn.execute(
+                'SELECT key, value FROM metas JOIN packages ON packages.id = package_id WHERE path = ?',
+                (os.path.abspath(path),),
+            )
+        )
+
+    def attachments(self, path):
+        """
+        Return summaries of attachments of package, dicts of `ATTACHMENT_FIELDS`.
+        """
+        rows = self._conn.execute(
+            f'SELECT {", ".join(ATTACHMENT_FIELDS)} FROM attachments JOIN packages ON packages.id = package_id '
+            'WHERE path = ? ORDER BY attachments.rowid',
+            (os.path.abspath(path),),
+        )
+        return [dict(zip(ATTACHMENT_FIELDS, row)) for row in rows]
+
+
+def _like_prefix(directory):
+    # LIKE pattern matching paths in directory
+    escaped = directory.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped.rstrip(os.sep)}{os.sep}%'
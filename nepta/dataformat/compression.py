@@ -0,0 +1,363 @@
+import abc
+import bisect
+import importlib
+import io
+import logging
+import threading
+import zlib
+from tarfile import TarFile
+
+from nepta.dataformat.exceptions import DataFormatBadTypeError
+
+logger = logging.getLogger(__name__)
+
+
+class Codec(abc.ABC):
+    """
+    Compression codec of attachment archives. Codecs are registered by the suffix of archive (`Compression` value),
+    see `register_codec` and `get_codec`.
+
+    :param name: suffix of archive, e.g. 'gz' for '.tar.gz'
+    :param levels: range of supported compression levels
+    :param default_level: level used when attachment does not specify any, None means the default of the library
+    """
+
+    def __init__(self, name, levels, default_level=None):
+        self.name = name
+        self.levels = levels
+        self.default_level = default_level
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name!r})'
+
+    @property
+    def available(self):
+        return True
+
+    def check(self, level=None):
+        """
+        Raise `DataFormatBadTypeError` if codec cannot be used with given level.
+        """
+        if not self.available:
+            raise DataFormatBadTypeError(f'Compression {self.name} is not available, its library is not installed')
+        if level is not None and level not in self.levels:
+            raise DataFormatBadTypeError(f'Unsupported level {level} of compression {self.name}')
+
+    @abc.abstractmethod
+    def tar_writer(self, archive, fileobj, level=None):
+        """
+        Return `TarFile` writing compressed archive into file object.
+
+        :param archive: path of archive, it is used for metadata of compressed stream (e.g. gzip header)
+        :param fileobj: binary file object the archive is written to, it is not closed by returned `TarFile`
+        :param level: compression level, None means the default level of codec
+        """
+
+    @abc.abstractmethod
+    def tar_reader(self, path):
+        """
+        Return `TarFile` reading compressed archive.
+        """
+
+    @abc.abstractmethod
+    def open_stream(self, path, seek_points=None):
+        """
+        Return binary file object reading decompressed archive. Seek is emulated by decompression, so seeking backward
+        decompresses the archive from the start again. Codecs supporting random access record seek points into
+        `seek_points` (`SeekPoints`) while the stream is read and resume decompression from the nearest one on seek,
+        the seek points can be shared by all streams of the same archive.
+        """
+
+
+class TarFileCodec(Codec):
+    """
+    Codec natively supported by `tarfile` module.
+
+    :param level_arg: name of keyword argument of `TarFile.open` setting compression level
+    :param module: name of module providing `open` of decompressed stream
+    """
+
+    def __init__(self, name, levels, level_arg, module, default_level=None):
+        super().__init__(name, levels, default_level)
+        self.level_arg = level_arg
+        self.module = module
+
+    def tar_writer(self, archive, fileobj, level=None):
+        level = self.default_level if level is None else level
+        kwargs = {} if level is None else {self.level_arg: level}
+        return TarFile.open(archive, f'w:{self.name}', fileobj=fileobj, **kwargs)
+
+    def tar_reader(self, path):
+        return TarFile.open(path, f'r:{self.name}')
+
+    def open_stream(self, path, seek_points=None):  # noqa: ARG002
+        return importlib.import_module(self.module).open(path, 'rb')
+
+
+class UncompressedCodec(Codec):
+    """
+    Plain tar archive, it is used for reading of bundles ('.tar') rather than for attachments.
+    """
+
+    def __init__(self, name):
+        super().__init__(name, range(0))
+
+    def tar_writer(self, archive, fileobj, level=None):  # noqa: ARG002
+        return TarFile.open(archive, 'w', fileobj=fileobj)
+
+    def tar_reader(self, path):
+        return TarFile.open(path, 'r:')
+
+    def open_stream(self, path, seek_points=None):  # noqa: ARG002
+        return open(path, 'rb')
+
+
+class SeekPoints:
+    """
+    Seek points of decompressed stream shared by streams of the same archive, see `Codec.open_stream`. Points are
+    tuples of offset in decompressed stream, offset in compressed file and saved state of decompressor, sorted by
+    offsets. Offsets are also kept in separate list, so the nearest point is found by bisection.
+    """
+
+    def __init__(self):
+        self.points = []
+        self.offsets = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    @property
+    def last_offset(self):
+        return self.offsets[-1] if self.offsets else 0
+
+    def add(self, offset, raw_offset, state):
+        """
+        Record seek point, points not beyond the last one (e.g. recorded by other stream) are ignored.
+        """
+        with self._lock:
+            if not self.offsets or offset > self.offsets[-1]:
+                # point is appended first, so offsets never refer to missing point of concurrent `find`
+                self.points.append((offset, raw_offset, state))
+                self.offsets.append(offset)
+
+    def find(self, offset):
+        """
+        Return the last seek point not beyond offset or None.
+        """
+        i = bisect.bisect_right(self.offsets, offset) - 1
+        return self.points[i] if i >= 0 else None
+
+
+class _GzipSeekableFile(io.RawIOBase):
+    # decompressed gzip stream, state of decompressor is saved into seek points every `SPACING` bytes of output and
+    # seek resumes decompression from the nearest saved state (the principle of zran.c example of zlib)
+    SPACING = 4 * 1024 * 1024
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, path, seek_points):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._points = seek_points
+        self._restart(0, 0, zlib.decompressobj(16 + zlib.MAX_WBITS))
+
+    def _restart(self, pos, raw_pos, decompressor):
+        self._file.seek(raw_pos)
+        self._decompressor = decompressor
+        self._pos = pos
+        self._buffer = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def _decompress(self):
+        # tarfile writes single gzip member, so data after its end are ignored
+        while not self._decompressor.eof:
+            data = self._file.read(self.CHUNK_SIZE)
+            if not data:
+                raise EOFError('Compressed file ended before the end-of-stream marker was reached')
+            out = self._decompressor.decompress(data)
+            end = self._pos + len(out)
+            if end >= self._points.last_offset + self.SPACING:
+                self._points.add(end, self._file.tell(), self._decompressor.copy())
+            if out:
+                return memoryview(out)
+        return memoryview(b'')
+
+    def readinto(self, b):
+        if not self._buffer:
+            self._buffer = self._decompress()
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('Gzip stream cannot seek from its end')
+
+        point = self._points.find(offset)
+        if offset < self._pos or (point is not None and point[0] > self._pos + len(self._buffer)):
+            if point is not None:
+                pos, raw_pos, decompressor = point
+                self._restart(pos, raw_pos, decompressor.copy())
+            else:
+                self._restart(0, 0, zlib.decompressobj(16 + zlib.MAX_WBITS))
+
+        while self._pos < offset:
+            if not self._buffer:
+                self._buffer = self._decompress()
+                if not self._buffer:
+                    break
+            n = min(len(self._buffer), offset - self._pos)
+            self._buffer = self._buffer[n:]
+            self._pos += n
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+class GzipCodec(TarFileCodec):
+    """
+    Gzip codec with random access to decompressed archive through seek points.
+    """
+
+    def __init__(self, levels, default_level=None):
+        super().__init__('gz', levels, 'compresslevel', 'gzip', default_level)
+
+    def open_stream(self, path, seek_points=None):
+        if seek_points is None:
+            return super().open_stream(path)
+        return io.BufferedReader(_GzipSeekableFile(path, seek_points), _GzipSeekableFile.CHUNK_SIZE)
+
+
+class _StreamTarFile(TarFile):
+    # tar archive in stream mode which closes also the file objects of its compressed stream
+    _stream_files = ()
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for f in self._stream_files:
+                f.close()
+
+
+class StreamCodec(Codec):
+    """
+    Codec provided by optional library through compressing and decompressing file objects. Archives are written and
+    read in tar stream mode, so they cannot be accessed randomly.
+
+    :param modules: names of modules providing the codec, the first importable one is used
+    :param writer: function (module, fileobj, level) returning writable file object compressing into `fileobj`
+    :param reader: function (module, file) returning readable file object decompressing `file` (path or file object)
+    """
+
+    def __init__(self, name, levels, modules, writer, reader, *, default_level=None):
+        super().__init__(name, levels, default_level)
+        self.modules = modules
+        self.writer = writer
+        self.reader = reader
+        self._module = None
+
+    def _import(self):
+        if self._module is None:
+            for module in self.modules:
+                try:
+                    self._module = importlib.import_module(module)
+                    break
+                except ImportError:
+                    continue
+        return self._module
+
+    @property
+    def available(self):
+        return self._import() is not None
+
+    def tar_writer(self, archive, fileobj, level=None):  # noqa: ARG002
+        self.check(level)
+        level = self.default_level if level is None else level
+        stream = self.writer(self._module, fileobj, level)
+        tf = _StreamTarFile.open(fileobj=stream, mode='w|')
+        tf._stream_files = (stream,)
+        return tf
+
+    def tar_reader(self, path):
+        self.check()
+        f = open(path, 'rb')
+        try:
+            stream = self.reader(self._module, f)
+            tf = _StreamTarFile.open(fileobj=stream, mode='r|')
+        except BaseException:
+            f.close()
+            raise
+        tf._stream_files = (stream, f)
+        return tf
+
+    def open_stream(self, path, seek_points=None):  # noqa: ARG002
+        self.check()
+        return self.reader(self._module, path)
+
+
+def _zstd_writer(module, fileobj, level):
+    if hasattr(module, 'ZstdFile'):  # compression.zstd of python 3.14+
+        return module.ZstdFile(fileobj, 'wb', level=level)
+    cctx = module.ZstdCompressor() if level is None else module.ZstdCompressor(level=level)
+    return cctx.stream_writer(fileobj, closefd=False)
+
+
+def _zstd_reader(module, file):
+    if hasattr(module, 'ZstdFile'):
+        return module.ZstdFile(file, 'rb')
+    return module.open(file, 'rb', closefd=False)  # file opened from path is always closed
+
+
+def _lz4_writer(module, fileobj, level):
+    return module.open(fileobj, 'wb', compression_level=level or 0)
+
+
+def _lz4_reader(module, file):
+    return module.open(file, 'rb')
+
+
+_CODECS = {}
+
+
+def register_codec(codec):
+    """
+    Register codec, it replaces already registered codec of the same name.
+    """
+    _CODECS[codec.name] = codec
+
+
+def get_codec(name):
+    """
+    Return codec registered for archive suffix (value of `Compression`).
+    """
+    try:
+        return _CODECS[str(name)]
+    except KeyError:
+        raise DataFormatBadTypeError(f'Unknown compression {name}') from None
+
+
+register_codec(UncompressedCodec('tar'))
+register_codec(GzipCodec(range(10)))
+register_codec(TarFileCodec('bz2', range(1, 10), 'compresslevel', 'bz2'))
+register_codec(TarFileCodec('xz', range(10), 'preset', 'lzma'))
+register_codec(StreamCodec('zst', range(-7, 23), ('compression.zstd', 'zstandard'), _zstd_writer, _zstd_reader))
+register_codec(StreamCodec('lz4', range(17), ('lz4.frame',), _lz4_writer, _lz4_reader))
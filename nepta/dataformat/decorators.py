@@ -3,6 +3,26 @@ from functools import wraps
 from nepta.dataformat.exceptions import DataFormatReadOnlyExceptionError
 
 
+class Version:
+    """
+    Counter of changes of group of objects, e.g. sections of indexed collection, it is used to invalidate data derived
+    from the group. Objects listing the version in their '_watchers' attribute increment it by every change made
+    through methods decorated by "track_changes". The counter is not thread-safe.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+
+def _notify(instance):
+    watchers = getattr(instance, '_watchers', None)
+    if watchers:
+        for version in watchers:
+            version.value += 1
+
+
 def readonly_check(arg1=None):
     """
     This is decorator method which wraps calling method and checks value of special attribute ('readonly') to verify
@@ -43,3 +63,51 @@ def readonly_check_methods(*methods):
         return cls
 
     return wrapper
+
+
+def track_changes(func):
+    """
+    This is decorator method which marks the instance as modified (sets special attribute '_modified') after
+    successful call of decorated method and increments versions listed in special attribute '_watchers' (see
+    `Version`). Assignments of private attributes (starting with '_') through decorated `__setattr__` are not
+    considered as modification.
+
+    :param func: decorated method
+    """
+    attr = '_modified'
+
+    if func.__name__ == '__setattr__':
+
+        @wraps(func)
+        def inner(instance, name, value):
+            func(instance, name, value)
+            if not name.startswith('_'):
+                object.__setattr__(instance, attr, True)
+                _notify(instance)
+
+    else:
+
+        @wraps(func)
+        def inner(instance, *args, **kwargs):
+            ret = func(instance, *args, **kwargs)
+            object.__setattr__(instance, attr, True)
+            _notify(instance)
+            return ret
+
+    return inner
+
+
+def track_changes_methods(*methods):
+    """
+    This is class decorator which iterates through provided method names and decorate each method with
+    "track_changes" decorator. Instances are expected to initialize '_modified' attribute.
+    :param methods: list of method names which will be decorate
+    """
+
+    def wrapper(cls):
+        for mtd_name in methods:
+            org_mtd = getattr(cls, mtd_name)
+            setattr(cls, mtd_name, track_changes(org_mtd))
+        return cls
+
+    return wrapper
@@ -24,3 +24,18 @@ class DataFormatDuplicateKeyError(BaseDataFormatError):
 
 class DataFormatBadTypeError(BaseDataFormatError):
     pass
+
+
+class DataFormatQueryError(BaseDataFormatError):
+    pass
+
+
+class DataFormatCompressionError(BaseDataFormatError):
+    """
+    Compression of some attachments or remote packages failed, `errors` maps failed attachments (or hosts of remote
+    packages) to their exceptions.
+    """
+
+    def __init__(self, errors):
+        super().__init__(f'Cannot compress {len(errors)} item(s): {", ".join(map(str, errors.values()))}')
+        self.errors = errors
@@ -1,12 +1,27 @@
+import logging
 import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from enum import Flag, auto
 
 from nepta.dataformat.attachments import AttachmentCollection
 from nepta.dataformat.decorators import readonly_check_methods
+from nepta.dataformat.exceptions import DataFormatBadTypeError, DataFormatFileExistsError, DataFormatFileNotFoundError
+from nepta.dataformat.packed import PackedFile, PackedFS, is_packed, pack
 from nepta.dataformat.remote_package import RemotePackageCollection
+from nepta.dataformat.vfs import LOCAL_FS, is_bundle, open_bundle
 from nepta.dataformat.xml_file import MetaXMLFile, NullFile, XMLFile
 
+logger = logging.getLogger(__name__)
+
+# errors of opening corrupt or truncated bundle archives and packed files
+_UNREADABLE_ERRORS = (DataFormatBadTypeError, zipfile.BadZipFile, tarfile.ReadError, EOFError, OSError)
+
 
 class FileFlags(Flag):
     NONE = 0
@@ -28,22 +43,137 @@ class DataPackage:
             FileFlags.REMOTE_PACKAGES: RemotePackageCollection.open,
         },
     )
+    PACKAGE_FILES = ('meta.xml', 'store.xml', 'attachments.xml')
+
+    @staticmethod
+    def is_package(path, fs=None):
+        checked_files = DataPackage.PACKAGE_FILES
+        fs = fs or LOCAL_FS
+        if fs is LOCAL_FS and (is_packed(path) or is_bundle(path)):
+            try:
+                fs = PackedFS(path) if is_packed(path) else DataPackage._bundle_fs(path)
+            except (DataFormatFileNotFoundError, *_UNREADABLE_ERRORS):
+                # e.g. corrupt archive or bundle compressed by codec whose library is not installed
+                return False
+            try:
+                return all(fs.exists(os.path.join(path, file)) for file in checked_files)
+            finally:
+                fs.close()
+        return all(fs.exists(os.path.join(path, file)) for file in checked_files)
+
+    @classmethod
+    def discover(cls, root, max_workers=1, packed=False):
+        """
+        Generate packages in directory tree as `PackageEntry` handles. Each directory is listed by single `scandir`,
+        directories containing package files are yielded without descending into them and hidden directories (e.g.
+        working directories of packed packages) are skipped, so no per-package `stat` calls are made. Handles open
+        packages read-only by default, see `PackageEntry.open`.
+
+        :param root: root directory of the tree
+        :param max_workers: number of directories listed concurrently, it pays off on high-latency filesystems (NFS).
+            Packages are yielded in sorted depth-first order by single worker, otherwise in order they are found.
+        :param packed: yield also files in packed format (see `nepta.dataformat.packed`), it reads header of every
+            file of the tree
+        """
+        if max_workers <= 1:
+            stack = [root]
+            while stack:
+                packages, subdirs = _scan_dir(stack.pop(), packed)
+                yield from packages
+                stack.extend(reversed(subdirs))
+            return
+
+        with ThreadPoolExecutor(max_workers) as executor:
+            pending = {executor.submit(_scan_dir, root, packed)}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        packages, subdirs = future.result()
+                        pending.update(executor.submit(_scan_dir, subdir, packed) for subdir in subdirs)
+                        yield from packages
+            finally:
+                # generator closed early, directories which are not listed yet are not needed
+                for future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _bundle_fs(path):
+        # package files are either at the top level of the bundle or in its only top-level directory
+        fs = open_bundle(path)
+        if fs.isfile(os.path.join(path, 'meta.xml')):
+            return fs
+        roots = [name for name in fs.listdir(path) if fs.isfile(os.path.join(path, name, 'meta.xml'))]
+        fs.close()
+        if len(roots) != 1:
+            raise DataFormatFileNotFoundError(f'Bundle {path} does not contain single package')
+        return open_bundle(path, roots[0])
 
     @staticmethod
-    def is_package(path):
-        checked_files = ['meta.xml', 'store.xml', 'attachments.xml']
-        return all(os.path.exists(os.path.join(path, file)) for file in checked_files)
+    def _work_dir(packed_path):
+        # packed package is modified in hidden directory next to it, so it can be packed by rename
+        return tempfile.mkdtemp(prefix=f'.{os.path.basename(packed_path)}.', dir=os.path.dirname(packed_path) or None)
 
     @classmethod
-    def open(cls, path, file_opts=FileFlags.ALL, readonly=False):
-        meta_file = cls._FILE_CONSTRUCT_MAP[file_opts & FileFlags.META](os.path.join(path, 'meta.xml'), readonly)
-        store_file = cls._FILE_CONSTRUCT_MAP[file_opts & FileFlags.STORE](os.path.join(path, 'store.xml'), readonly)
-        attach_col = cls._FILE_CONSTRUCT_MAP[file_opts & FileFlags.ATTACHMENTS](path, readonly)
-        rem_pkg_col = cls._FILE_CONSTRUCT_MAP[file_opts & FileFlags.REMOTE_PACKAGES](path, readonly)
-        return cls(path, meta_file, store_file, attach_col, rem_pkg_col, readonly)
+    def open(cls, path, file_opts=FileFlags.ALL, readonly=False, cache=None, fs=None):
+        """
+        :param path: path to package directory
+        :param file_opts: flags of package files which will be opened
+        :param readonly: open package in readonly mode
+        :param cache: optional `SectionCache` used for meta.xml and store.xml
+        :param fs: filesystem of the package (see `nepta.dataformat.vfs`), read-only filesystem implies readonly mode
+
+        Packed package (see `nepta.dataformat.packed`) opened in readonly mode is read directly from the packed file.
+        Otherwise it is unpacked into temporary directory next to it and packed again by `close` if it was modified.
+
+        Package bundled in zip or tar archive (see `nepta.dataformat.vfs.is_bundle`) is opened read-only, its files
+        are streamed from the archive without extraction. The package may be in the only top-level directory of the
+        archive.
+        """
+        if fs is None and is_bundle(path):
+            try:
+                bundle_fs = cls._bundle_fs(path)
+            except _UNREADABLE_ERRORS as e:
+                raise DataFormatFileNotFoundError(f'{path} is not a readable package bundle: {e}') from e
+            return cls.open(path, file_opts, readonly, fs=bundle_fs)
+        if fs is None and is_packed(path):
+            if readonly:
+                return cls.open(path, file_opts, readonly, fs=PackedFS(path))
+            work_dir = cls._work_dir(path)
+            try:
+                with PackedFile(path) as packed:
+                    packed.extractall(work_dir)
+                package = cls.open(work_dir, file_opts, readonly, cache)
+            except BaseException:
+                shutil.rmtree(work_dir)
+                raise
+            package.packed_path = path
+            return package
+
+        fs = fs or LOCAL_FS
+        readonly = readonly or not fs.writable
+        construct = cls._FILE_CONSTRUCT_MAP
+        meta_file = construct[file_opts & FileFlags.META](os.path.join(path, 'meta.xml'), readonly, cache, fs=fs)
+        store_file = construct[file_opts & FileFlags.STORE](os.path.join(path, 'store.xml'), readonly, cache, fs=fs)
+        attach_col = construct[file_opts & FileFlags.ATTACHMENTS](path, readonly, fs=fs)
+        rem_pkg_col = construct[file_opts & FileFlags.REMOTE_PACKAGES](path, readonly, fs=fs)
+        return cls(path, meta_file, store_file, attach_col, rem_pkg_col, readonly, fs=fs)
 
     @classmethod
-    def create(cls, path):
+    def create(cls, path, packed=False):
+        """
+        :param path: path of new package directory
+        :param packed: create package as single packed file (see `nepta.dataformat.packed`), it is written by `close`
+        """
+        if packed:
+            if os.path.exists(path):
+                raise DataFormatFileExistsError(f'{path} already exists')
+            work_dir = cls._work_dir(path)
+            os.rmdir(work_dir)
+            package = cls.create(work_dir)
+            package.packed_path = path
+            return package
+
         os.makedirs(path)
         metas = MetaXMLFile.create(os.path.join(path, 'meta.xml'))
         store = XMLFile.create(os.path.join(path, 'store.xml'))
@@ -51,8 +181,10 @@ class DataPackage:
         remote_packages = RemotePackageCollection.create(path)
         return cls(path, metas, store, attachments, remote_packages)
 
-    def __init__(self, path, metas, store, attachments, remote_packages, readonly=False):
+    def __init__(self, path, metas, store, attachments, remote_packages, readonly=False, *, fs=LOCAL_FS):
         self.path = path
+        self.fs = fs
+        self.packed_path = None
         self.metas: MetaXMLFile = metas
         self.store: XMLFile = store
         self.attachments: AttachmentCollection = attachments
@@ -65,9 +197,77 @@ class DataPackage:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+    def iter_store_sections(self, path_filter=None):
+        """
+        Lazily iterate sections of store.xml without loading the whole store, see `XMLFile.iter_sections`. It works
+        even if store was not opened, e.g. package opened with `FileFlags.META`.
+        """
+        return XMLFile.iter_sections(os.path.join(self.path, 'store.xml'), path_filter, fs=self.fs)
+
+    @property
+    def modified(self):
+        return any(part.modified for part in (self.metas, self.store, self.attachments, self.remote_packages))
+
     def close(self):
+        # only changed files are rewritten, remote packages decide on their own if the archive has to be recreated
+        self.fs.close()
         if not self._readonly:
-            self.metas.save()
-            self.store.save()
-            self.attachments.save()
+            repack = self.packed_path is not None and (self.modified or not os.path.exists(self.packed_path))
+            if self.metas.modified:
+                self.metas.save()
+            if self.store.modified:
+                self.store.save()
+            if self.attachments.modified:
+                self.attachments.save()
             self.remote_packages.save()
+            if self.packed_path is not None:
+                if repack:
+                    pack(self.path, self.packed_path)
+                shutil.rmtree(self.path)
+                self.packed_path = None
+
+
+@dataclass(frozen=True)
+class PackageEntry:
+    """
+    Package found by `DataPackage.discover`, nothing is read until it is opened.
+    """
+
+    path: str
+    packed: bool = False
+
+    def open(self, file_opts=FileFlags.ALL, readonly=True, cache=None):
+        """
+        Open the package, see `DataPackage.open`. Unlike `DataPackage.open` the package is opened read-only by
+        default, pass `readonly=False` to modify it.
+        """
+        return DataPackage.open(self.path, file_opts, readonly, cache)
+
+    def mtime_ns(self):
+        """
+        Return the latest modification time of package files in nanoseconds.
+        """
+        if self.packed:
+            return os.stat(self.path).st_mtime_ns
+        return max(os.stat(os.path.join(self.path, name)).st_mtime_ns for name in DataPackage.PACKAGE_FILES)
+
+
+def _scan_dir(path, packed):
+    # return packages in directory and its subdirectories which have to be scanned
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        logger.warning(f'Cannot scan directory {path}: {e}')
+        return [], []
+
+    if {entry.name for entry in entries if entry.is_file()}.issuperset(DataPackage.PACKAGE_FILES):
+        return [PackageEntry(path)], []
+    packages, subdirs = [], []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if not entry.name.startswith('.'):
+                subdirs.append(entry.path)
+        elif packed and entry.is_file() and is_packed(entry.path):
+            packages.append(PackageEntry(entry.path, packed=True))
+    return packages, subdirs
@@ -0,0 +1,326 @@
+import io
+import json
+import logging
+import mmap
+import os
+import posixpath
+import shutil
+import stat
+import struct
+
+from nepta.dataformat.exceptions import (
+    DataFormatBadTypeError,
+    DataFormatFileExistsError,
+    DataFormatFileNotFoundError,
+)
+from nepta.dataformat.vfs import MountedFS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NPTPACK1'
+# fixed header at the start of the file: magic, offset and size of table of contents
+_HEADER = struct.Struct('<8sQQ')
+
+FILE = 'file'
+DIR = 'dir'
+SYMLINK = 'symlink'
+LINK = 'link'
+
+
+def is_packed(path):
+    """
+    Return True if path is a file in packed format.
+    """
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def pack(directory, path):
+    """
+    Pack directory tree into single file. Files are stored uncompressed one after another followed by table of
+    contents, offset of the table is stored in the header at the start of the file. Directories (also empty ones),
+    symlinks, permissions and mtimes are kept, hardlinks of the same file are stored only once.
+
+    The packed file is written under temporary name and renamed at the end, so an existing file is replaced
+    atomically.
+    """
+    logger.info(f'Packing {directory} into {path}')
+    tmp = f'{path}.{os.getpid()}.tmp'
+    toc = []
+    inodes = {}
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(bytes(_HEADER.size))
+            for root, dirs, files in os.walk(directory):
+                dirs.sort()
+                for name in dirs + sorted(files):
+                    full_path = os.path.join(root, name)
+                    st = os.lstat(full_path)
+                    entry = {
+                        'name': os.path.relpath(full_path, directory).replace(os.sep, '/'),
+                        'mode': stat.S_IMODE(st.st_mode),
+                        'mtime': st.st_mtime,
+                    }
+                    if stat.S_ISLNK(st.st_mode):
+                        entry.update(type=SYMLINK, target=os.readlink(full_path))
+                        dirs[:] = [d for d in dirs if d != name]  # symlinks of directories are not followed
+                    elif stat.S_ISDIR(st.st_mode):
+                        entry['type'] = DIR
+                    elif stat.S_ISREG(st.st_mode):
+                        key = (st.st_dev, st.st_ino)
+                        if st.st_nlink > 1 and key in inodes:
+                            entry.update(type=LINK, target=inodes[key])
+                        else:
+                            inodes[key] = entry['name']
+                            entry.update(type=FILE, offset=f.tell(), size=st.st_size)
+                            with open(full_path, 'rb') as src:
+                                shutil.copyfileobj(src, f)
+                    else:
+                        logger.warning(f'Skipping special file {full_path}')
+                        continue
+                    toc.append(entry)
+
+            toc_offset = f.tell()
+            f.write(json.dumps(toc, separators=(',', ':')).encode())
+            toc_size = f.tell() - toc_offset
+            f.seek(0)
+            f.write(_HEADER.pack(MAGIC, toc_offset, toc_size))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def unpack(path, directory):
+    """
+    Unpack packed file into new directory, it restores the directory tree packed by `pack`.
+    """
+    if os.path.exists(directory):
+        raise DataFormatFileExistsError(f'Directory {directory} already exists')
+    logger.info(f'Unpacking {path} into {directory}')
+    with PackedFile(path) as packed:
+        packed.extractall(directory)
+
+
+class _PackedMemberFile(io.RawIOBase):
+    # seekable window of packed file containing single member, it reads by pread, so members can be read
+    # concurrently through the same descriptor
+
+    def __init__(self, fd, offset, size):
+        super().__init__()
+        self._fd = fd
+        self._offset = offset
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def readinto(self, b):
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+        data = os.pread(self._fd, n, self._offset + self._pos)
+        b[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+class PackedFile:
+    """
+    Reader of file packed by `pack`. Only the header and the table of contents are read on open, members are read
+    by `pread` or viewed through memory map without unpacking.
+
+    :param path: path of packed file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mmap = None
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if len(header) < _HEADER.size or header[: len(MAGIC)] != MAGIC:
+                raise DataFormatBadTypeError(f'{path} is not a packed package')
+            _, toc_offset, toc_size = _HEADER.unpack(header)
+            toc = json.loads(os.pread(self._fd, toc_size, toc_offset))
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self.members = {entry['name']: entry for entry in toc}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.path!r})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the file, views returned by `view` have to be released before.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def getnames(self):
+        return list(self.members)
+
+    def getmember(self, name):
+        """
+        Return entry of table of contents of file member, links are followed.
+        """
+        try:
+            entry = self.members[name]
+            if entry['type'] == LINK:
+                entry = self.members[entry['target']]
+        except KeyError:
+            raise DataFormatFileNotFoundError(f'{name} is not in packed file {self.path}') from None
+        if entry['type'] != FILE:
+            raise DataFormatBadTypeError(f'{name} is not a regular file in packed file {self.path}')
+        return entry
+
+    def open(self, name):
+        """
+        Open member for binary reading.
+        """
+        entry = self.getmember(name)
+        return io.BufferedReader(_PackedMemberFile(self._fd, entry['offset'], entry['size']))
+
+    def read(self, name):
+        entry = self.getmember(name)
+        return os.pread(self._fd, entry['size'], entry['offset'])
+
+    def view(self, name):
+        """
+        Return zero-copy memoryview of content of member, the file is mapped into memory on first call.
+        """
+        entry = self.getmember(name)
+        if not entry['size']:
+            return memoryview(b'')
+        if self._mmap is None:
+            self._mmap = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)[entry['offset'] : entry['offset'] + entry['size']]
+
+    def _check_name(self, name):
+        # relative path without any parent references, so it cannot point outside of extracted directory
+        parts = name.split('/')
+        if not name or name.startswith('/') or '..' in parts or '' in parts:
+            raise DataFormatBadTypeError(f'Invalid member name {name} in packed file {self.path}')
+        return parts
+
+    def _check_inside(self, name, path, real_dir):
+        real_path = os.path.realpath(path)
+        if real_path != real_dir and not real_path.startswith(real_dir + os.sep):
+            raise DataFormatBadTypeError(f'Member {name} of packed file {self.path} points outside of the directory')
+
+    def extractall(self, directory):
+        """
+        Restore the packed directory tree into directory. Nothing is written outside of the directory, members with
+        names or symlink targets pointing outside of it (absolute or through '..' or other symlinks) raise
+        `DataFormatBadTypeError`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        real_dir = os.path.realpath(directory)
+        dirs = []
+        symlinks = []
+        for name, entry in self.members.items():
+            path = os.path.join(directory, *self._check_name(name))
+            # existing symlink of the directory must not redirect the member outside of it
+            self._check_inside(name, os.path.dirname(path), real_dir)
+            if os.path.islink(path):
+                raise DataFormatBadTypeError(f'Member {name} of packed file {self.path} would replace symlink {path}')
+            if entry['type'] == SYMLINK:
+                target = entry['target']
+                if not target or posixpath.isabs(target) or os.path.isabs(target):
+                    raise DataFormatBadTypeError(f'Symlink {name} in packed file {self.path} has absolute target')
+                symlinks.append((name, path, target))
+                continue
+            if entry['type'] == DIR:
+                os.makedirs(path, exist_ok=True)
+                dirs.append((path, entry))
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if entry['type'] == LINK:
+                target = entry['target']
+                if self.members.get(target, {}).get('type') != FILE:
+                    raise DataFormatBadTypeError(f'Hardlink {name} in packed file {self.path} has invalid target')
+                os.link(os.path.join(directory, *self._check_name(target)), path)
+                continue
+            with self.open(name) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.chmod(path, entry['mode'])
+            os.utime(path, (entry['mtime'], entry['mtime']))
+        # symlinks are created after all files, so no member is written through them, and they are checked when all
+        # of them exist, because symlink can be redirected by symlink of its parent created later
+        created = []
+        try:
+            for name, path, target in symlinks:
+                if os.path.lexists(path):
+                    raise DataFormatBadTypeError(f'Symlink {name} in packed file {self.path} replaces other member')
+                os.symlink(target, path)
+                created.append(path)
+            for name, path, _ in symlinks:
+                self._check_inside(name, path, real_dir)
+        except BaseException:
+            for path in created:
+                os.remove(path)
+            raise
+        # directories are finished at the end, their mtime is changed by creation of their content
+        for path, entry in reversed(dirs):
+            os.chmod(path, entry['mode'])
+            os.utime(path, (entry['mtime'], entry['mtime']))
+
+
+class PackedFS(MountedFS):
+    """
+    Read-only filesystem of packed file, paths of members are relative to the path of the packed file itself, i.e.
+    packed package 'result.pkg' contains 'result.pkg/meta.xml'. See `nepta.dataformat.vfs`.
+
+    :param path: path of packed file
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.packed = PackedFile(path)
+        # `pack` stores all directories, so parents of members need not be derived from their names
+        for name, entry in self.packed.members.items():
+            if entry['type'] == DIR:
+                self._dirs.add(name)
+            elif entry['type'] != SYMLINK:
+                self._files[name] = name
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.packed.path!r})'
+
+    def close(self):
+        self.packed.close()
+
+    def _open(self, member):
+        return self.packed.open(member)
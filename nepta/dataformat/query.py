@@ -0,0 +1,215 @@
+import re
+from functools import lru_cache
+
+from nepta.dataformat.exceptions import DataFormatQueryError
+
+_STEP_RE = re.compile(r'\s*(?P<name>[^\s/\[\]]+)\s*(?P<predicates>\[.*)?$')
+_PREDICATE_RE = re.compile(
+    r'\[\s*(?P<key>[^\s=!\]]+)\s*(?:(?P<op>!=|=)\s*(?P<value>"[^"]*"|\'[^\']*\'|[^\]]*?))?\s*\]\s*'
+)
+
+
+class _Predicate:
+    __slots__ = ('key', 'op', 'value')
+
+    def __init__(self, key, op, value):
+        self.key = key
+        self.op = op
+        self.value = value
+
+    def __call__(self, params):
+        if self.key not in params:
+            return False
+        if self.op is None:
+            return True
+        equal = str(params[self.key]) == self.value
+        return equal if self.op == '=' else not equal
+
+    def __repr__(self):
+        return f'[{self.key}]' if self.op is None else f'[{self.key}{self.op}{self.value!r}]'
+
+
+class _Step:
+    __slots__ = ('name', 'descendant', 'predicates')
+
+    def __init__(self, name, descendant, predicates):
+        self.name = name  # None matches any name
+        self.descendant = descendant
+        self.predicates = predicates
+
+    def matches(self, name, params):
+        if self.name is not None and self.name != name:
+            return False
+        for predicate in self.predicates:
+            if not predicate(params):
+                return False
+        return True
+
+    def __repr__(self):
+        axis = '//' if self.descendant else '/'
+        return f'{axis}{self.name or "*"}{"".join(map(repr, self.predicates))}'
+
+
+class Query:
+    """
+    Compiled query over section trees. Query is a subset of XPath relative to the context section:
+
+    * steps are separated by '/', the first step matches subsections of the context section
+    * '//' before a step matches sections at any depth below the previous step
+    * step is a section name or '*' matching any name
+    * step can be followed by predicates over params: `[key]` (param exists), `[key=value]` and `[key!=value]`,
+      values can be quoted and they are compared with string representation of params
+
+    Example: `test[name=tcp]/host[name="a.example.com"]//stream`
+
+    All matching sections are found in a single traversal in document order without intermediate collections.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.steps = self._parse(expression)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.expression!r})'
+
+    @staticmethod
+    def _split(expression):
+        # split by '/' outside of predicates
+        parts = ['']
+        depth = 0
+        quote = None
+        for char in expression:
+            if quote:
+                quote = None if char == quote else quote
+            elif depth and char in '"\'':
+                quote = char
+            elif char == '[':
+                depth += 1
+            elif char == ']':
+                depth -= 1
+            elif char == '/' and not depth:
+                parts.append('')
+                continue
+            parts[-1] += char
+        return parts
+
+    @classmethod
+    def _parse(cls, expression):
+        parts = cls._split(expression.strip())
+        if parts[0] == '' and len(parts) > 1:
+            parts.pop(0)  # query is always relative to context section, leading '/' is allowed
+
+        steps = []
+        descendant = False
+        for part in parts:
+            if part == '':
+                if descendant:
+                    raise DataFormatQueryError(f'Invalid query {expression!r}: too many slashes')
+                descendant = True
+                continue
+
+            match = _STEP_RE.match(part)
+            if match is None:
+                raise DataFormatQueryError(f'Invalid query {expression!r}: cannot parse step {part!r}')
+            predicates = []
+            rest = match.group('predicates') or ''
+            pos = 0
+            while pos < len(rest):
+                pred = _PREDICATE_RE.match(rest, pos)
+                if pred is None:
+                    raise DataFormatQueryError(f'Invalid query {expression!r}: cannot parse predicate {rest[pos:]!r}')
+                pos = pred.end()
+                value = pred.group('value')
+                if value is not None and value[:1] in ('"', "'"):
+                    value = value[1:-1]
+                predicates.append(_Predicate(pred.group('key'), pred.group('op'), value))
+
+            name = match.group('name')
+            steps.append(_Step(None if name == '*' else name, descendant, tuple(predicates)))
+            descendant = False
+
+        if descendant or not steps:
+            raise DataFormatQueryError(f'Invalid query {expression!r}: missing step')
+        return tuple(steps)
+
+    def _advance(self, states, name, params):
+        """
+        Match section against the steps expected at its level.
+
+        :param states: indexes of steps expected at the level of the section
+        :return: tuple (section matches the whole query, indexes of steps expected at the level of its subsections)
+        """
+        matched = False
+        next_states = []
+        last = len(self.steps) - 1
+        for i in states:
+            step = self.steps[i]
+            if step.descendant and i not in next_states:
+                next_states.append(i)
+            if step.matches(name, params):
+                if i == last:
+                    matched = True
+                elif i + 1 not in next_states:
+                    next_states.append(i + 1)
+        return matched, tuple(next_states)
+
+    def _search(self, section, states):
+        stack = [(sec, states) for sec in reversed(section._subsection_list())]
+        while stack:
+            sec, states = stack.pop()
+            matched, next_states = self._advance(states, sec.name, sec._param_map())
+            if matched:
+                yield sec
+            if next_states:
+                stack.extend((subsec, next_states) for subsec in reversed(sec._subsection_list()))
+
+    def find(self, section):
+        """
+        Lazily yield all sections below the context section matching the query.
+        """
+        return self._search(section, (0,))
+
+    def first(self, section, default=None):
+        return next(self.find(section), default)
+
+    def selector(self):
+        return _StreamSelector(self)
+
+
+class _StreamSelector:
+    """
+    Selector of elements for streaming XML loader, see `xml_file._SectionBuilder`. The root element is the context
+    section of the query.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self._stack = []
+
+    def enter(self, tag, attrib):
+        if not self._stack:
+            self._stack.append((0,))
+            return None
+        states = self._stack[-1]
+        if not states:
+            self._stack.append(states)
+            return None
+        matched, next_states = self.query._advance(states, tag, attrib)
+        self._stack.append(next_states)
+        return (next_states,) if matched else None
+
+    def leave(self):
+        self._stack.pop()
+
+    def results(self, section, token):
+        # selected section is built with its whole subtree, it may contain other matching sections
+        yield section
+        yield from self.query._search(section, token[0])
+
+
+@lru_cache(maxsize=256)
+def compile_query(expression):
+    """
+    Compile query expression, see `Query`. Compiled queries are cached.
+    """
+    return Query(expression)
@@ -1,12 +1,16 @@
 import logging
 import os
 import shutil
+import stat
 import tarfile
-import traceback
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 
 from nepta.dataformat.attachments import Path
-from nepta.dataformat.decorators import readonly_check_methods
+from nepta.dataformat.decorators import readonly_check_methods, track_changes_methods
+from nepta.dataformat.exceptions import DataFormatCompressionError, DataFormatFileNotFoundError
+from nepta.dataformat.vfs import LOCAL_FS, TarFS
 from nepta.dataformat.xml_file import Section, XMLFile
 
 logger = logging.getLogger(__name__)
@@ -18,83 +22,308 @@ class RemotePackage:
     path: Path
 
 
+def _run_per_host(func, hosts, max_workers):
+    # call func for each host concurrently, return failures {host: exception}
+    errors = {}
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(hosts))
+    if max_workers <= 1:
+        for host in hosts:
+            try:
+                func(host)
+            except Exception as e:
+                errors[host] = e
+    else:
+        with ThreadPoolExecutor(max_workers) as executor:
+            futures = {executor.submit(func, host): host for host in hosts}
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    errors[futures[future]] = future.exception()
+    return errors
+
+
+def _file_state(path):
+    st = os.lstat(path)
+    return (st.st_size, int(st.st_mtime)) if stat.S_ISREG(st.st_mode) else None
+
+
+class _RemotePackageList(list):
+    # list of remote packages which extracts archived package when it is accessed
+
+    def __init__(self, packages, access):
+        super().__init__(packages)
+        self._access = access
+
+    def __getitem__(self, item):
+        ret = super().__getitem__(item)
+        for rem_pkg in ret if isinstance(item, slice) else (ret,):
+            self._access(rem_pkg.host)
+        return ret
+
+    def __iter__(self):
+        for rem_pkg in super().__iter__():
+            self._access(rem_pkg.host)
+            yield rem_pkg
+
+
 # TODO: make generic collection maybe
 @readonly_check_methods('new', 'save', '__setattr__')
+@track_changes_methods('new', '__setattr__')
 class RemotePackageCollection:
+    """
+    Collection of packages of remote hosts. Each remote package is archived separately in
+    'remote_packages.archive/<host>.tar.xz' and it is extracted into 'remote_packages/<host>' when it is accessed for
+    the first time (until the collection is saved), so only accessed packages are extracted and only changed packages
+    are archived again.
+
+    Packages with the whole directory archived in 'remote_packages.tar.xz' by older versions are readable, they are
+    converted to the per-host layout by the first save which changes anything.
+
+    Archiving and extraction never change the working directory and they are serialized by lock of the collection, so
+    different packages can be processed concurrently and the same collection can be shared by threads. Hosts are
+    archived and extracted concurrently in thread pool (lzma releases GIL), see `max_workers` of `archive`.
+    """
+
     META_FILE = 'remote_packages.xml'
     RMPKG_DIR = 'remote_packages'
     ELEM_NAME = 'remote_package'
     ROOT_NAME = 'remote_packages'
+    ARCHIVE_DIR = 'remote_packages.archive'
+    ARCHIVE_SUFFIX = '.tar.xz'
+    LEGACY_ARCHIVE = 'remote_packages.tar.xz'
 
     @classmethod
-    def open(cls, path, readonly=False):
-        meta = XMLFile.open(os.path.join(path, cls.META_FILE))
+    def open(cls, path, readonly=False, fs=None):
+        """
+        :param fs: filesystem of the package (see `nepta.dataformat.vfs`), read-only filesystem implies readonly mode
+        """
+        fs = fs or LOCAL_FS
+        readonly = readonly or not fs.writable
+        meta = XMLFile.open(os.path.join(path, cls.META_FILE), fs=fs)
         collection = []
         for rem_pkg in meta.root:
-            rem_pkg.params['path'] = Path(path, rem_pkg.params['path'])
-            collection.append(RemotePackage(**rem_pkg.params))
-        collection = cls(path, meta, collection, readonly)
-        if not readonly:
-            try:
-                collection.unarchive()
-            except Exception as e:
-                logger.error('Cannot un-archive remote packages. Ignoring exception for compatibility.')
-                logger.error(e)
-                traceback.print_exc()
-        return collection
+            params = dict(rem_pkg.params)  # params are frozen if the file is read-only
+            params['path'] = Path(path, params['path'])
+            collection.append(RemotePackage(**params))
+        return cls(path, meta, collection, readonly)
 
     @classmethod
     def create(cls, path):
         os.mkdir(os.path.join(path, cls.RMPKG_DIR))
         pckg_meta = XMLFile.create(os.path.join(path, cls.META_FILE))
         pckg_meta.root = Section(cls.ROOT_NAME)
-        return cls(path, pckg_meta, [], False)
+        collection = cls(path, pckg_meta, [], False)
+        collection._modified = True
+        return collection
 
     def __init__(self, path, meta, collection, readonly):
         self.path = path
         self.meta = meta
-        self.collection = collection
+        self.collection = _RemotePackageList(collection, self._access)
+        self._modified = False
+        self._snapshots = {}  # extracted archived files of hosts: {host: {path: (size, mtime)}}
+        self._extract_on_access = not readonly
+        self._lock = threading.RLock()
         self._readonly = readonly
 
+    @property
+    def modified(self):
+        """
+        True if any remote package was added or if any file of extracted remote packages differs from the archive.
+        """
+        if self._readonly:
+            return False
+        return self._modified or bool(self._changed_hosts())
+
+    def _host_dir(self, host):
+        return os.path.join(self.path, self.RMPKG_DIR, host)
+
+    def _host_archive(self, host):
+        return os.path.join(self.path, self.ARCHIVE_DIR, f'{host}{self.ARCHIVE_SUFFIX}')
+
+    def _extracted_hosts(self):
+        rmpkg_dir = os.path.join(self.path, self.RMPKG_DIR)
+        return sorted(os.listdir(rmpkg_dir)) if os.path.isdir(rmpkg_dir) else []
+
+    def _extracted_files(self, host):
+        top = self._host_dir(host)
+        files = {os.path.relpath(top, self.path): _file_state(top)}
+        for root, dirs, filenames in os.walk(top):
+            for name in dirs + filenames:
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, self.path)] = _file_state(path)
+        return files
+
+    def _changed_hosts(self):
+        return [host for host in self._extracted_hosts() if self._snapshots.get(host) != self._extracted_files(host)]
+
     def __iter__(self):
         return iter(self.collection)
 
     def __len__(self):
         return len(self.collection)
 
+    def _access(self, host):
+        if not self._extract_on_access:
+            return
+        with self._lock:
+            if host not in self._snapshots and not os.path.exists(self._host_dir(host)):
+                self.extract(host)
+
     def new(self, hostname):
         path = os.path.join(self.RMPKG_DIR, hostname)
+        os.makedirs(os.path.join(self.path, self.RMPKG_DIR), exist_ok=True)
         os.mkdir(os.path.join(self.path, path))
         self.collection.append(RemotePackage(hostname, Path(self.path, path)))
         return self.collection[-1]
 
-    def archive(self):
-        logger.info('Compressing remote packages directory')
-        orig_dir = os.getcwd()
-        with tarfile.open(os.path.join(self.path, f'{self.RMPKG_DIR}.tar.xz'), 'w:xz') as tf:
-            os.chdir(self.path)
-            for item in os.listdir(self.RMPKG_DIR):
-                tf.add(os.path.join(self.RMPKG_DIR, item))
-            os.chdir(orig_dir)
-        shutil.rmtree(os.path.join(self.path, self.RMPKG_DIR))
-
-    def unarchive(self):
+    def open_package(self, host, file_opts=None, readonly=True, cache=None):
+        """
+        Open package of remote host as `DataPackage`. Archived package is not extracted, its files are read from the
+        archive into memory (see `nepta.dataformat.vfs.TarFS`), so it is always read-only. Extracted package is
+        opened from the disk.
+
+        :param file_opts: flags of package files which will be opened, all files by default
+        :param readonly: open extracted package in readonly mode
+        :param cache: optional `SectionCache` used for meta.xml and store.xml of extracted package
+        """
+        from nepta.dataformat.package import DataPackage, FileFlags  # noqa: PLC0415 (package imports this module)
+
+        file_opts = FileFlags.ALL if file_opts is None else file_opts
+        path = self._host_dir(host)
+        if os.path.exists(path):
+            return DataPackage.open(path, file_opts, readonly, cache)
+
+        archive = self._host_archive(host)
+        if not os.path.exists(archive):
+            archive = os.path.join(self.path, self.LEGACY_ARCHIVE)
+        if not os.path.exists(archive):
+            raise DataFormatFileNotFoundError(f'Remote package {host} is not archived')
+        fs = TarFS(archive, self.path)
+        if not fs.isdir(path):
+            raise DataFormatFileNotFoundError(f'Remote package {host} is not in archive {archive}')
+        return DataPackage.open(path, file_opts, fs=fs)
+
+    def _extract_archive(self, archive, accept):
+        # extract members of accepted hosts and remember their state, so changes can be detected
+        files = {}
+        with tarfile.open(archive, 'r:xz') as tf:
+            for mem in tf:
+                name = os.path.normpath(mem.name)
+                parts = name.split(os.sep)
+                if len(parts) < 2 or parts[0] != self.RMPKG_DIR or not accept(parts[1]):  # noqa: PLR2004
+                    continue
+                tf.extract(mem, self.path)
+                files[name] = (mem.size, int(mem.mtime)) if mem.isreg() else None
+        # hosts of different archives may be extracted concurrently, each of them updates only its own snapshots
+        for name, state in files.items():
+            self._snapshots.setdefault(name.split(os.sep)[1], {})[name] = state
+
+    def extract(self, host):
+        """
+        Extract archived remote package of host into remote packages directory.
+        """
+        archive = self._host_archive(host)
+        if not os.path.exists(archive):
+            archive = os.path.join(self.path, self.LEGACY_ARCHIVE)
+            if not os.path.exists(archive):
+                logger.warning(f'Remote package {host} is not archived')
+                return
+        logger.info(f'Decompressing remote package {host}')
+        with self._lock:
+            self._extract_archive(archive, lambda h: h == host)
+
+    def unarchive(self, max_workers=None):
+        """
+        Extract all archived remote packages, which are not extracted yet.
+
+        :param max_workers: number of hosts extracted concurrently, defaults to number of CPUs
+        """
         logger.info('Decompressing remote packages archive')
-        orig_dir = os.getcwd()
-        os.mkdir(os.path.join(self.path, self.RMPKG_DIR))
-        tar_path = os.path.join(self.path, f'{self.RMPKG_DIR}.tar.xz')
-        with tarfile.open(tar_path, 'r:xz') as tf:
-            os.chdir(self.path)
-            for mem in tf.getmembers():
-                tf.extract(mem)
-            os.chdir(orig_dir)
-        os.remove(tar_path)
-
-    def save(self):
+        with self._lock:
+            extracted = set(self._snapshots).union(self._extracted_hosts())
+            archive_dir = os.path.join(self.path, self.ARCHIVE_DIR)
+            hosts = []
+            if os.path.isdir(archive_dir):
+                for name in sorted(os.listdir(archive_dir)):
+                    host = name[: -len(self.ARCHIVE_SUFFIX)]
+                    if name.endswith(self.ARCHIVE_SUFFIX) and host not in extracted:
+                        hosts.append(host)
+
+            # common parent is created in advance, so concurrent extractions do not race for it
+            os.makedirs(os.path.join(self.path, self.RMPKG_DIR), exist_ok=True)
+            errors = _run_per_host(
+                lambda host: self._extract_archive(self._host_archive(host), lambda h: h == host), hosts, max_workers
+            )
+            for host, e in errors.items():
+                logger.error(f'Cannot extract remote package {host}: {e}')
+            if errors:
+                raise next(iter(errors.values()))
+
+            extracted.update(hosts)
+            legacy = os.path.join(self.path, self.LEGACY_ARCHIVE)
+            if os.path.exists(legacy):
+                self._extract_archive(legacy, lambda h: h not in extracted)
+
+    def _archive_host(self, host):
+        archive = self._host_archive(host)
+        tmp_archive = f'{archive}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with tarfile.open(tmp_archive, 'w:xz') as tf:
+                tf.add(self._host_dir(host), f'{self.RMPKG_DIR}/{host}')
+            os.replace(tmp_archive, archive)
+        except BaseException:
+            if os.path.exists(tmp_archive):
+                os.remove(tmp_archive)
+            raise
+
+    def archive(self, max_workers=None):
+        """
+        Archive extracted remote packages which were changed or added and remove the extracted directory. Archives
+        of unchanged packages are kept as they are. If archiving of any host fails, the remaining hosts are still
+        archived and `DataFormatCompressionError` with failures is raised, the extracted directory is kept then.
+
+        :param max_workers: number of hosts archived concurrently, defaults to number of CPUs
+        """
+        with self._lock:
+            changed = self._changed_hosts()
+            legacy = os.path.join(self.path, self.LEGACY_ARCHIVE)
+            migrate = os.path.exists(legacy) and (changed or self._modified)
+            if migrate:
+                # all packages of legacy archive are moved to per-host archives
+                self.unarchive(max_workers)
+                changed = self._extracted_hosts()
+
+            if changed:
+                logger.info(f'Compressing remote packages: {", ".join(changed)}')
+                os.makedirs(os.path.join(self.path, self.ARCHIVE_DIR), exist_ok=True)
+            errors = _run_per_host(self._archive_host, changed, max_workers)
+            for host, e in errors.items():
+                logger.error(f'Cannot compress remote package {host}: {e}')
+            if errors:
+                raise DataFormatCompressionError(errors)
+            if migrate:
+                os.remove(legacy)
+
+            if os.path.exists(os.path.join(self.path, self.RMPKG_DIR)):
+                shutil.rmtree(os.path.join(self.path, self.RMPKG_DIR))
+            self._snapshots = {}
+
+    def save(self, max_workers=None):
+        """
+        Save metadata of remote packages and archive them, see `archive`.
+
+        :param max_workers: number of hosts archived concurrently, defaults to number of CPUs
+        """
         logger.debug('Saving remote packages')
-        self.meta.root = Section(self.ROOT_NAME)
-        for rem_pkg in self.collection:
-            attachments_params = dict(rem_pkg.__dict__)
-            self.meta.root.subsections.append(Section(self.ELEM_NAME, attachments_params))
-        self.meta.save()
-        self.archive()
+        with self._lock:
+            if self._modified:
+                self.meta.root = Section(self.ROOT_NAME)
+                for rem_pkg in list.__iter__(self.collection):
+                    attachments_params = dict(rem_pkg.__dict__)
+                    self.meta.root.subsections.append(Section(self.ELEM_NAME, attachments_params))
+                self.meta.save()
+            self.archive(max_workers)
+            self._extract_on_access = False
+            self._modified = False
@@ -1,6 +1,21 @@
 from collections import OrderedDict
 
-from nepta.dataformat.decorators import readonly_check_methods
+from nepta.dataformat.decorators import readonly_check_methods, track_changes_methods
+from nepta.dataformat.exceptions import DataFormatReadOnlyExceptionError
+
+
+def _set_flags(obj, readonly, modified=False):
+    # containers are slotted to keep large section trees small, flags are set directly to skip wrapped __setattr__
+    object.__setattr__(obj, '_readonly', readonly)
+    object.__setattr__(obj, '_modified', modified)
+    object.__setattr__(obj, '_watchers', None)
+
+
+def _restore(cls, items, readonly, modified):
+    # unpickled containers are filled without readonly checks, versions of indexes are not pickled
+    obj = cls._build(items, readonly)
+    object.__setattr__(obj, '_modified', modified)
+    return obj
 
 
 @readonly_check_methods(
@@ -14,11 +29,29 @@ from nepta.dataformat.decorators import readonly_check_methods
     '__setattr__',
     '__setitem__',
 )
+@track_changes_methods('clear', 'pop', 'popitem', 'update', '__delitem__', '__setattr__', '__setitem__')
 class DataFormatOrderedDict(OrderedDict):
+    __slots__ = ('_readonly', '_modified', '_watchers')
+
     def __init__(self, *args, **kwargs):
+        self._modified = False
         self._readonly = False
+        self._watchers = None
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def _build(cls, items, readonly=False):
+        # fast constructor for loaders, it skips readonly checks of wrapped methods
+        obj = cls.__new__(cls)
+        setitem = OrderedDict.__setitem__
+        for key, value in items:
+            setitem(obj, key, value)
+        _set_flags(obj, readonly)
+        return obj
+
+    def __reduce__(self):
+        return _restore, (self.__class__, list(self.items()), self._readonly, self._modified)
+
 
 @readonly_check_methods(
     'append',
@@ -34,7 +67,69 @@ class DataFormatOrderedDict(OrderedDict):
     '__setattr__',
     '__setitem__',
 )
+@track_changes_methods(
+    'append',
+    'clear',
+    'extend',
+    'insert',
+    'pop',
+    'remove',
+    'reverse',
+    'sort',
+    '__iadd__',
+    '__imul__',
+    '__setattr__',
+    '__setitem__',
+)
 class DataFormatList(list):
+    __slots__ = ('_readonly', '_modified', '_watchers')
+
     def __init__(self, *args, **kwargs):
+        self._modified = False
         self._readonly = False
+        self._watchers = None
         super().__init__(*args, **kwargs)
+
+    @classmethod
+    def _build(cls, items, readonly=False):
+        # fast constructor for loaders, it skips readonly checks of wrapped methods
+        obj = cls.__new__(cls)
+        list.extend(obj, items)
+        _set_flags(obj, readonly)
+        return obj
+
+    def __reduce__(self):
+        return _restore, (self.__class__, list(self), self._readonly, self._modified)
+
+
+def _frozen_error(*args, **kwargs):  # noqa: ARG001
+    raise DataFormatReadOnlyExceptionError
+
+
+class FrozenParams(OrderedDict):
+    """
+    Immutable params of frozen sections, ordered mapping with the same interface as params of mutable sections. Every
+    mutating method raises `DataFormatReadOnlyExceptionError` directly, so reads do not pay for any readonly checks.
+    """
+
+    __slots__ = ()
+
+    _readonly = True
+    _modified = False
+
+    def __init__(self, *args, **kwargs):
+        if self:
+            raise DataFormatReadOnlyExceptionError
+        # OrderedDict.__init__ would fill params through the disabled __setitem__
+        setitem = OrderedDict.__setitem__
+        for key, value in dict(*args, **kwargs).items():
+            setitem(self, key, value)
+
+    __setitem__ = __delitem__ = __setattr__ = __delattr__ = __ior__ = _frozen_error
+    clear = move_to_end = pop = popitem = setdefault = update = _frozen_error
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({dict.__repr__(self)})'
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()),)
@@ -1,24 +1,193 @@
-from nepta.dataformat.decorators import readonly_check_methods
-from nepta.dataformat.safe_types import DataFormatList, DataFormatOrderedDict
+from array import array
+from collections import defaultdict
+from sys import intern
+from types import MappingProxyType
+
+from nepta.dataformat.decorators import Version, readonly_check_methods, track_changes_methods
+from nepta.dataformat.exceptions import DataFormatBadTypeError, DataFormatReadOnlyExceptionError
+from nepta.dataformat.query import compile_query
+from nepta.dataformat.safe_types import DataFormatList, DataFormatOrderedDict, FrozenParams
+
+_NO_PARAMS = MappingProxyType({})
+
+_TRUE_STRINGS = frozenset(('true', 'yes', 'on', '1'))
+_FALSE_STRINGS = frozenset(('false', 'no', 'off', '0', ''))
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_STRINGS:
+            return True
+        if lowered in _FALSE_STRINGS:
+            return False
+        raise ValueError(f'Invalid boolean value: {value!r}')
+    return bool(value)
+
+
+_CONVERTERS = {bool: _to_bool}
+_UNCACHED_TYPES = frozenset((int, float))
 
 
 @readonly_check_methods('__setattr__', 'delete_subsections')
+@track_changes_methods('__setattr__', 'delete_subsections')
 class Section:
+    """
+    Named node of section tree with params and subsections. Sections are slotted and their params and subsections
+    containers are created on the first access, so leaves of large trees stay small.
+    """
+
+    # '_watchers' are versions of indexed collections containing the section, shared with its params
+    __slots__ = ('name', '_params', '_subsections', '_readonly', '_modified', '_typed', '_watchers')
+
+    # frozen sections (see `FrozenSection`) are immutable snapshots, they are skipped by change tracking
+    _frozen = False
+
     def __init__(self, name, params=None, **kwargs):
-        self.name = name
+        self._modified = False
         self._readonly = False
-        self.params = DataFormatOrderedDict(params) if params is not None else DataFormatOrderedDict()
-        self.params.update(kwargs)
-        self.subsections = SectionCollection()
+        self._params = None
+        self._subsections = None
+        self._typed = None
+        self._watchers = None
+        self.name = name
+        if params is not None or kwargs:
+            self.params = DataFormatOrderedDict(params) if params is not None else DataFormatOrderedDict()
+            self.params.update(kwargs)
+
+    @classmethod
+    def _build(cls, name, params, subsections, readonly=False):
+        """
+        Fast constructor used by loaders. It skips readonly checks of regular constructor and wrapped methods, so
+        provided data are expected to be valid. Section name and param names are interned.
+
+        :param name: name of the section
+        :param params: sized iterable of (key, value) pairs
+        :param subsections: sized iterable of subsections
+        :param readonly: readonly flag of new section and its containers
+        """
+        sec = cls.__new__(cls)
+        setattr_ = object.__setattr__
+        setattr_(sec, 'name', intern(name))
+        if params:
+            setattr_(sec, '_params', DataFormatOrderedDict._build(((intern(k), v) for k, v in params), readonly))
+        else:
+            setattr_(sec, '_params', None)
+        setattr_(sec, '_subsections', SectionCollection._build(subsections, readonly) if subsections else None)
+        setattr_(sec, '_readonly', readonly)
+        setattr_(sec, '_modified', False)
+        setattr_(sec, '_typed', None)
+        setattr_(sec, '_watchers', None)
+        return sec
+
+    def __getstate__(self):
+        # versions of indexes and typed params are not pickled
+        return self.name, self._params, self._subsections, self._readonly, self._modified
+
+    def __setstate__(self, state):
+        # readonly sections have to be restored without readonly checks
+        setattr_ = object.__setattr__
+        for attr, value in zip(('name', '_params', '_subsections', '_readonly', '_modified'), state):
+            setattr_(self, attr, value)
+        setattr_(self, '_typed', None)
+        setattr_(self, '_watchers', None)
 
     def __getitem__(self, index):
         return self.subsections.filter(index)
 
     def __iter__(self):
-        return iter(self.subsections)
+        return iter(self._subsection_list())
 
     def __repr__(self):
-        return f'Section {self.name} ({self.params or ""})'
+        return f'Section {self.name} ({self._params or ""})'
+
+    @property
+    def params(self):
+        if self._params is None:
+            params = DataFormatOrderedDict._build((), self._readonly)
+            object.__setattr__(params, '_watchers', self._watchers)
+            object.__setattr__(self, '_params', params)
+        return self._params
+
+    @params.setter
+    def params(self, val):
+        if val is not None and not isinstance(val, DataFormatOrderedDict):
+            # saving and tracking of changes rely on flags of DataFormatOrderedDict
+            val = DataFormatOrderedDict(val)
+        if val is not None:
+            object.__setattr__(val, '_watchers', self._watchers)
+        self._params = val
+
+    def _watch(self, version):
+        # changes of the section and its params increment version of collection, which indexed it
+        watchers = self._watchers
+        if watchers is None:
+            watchers = []
+            object.__setattr__(self, '_watchers', watchers)
+            if isinstance(self._params, DataFormatOrderedDict):
+                object.__setattr__(self._params, '_watchers', watchers)
+        if version not in watchers:
+            watchers.append(version)
+
+    @property
+    def subsections(self):
+        if self._subsections is None:
+            object.__setattr__(self, '_subsections', SectionCollection._build((), self._readonly))
+        return self._subsections
+
+    @subsections.setter
+    def subsections(self, val):
+        self._subsections = val
+
+    def _param_map(self):
+        # params without creating empty container
+        return self._params if self._params is not None else _NO_PARAMS
+
+    def _subsection_list(self):
+        # list of subsections without creating empty container
+        return self._subsections.sections if self._subsections is not None else ()
+
+    def get_typed(self, key, type_, default=None):
+        """
+        Return param converted to given type. Values converted by bool or by custom converters are cached per param
+        and the cache entry is used only while the param holds the very same value object, so repeated access does not
+        parse the value again. Conversions to int and float are not cached, parsing is faster than the cache lookup.
+
+        :param key: name of param
+        :param type_: target type, e.g. int, float, bool (accepts 'true'/'false', 'yes'/'no', '1'/'0', ...) or
+            any other converter callable
+        :param default: value returned if the param does not exist
+        """
+        params = self._param_map()
+        if key not in params:
+            return default
+        raw = params[key]
+        if type(raw) is type_:
+            return raw
+        if type_ in _UNCACHED_TYPES:
+            return type_(raw)
+
+        cache_key = (key, type_)
+        cache = self._typed
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, '_typed', cache)
+        else:
+            entry = cache.get(cache_key)
+            if entry is not None and entry[0] is raw:
+                return entry[1]
+        value = _CONVERTERS.get(type_, type_)(raw)
+        cache[cache_key] = (raw, value)
+        return value
+
+    def get_int(self, key, default=None):
+        return self.get_typed(key, int, default)
+
+    def get_float(self, key, default=None):
+        return self.get_typed(key, float, default)
+
+    def get_bool(self, key, default=None):
+        return self.get_typed(key, bool, default)
 
     @property
     def readonly(self):
@@ -27,22 +196,208 @@ class Section:
     @readonly.setter
     def readonly(self, val):
         self._readonly = val
-        self.params._readonly = val
-        self.subsections.readonly = val
+        if self._params is not None:
+            self._params._readonly = val
+        if self._subsections is not None:
+            self._subsections.readonly = val
+
+    @property
+    def modified(self):
+        """
+        True if this section or any section of its subtree was changed since it was loaded or saved.
+        """
+        stack = [self]
+        while stack:
+            sec = stack.pop()
+            if sec._frozen:
+                continue
+            if sec._modified:
+                return True
+            if sec._params is not None and sec._params._modified:
+                return True
+            if sec._subsections is not None:
+                if sec._subsections.modified:
+                    return True
+                stack.extend(sec._subsections.sections)
+        return False
+
+    def reset_modified(self):
+        """
+        Mark this section and its whole subtree as unchanged.
+        """
+        stack = [self]
+        while stack:
+            sec = stack.pop()
+            if sec._frozen:
+                continue
+            object.__setattr__(sec, '_modified', False)
+            if sec._params is not None:
+                object.__setattr__(sec._params, '_modified', False)
+            if sec._subsections is not None:
+                sec._subsections.reset_modified()
+                stack.extend(sec._subsections.sections)
 
     def delete_subsections(self):
-        self.subsections = SectionCollection()
+        self._subsections = None
+
+    def freeze(self):
+        """
+        Return frozen snapshot of this section and its subtree, see `FrozenSection`. Mutable sections are copied, so
+        the snapshot is O(n) in size of their subtree and it is not affected by later changes of the section. Frozen
+        subtrees are shared with the snapshot instead of being copied, so freezing of frozen section is O(1). List
+        values of params are converted to tuples.
+        """
+        if self._frozen:
+            return self
+
+        built = []
+        stack = [(self, False)]
+        while stack:
+            sec, visited = stack.pop()
+            subsections = sec._subsection_list()
+            if sec._frozen:
+                built.append(sec)
+                continue
+            if subsections and not visited:
+                stack.append((sec, True))
+                stack.extend((subsec, False) for subsec in reversed(subsections))
+                continue
+
+            params = [(k, tuple(v) if isinstance(v, list) else v) for k, v in sec._param_map().items()]
+            if subsections:
+                frozen_sec = FrozenSection._build(sec.name, params, built[-len(subsections) :])
+                del built[-len(subsections) :]
+            else:
+                frozen_sec = FrozenSection._build(sec.name, params, ())
+            built.append(frozen_sec)
+        return built[0]
+
+    def find(self, query):
+        """
+        Lazily yield all sections of the subtree matching the query, see `Query`.
+
+        :param query: query string or compiled `Query` relative to this section, e.g. 'test[name=tcp]//stream'
+        """
+        if isinstance(query, str):
+            query = compile_query(query)
+        return query.find(self)
+
+    def find_first(self, query, default=None):
+        return next(self.find(query), default)
 
     def str_tree(self):
         return '\n'.join(str(x) for x in DisplayableSection.generate_tree(self))
 
 
-@readonly_check_methods('append', '__setattr__')
+class _SectionIndex:
+    """
+    Hash index of sections by their names and by (key, value) pairs of their params. Sections are stored in lists in
+    the same order as in the indexed collection.
+
+    The index is valid while `version` of the collection is not changed. The version is incremented by changes of the
+    collection, its list of sections and of the indexed sections and their params (they are watched by the version),
+    so changes of other trees do not invalidate the index. The index is not thread-safe, collection must not be
+    filtered while it is changed by another thread.
+    """
+
+    __slots__ = ('by_name', 'by_param', 'version', 'count', 'frozen')
+
+    def __init__(self, sections, version):
+        self.by_name = defaultdict(list)
+        self.by_param = defaultdict(list)
+        self.version = version
+        # frozen sections cannot be changed, so index of frozen collection is never invalidated
+        self.frozen = version is None
+        for sec in sections:
+            self.add(sec)
+        self.count = None if self.frozen else version.value
+
+    def add(self, sec):
+        if not self.frozen and not sec._frozen:
+            sec._watch(self.version)
+        self.by_name[sec.name].append(sec)
+        for item in sec._param_map().items():
+            try:
+                self.by_param[item].append(sec)
+            except TypeError:  # unhashable value (e.g. list) is not indexed
+                pass
+
+    def is_valid(self):
+        return self.frozen or self.count == self.version.value
+
+    def candidates(self, name, params):
+        """
+        Return the shortest list of sections which may match the filter or None if the index cannot be used.
+        """
+        best = None
+        if name is not None:
+            best = self.by_name.get(name, ())
+        for item in params.items():
+            try:
+                found = self.by_param.get(item, ())
+            except TypeError:
+                continue
+            if best is None or len(found) < len(best):
+                best = found
+        return best
+
+
+def _filter_sections(sections, index, name, params):
+    candidates = index.candidates(name, params) if index is not None else None
+    if candidates is None:
+        candidates = sections
+
+    ret = []
+    for s in candidates:
+        if name is None or s.name == name:
+            matched = True
+            sec_params = s._param_map()
+            for k, v in params.items():
+                if k not in sec_params or sec_params[k] != v:
+                    matched = False
+                    break
+            if matched:
+                ret.append(s)
+    return ret
+
+
+@readonly_check_methods('append', 'extend_records', 'extend_columns', '__setattr__')
+@track_changes_methods('__setattr__')
 class SectionCollection:
+    # filters of smaller collections do not use index
+    INDEX_MIN_SIZE = 16
+
+    __slots__ = ('sections', '_readonly', '_modified', '_index', '_watchers')
+
     def __init__(self):
+        self._modified = False
+        self._index = None
+        self._watchers = None
         self.sections = DataFormatList()
         self._readonly = False
 
+    @classmethod
+    def _build(cls, sections, readonly=False):
+        col = cls.__new__(cls)
+        setattr_ = object.__setattr__
+        setattr_(col, 'sections', DataFormatList._build(sections, readonly))
+        setattr_(col, '_readonly', readonly)
+        setattr_(col, '_modified', False)
+        setattr_(col, '_index', None)
+        setattr_(col, '_watchers', None)
+        return col
+
+    def __getstate__(self):
+        # index is not pickled, it is rebuilt by the first filter
+        return self.sections, self._readonly, self._modified
+
+    def __setstate__(self, state):
+        setattr_ = object.__setattr__
+        for attr, value in zip(('sections', '_readonly', '_modified'), state):
+            setattr_(self, attr, value)
+        setattr_(self, '_index', None)
+        setattr_(self, '_watchers', None)
+
     def __iter__(self):
         return iter(self.sections)
 
@@ -61,23 +416,221 @@ class SectionCollection:
         self._readonly = val
         self.sections._readonly = val
 
+    @property
+    def modified(self):
+        # only the collection itself, subsections are not checked
+        return self._modified or self.sections._modified
+
+    def reset_modified(self):
+        object.__setattr__(self, '_modified', False)
+        object.__setattr__(self.sections, '_modified', False)
+
+    def _get_index(self):
+        index = self._index
+        if index is not None and index.is_valid():
+            return index
+        if len(self.sections) < self.INDEX_MIN_SIZE:
+            return None
+        # the collection and its list of sections are watched by the same version as the indexed sections
+        watchers = self._watchers or [Version()]
+        object.__setattr__(self, '_watchers', watchers)
+        object.__setattr__(self.sections, '_watchers', watchers)
+        index = _SectionIndex(self.sections, watchers[0])
+        object.__setattr__(self, '_index', index)
+        return index
+
     def filter(self, name=None, **params):
-        ret = SectionCollection()
-        for s in self:
-            if name is None or s.name == name:
-                if len(params):
-                    matched = True
-                    for k, v in params.items():
-                        if k not in s.params or s.params[k] != v:
-                            matched = False
-                    if matched:
-                        ret.append(s)
-                else:
-                    ret.append(s)
-        return ret
+        """
+        Return collection of sections with given name and params. Index of sections is built on the first filter
+        call of large collection, so repeated filters do not scan whole collection. The index is kept up to date by
+        `append` and it is rebuilt after any other change of sections.
+        """
+        return SectionCollection._build(_filter_sections(self.sections, self._get_index(), name, params))
 
     def append(self, s):
-        self.sections.append(s)
+        self._extend((s,))
+
+    def extend_records(self, name, records):
+        """
+        Append new sections with the same name and params taken from records. All sections are created in a single
+        pass without readonly checks of individual objects, so it is much faster than appending of `Section` objects.
+
+        :param name: name of new sections
+        :param records: iterable of mappings of params, e.g. `[{'id': 1, 'value': 0.5}, {'id': 2, 'value': 0.7}]`
+        """
+        build = Section._build
+        self._extend([build(name, record.items(), ()) for record in records])
+
+    def extend_columns(self, name, columns):
+        """
+        Append new sections with the same name and params taken from columns of values, see `extend_records`.
+
+        :param name: name of new sections
+        :param columns: mapping of param names to sequences of the same length (e.g. lists, `array.array` or numpy
+            arrays), e.g. `{'id': [1, 2], 'value': array('d', [0.5, 0.7])}`
+        """
+        keys = [intern(key) for key in columns]
+        # arrays are converted to lists of python scalars at once
+        values = [col.tolist() if hasattr(col, 'tolist') else col for col in columns.values()]
+        lengths = {len(col) for col in values}
+        if len(lengths) > 1:
+            raise ValueError(f'Columns of sections {name} have different lengths: {sorted(lengths)}')
+
+        build = Section._build
+        self._extend([build(name, tuple(zip(keys, row)), ()) for row in zip(*values)])
+
+    def to_columns(self, keys, typecode='d', default=None, as_numpy=False):
+        """
+        Export params of all sections into contiguous arrays in a single pass, e.g. for vectorized aggregation of
+        samples.
+
+        :param keys: names of exported params
+        :param typecode: `array` typecode of columns, e.g. 'd' for floats or 'q' for integers
+        :param default: value used for sections without the param, NaN for float typecodes by default, integer
+            columns without default raise `DataFormatBadTypeError` for sections without the param
+        :param as_numpy: return numpy arrays (they share memory with the exported arrays), numpy has to be installed
+        :return: dict of param names to `array.array` or numpy arrays
+        """
+        is_float = typecode in ('f', 'd')
+        convert = float if is_float else int
+        if default is None and is_float:
+            default = float('nan')
+        columns = {key: array(typecode) for key in keys}
+        appends = [(key, col.append) for key, col in columns.items()]
+        for sec in self.sections:
+            params = sec._param_map()
+            for key, append in appends:
+                value = params.get(key, default)
+                if value is None:
+                    raise DataFormatBadTypeError(
+                        f'Section {sec.name} has no param {key} and no default is given for typecode {typecode!r}'
+                    )
+                append(convert(value))
+
+        if as_numpy:
+            # optional dependency, it is imported only when requested
+            import numpy as np  # noqa: PLC0415
+
+            return {
+                key: np.frombuffer(col, dtype=typecode) if len(col) else np.zeros(0, dtype=typecode)
+                for key, col in columns.items()
+            }
+        return columns
+
+    def _extend(self, new_sections):
+        index = self._index
+        if index is not None and not index.is_valid():
+            index = None
+        self.sections.extend(new_sections)
+        if index is not None:
+            for s in new_sections:
+                index.add(s)
+            index.count = index.version.value
+
+
+def _frozen_error(*args, **kwargs):  # noqa: ARG001
+    raise DataFormatReadOnlyExceptionError
+
+
+class FrozenSection(Section):
+    """
+    Immutable snapshot of section tree used for files opened in readonly mode. Params are `FrozenParams` and
+    subsections are `FrozenSectionCollection`, so the snapshot is read without any readonly checks, it is never
+    traversed by change tracking and leaves share one empty params and one empty subsections object. Every attempt
+    to change the snapshot raises `DataFormatReadOnlyExceptionError`.
+    """
+
+    __slots__ = ()
+
+    _frozen = True
+    _readonly = True
+    _modified = False
+
+    def __init__(self, name, params=None, subsections=(), **kwargs):
+        params = {k: tuple(v) if isinstance(v, list) else v for k, v in dict(params or (), **kwargs).items()}
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, '_params', FrozenParams(params) if params else _NO_FROZEN_PARAMS)
+        object.__setattr__(
+            self, '_subsections', FrozenSectionCollection(sec.freeze() for sec in subsections) or _NO_FROZEN_SECTIONS
+        )
+        object.__setattr__(self, '_typed', None)
+
+    @classmethod
+    def _build(cls, name, params, subsections, readonly=True):  # noqa: ARG003
+        sec = cls.__new__(cls)
+        setattr_ = object.__setattr__
+        setattr_(sec, 'name', intern(name))
+        setattr_(sec, '_params', FrozenParams((intern(k), v) for k, v in params) if params else _NO_FROZEN_PARAMS)
+        setattr_(sec, '_subsections', FrozenSectionCollection(subsections) if subsections else _NO_FROZEN_SECTIONS)
+        setattr_(sec, '_typed', None)
+        return sec
+
+    __setattr__ = __delattr__ = _frozen_error
+
+    def _param_map(self):
+        return self._params
+
+    def _subsection_list(self):
+        return self._subsections
+
+    def __reduce__(self):
+        return _rebuild_frozen, (self.name, dict(self._params), tuple(self._subsections))
+
+    @property
+    def readonly(self):
+        return True
+
+    @property
+    def modified(self):
+        return False
+
+    def reset_modified(self):
+        pass
+
+
+class FrozenSectionCollection(tuple):
+    """
+    Immutable collection of frozen sections with the same interface as `SectionCollection`.
+    """
+
+    INDEX_MIN_SIZE = SectionCollection.INDEX_MIN_SIZE
+
+    _readonly = True
+    _modified = False
+    readonly = True
+    modified = False
+
+    __setattr__ = __delattr__ = append = extend_records = extend_columns = _frozen_error
+    to_columns = SectionCollection.to_columns
+
+    @property
+    def sections(self):
+        return self
+
+    def reset_modified(self):
+        pass
+
+    def _get_index(self):
+        if len(self) < self.INDEX_MIN_SIZE:
+            return None
+        index = self.__dict__.get('_index')
+        if index is None:
+            index = self.__dict__['_index'] = _SectionIndex(self, None)
+        return index
+
+    def filter(self, name=None, **params):
+        """
+        See `SectionCollection.filter`, the result is frozen collection.
+        """
+        return FrozenSectionCollection(_filter_sections(self, self._get_index(), name, params))
+
+
+def _rebuild_frozen(name, params, subsections):
+    return FrozenSection._build(name, params.items(), subsections)
+
+
+_NO_FROZEN_PARAMS = FrozenParams()
+_NO_FROZEN_SECTIONS = FrozenSectionCollection()
 
 
 class DisplayableSection:
@@ -0,0 +1,168 @@
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from nepta.dataformat.exceptions import DataFormatBadTypeError
+
+logger = logging.getLogger(__name__)
+
+# magic, format version, typecode, item size, byte order ('<' or '>'), padding to keep samples aligned
+_HEADER = struct.Struct('<4sBcBc8x')
+_MAGIC = b'NDFS'
+_VERSION = 1
+_NATIVE_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+
+HEADER_SIZE = _HEADER.size
+TYPECODES = 'bBhHiIlLqQfd'
+
+
+def _check_typecode(typecode):
+    if typecode not in TYPECODES or len(typecode) != 1:
+        raise DataFormatBadTypeError(f'Unsupported typecode of series: {typecode!r}')
+
+
+def _read_header(f, path):
+    data = f.read(HEADER_SIZE)
+    if len(data) != HEADER_SIZE:
+        raise DataFormatBadTypeError(f'{path} is not a series file')
+    magic, version, typecode, itemsize, byteorder = _HEADER.unpack(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise DataFormatBadTypeError(f'{path} is not a series file (version {version})')
+    typecode = typecode.decode('latin-1')
+    _check_typecode(typecode)
+    # size of some typecodes (e.g. 'l') depends on platform
+    if itemsize != array(typecode).itemsize:
+        raise DataFormatBadTypeError(f'Series {path} was created on incompatible platform')
+    return typecode, itemsize, byteorder
+
+
+def create_series(path, typecode):
+    """
+    Create empty series file with samples of given `array` typecode.
+    """
+    _check_typecode(typecode)
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, typecode.encode(), array(typecode).itemsize, _NATIVE_ORDER))
+
+
+class SeriesReader:
+    """
+    Read-only view of series file. Samples are memory mapped, so `values` (memoryview of the samples) is available
+    without reading or copying the file, e.g. `numpy.frombuffer(reader.values, reader.typecode)` is zero-copy. Series
+    written on machine with different byte order is loaded into memory and byte-swapped.
+
+    Only samples complete at the time of opening are visible, so the series can be read while it is written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = None
+        try:
+            self.typecode, itemsize, byteorder = _read_header(self._file, path)
+            count = (os.fstat(self._file.fileno()).st_size - HEADER_SIZE) // itemsize
+            if byteorder != _NATIVE_ORDER:
+                samples = array(self.typecode)
+                samples.fromfile(self._file, count)
+                samples.byteswap()
+                self.values = memoryview(samples)
+            elif count:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.values = memoryview(self._mmap)[HEADER_SIZE : HEADER_SIZE + count * itemsize].cast(self.typecode)
+            else:
+                self.values = memoryview(array(self.typecode))
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, item):
+        return self.values[item]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def to_array(self):
+        """
+        Return copy of samples as `array.array`.
+        """
+        return array(self.typecode, self.values)
+
+    def close(self):
+        """
+        Release the mapping, views obtained from `values` must not be used afterwards.
+        """
+        if getattr(self, 'values', None) is not None:
+            self.values.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+
+class SeriesWriter:
+    """
+    Incremental writer of series file created by `create_series`. Samples are buffered and written in blocks, every
+    flushed block is immediately visible to new readers. Incomplete trailing sample (e.g. after crash of writer) is
+    discarded when the series is opened for writing again.
+
+    :param path: path to existing series file
+    :param buffer_size: number of buffered samples
+    """
+
+    def __init__(self, path, buffer_size=4096):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._file = open(path, 'r+b')
+        try:
+            self.typecode, itemsize, byteorder = _read_header(self._file, path)
+            if byteorder != _NATIVE_ORDER:
+                raise DataFormatBadTypeError(f'Series {path} was created on incompatible platform')
+            size = self._file.seek(0, os.SEEK_END)
+            complete = HEADER_SIZE + (size - HEADER_SIZE) // itemsize * itemsize
+            if complete != size:
+                logger.warning(f'Discarding incomplete sample of series {path}')
+                self._file.truncate(complete)
+                self._file.seek(complete)
+        except Exception:
+            self._file.close()
+            raise
+        self._buffer = array(self.typecode)
+
+    def append(self, value):
+        self._buffer.append(value)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def extend(self, values):
+        self._buffer.extend(values)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            del self._buffer[:]
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,261 @@
+import abc
+import io
+import logging
+import os
+import posixpath
+import threading
+import zipfile
+from collections import OrderedDict
+
+from nepta.dataformat.archive_index import get_archive_index
+from nepta.dataformat.compression import get_codec
+from nepta.dataformat.exceptions import (
+    DataFormatBadTypeError,
+    DataFormatFileNotFoundError,
+    DataFormatReadOnlyExceptionError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LocalFS:
+    """
+    Filesystem of the machine, the default filesystem of packages.
+    """
+
+    writable = True
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+    def open(self, path, mode='r', encoding=None):
+        return open(path, mode, encoding=encoding)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def isfile(self, path):
+        return os.path.isfile(path)
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def close(self):
+        pass
+
+
+LOCAL_FS = LocalFS()
+
+
+def _archive_codec(archive):
+    name = os.path.basename(archive)
+    if name.endswith('.tar'):
+        return get_codec('tar')
+    if name.endswith('.tgz'):
+        return get_codec('gz')
+    if '.tar.' not in name:
+        raise DataFormatBadTypeError(f'Cannot detect compression of archive {archive}')
+    return get_codec(name.rsplit('.tar.', 1)[1])
+
+
+def is_bundle(path):
+    """
+    Return True if path is a file with suffix of archive supported by `open_bundle`: '.zip', '.tar', '.tgz' or
+    '.tar.<compression>' of registered codec (see `nepta.dataformat.compression.register_codec`).
+    """
+    name = os.path.basename(path)
+    if name.endswith(('.zip', '.tar', '.tgz')):
+        return os.path.isfile(path)
+    if '.tar.' not in name:
+        return False
+    try:
+        get_codec(name.rsplit('.tar.', 1)[1])
+    except DataFormatBadTypeError:
+        return False
+    return os.path.isfile(path)
+
+
+def open_bundle(path, root=''):
+    """
+    Return read-only filesystem of zip or tar archive (see `is_bundle`) mounted at the path of the archive itself,
+    i.e. member 'meta.xml' of 'result.tar.xz' has path 'result.tar.xz/meta.xml'.
+
+    :param root: directory of archive mounted at the path, e.g. 'result' for archive of 'result' directory
+    """
+    if os.path.basename(path).endswith('.zip'):
+        return ZipFS(path, path, root)
+    return TarFS(path, path, root=root)
+
+
+class MountedFS(abc.ABC):
+    """
+    Base of read-only filesystems of containers (archives) mounted at directory, i.e. files of the container have
+    paths as if the container was extracted into the directory. Subclasses register names of members by `_add`.
+
+    :param mount_point: directory, which the container would be extracted into
+    :param root: directory of container mounted at the mount point, members outside of it are not accessible
+    """
+
+    writable = False
+
+    def __init__(self, mount_point, root=''):
+        self.mount_point = os.path.abspath(mount_point)
+        self.root = root.strip('/')
+        self._files = {}  # {name relative to root: name of member}
+        self._dirs = {''}
+
+    def _add(self, member, is_dir=False):
+        name = posixpath.normpath(member).lstrip('/')
+        if self.root:
+            if not name.startswith(f'{self.root}/'):
+                return
+            name = name[len(self.root) + 1 :]
+        if name in ('', '.'):
+            return
+        if is_dir:
+            self._dirs.add(name)
+        else:
+            self._files[name] = member
+        parent = posixpath.dirname(name)
+        while parent not in self._dirs:
+            self._dirs.add(parent)
+            parent = posixpath.dirname(parent)
+
+    def _name(self, path):
+        # name relative to root, None for path outside of the mount point
+        rel_path = os.path.relpath(os.path.abspath(path), self.mount_point)
+        if rel_path == os.curdir:
+            return ''
+        if rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+            return None
+        return rel_path.replace(os.sep, '/')
+
+    def _member(self, path):
+        try:
+            return self._files[self._name(path)]
+        except KeyError:
+            raise DataFormatFileNotFoundError(f'{path} is not a file of {self}') from None
+
+    def exists(self, path):
+        name = self._name(path)
+        return name in self._dirs or name in self._files
+
+    def isfile(self, path):
+        return self._name(path) in self._files
+
+    def isdir(self, path):
+        return self._name(path) in self._dirs
+
+    def listdir(self, path):
+        name = self._name(path)
+        if name not in self._dirs:
+            raise DataFormatFileNotFoundError(f'{path} is not a directory of {self}')
+        prefix = f'{name}/' if name else ''
+        children = {
+            member[len(prefix) :].split('/', 1)[0]
+            for member in (*self._files, *self._dirs)
+            if member.startswith(prefix) and member != name
+        }
+        return sorted(children)
+
+    def open(self, path, mode='r', encoding=None):
+        if set(mode) & set('wax+'):
+            raise DataFormatReadOnlyExceptionError(f'{self} is read-only')
+        f = self._open(self._member(path))
+        return f if 'b' in mode else io.TextIOWrapper(f, encoding=encoding)
+
+    @abc.abstractmethod
+    def _open(self, member):
+        """
+        Return binary file object reading member.
+        """
+
+    def close(self):
+        pass
+
+
+class TarFS(MountedFS):
+    """
+    Read-only filesystem of tar archive mounted at directory. Files are read directly from the archive (see
+    `ArchiveIndex`). Files smaller than the cache are kept in memory, so repeatedly read files are not decompressed
+    again, larger files are streamed.
+
+    :param archive: path of archive
+    :param mount_point: directory, which the archive would be extracted into
+    :param codec: codec of archive, detected from suffix of archive by default (e.g. '.tar.xz')
+    :param cache_size: max total size of cached files in bytes
+    :param root: directory of archive mounted at the mount point
+    """
+
+    def __init__(self, archive, mount_point, codec=None, cache_size=64 * 1024 * 1024, root=''):
+        super().__init__(mount_point, root)
+        self.archive = archive
+        self.codec = codec or _archive_codec(archive)
+        self.cache_size = cache_size
+        self._index = get_archive_index(archive, self.codec)
+        for name, tarinfo in self._index.members.items():
+            self._add(name, tarinfo.isdir())
+        self._cache = OrderedDict()
+        self._cached_size = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.archive!r}, {self.mount_point!r})'
+
+    def read_bytes(self, path):
+        """
+        Return content of file, the content is cached.
+        """
+        return self._read_member(self._member(path))
+
+    def _read_member(self, member):
+        with self._lock:
+            data = self._cache.get(member)
+            if data is not None:
+                self._cache.move_to_end(member)
+                return data
+
+        data = self._index.read(member)
+        if len(data) <= self.cache_size:
+            with self._lock:
+                if member not in self._cache:
+                    self._cache[member] = data
+                    self._cached_size += len(data)
+                while self._cached_size > self.cache_size:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_size -= len(evicted)
+        return data
+
+    def _open(self, member):
+        if self._index.getmember(member).size > self.cache_size:
+            return self._index.open(member)
+        return io.BytesIO(self._read_member(member))
+
+
+class ZipFS(MountedFS):
+    """
+    Read-only filesystem of zip archive mounted at directory, files are decompressed while they are read.
+
+    :param archive: path of archive
+    :param mount_point: directory, which the archive would be extracted into
+    :param root: directory of archive mounted at the mount point
+    """
+
+    def __init__(self, archive, mount_point, root=''):
+        super().__init__(mount_point, root)
+        self.archive = archive
+        self._zip = zipfile.ZipFile(archive)
+        for info in self._zip.infolist():
+            self._add(info.filename, info.is_dir())
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.archive!r}, {self.mount_point!r})'
+
+    def _open(self, member):
+        return self._zip.open(member)
+
+    def close(self):
+        self._zip.close()
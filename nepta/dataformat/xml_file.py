@@ -1,26 +1,242 @@
 import os
 import xml.etree.ElementTree as ET
-from collections import OrderedDict
-from xml.dom import minidom
 
-from nepta.dataformat.decorators import readonly_check_methods
+from nepta.dataformat.decorators import readonly_check_methods, track_changes_methods
 from nepta.dataformat.exceptions import DataFormatFileExistsError, DataFormatFileNotFoundError, DataFormatNullFileError
-from nepta.dataformat.section import Section
+from nepta.dataformat.query import Query, compile_query
+from nepta.dataformat.section import FrozenSection, Section
+from nepta.dataformat.vfs import LOCAL_FS
+
+LIST_TYPE = 'list'
+
+
+class _PathSelector:
+    """
+    Selector of elements for `_SectionBuilder` driven by predicate over tuple of section names leading from root
+    (excluded) to tested section.
+    """
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self._path = []  # names of entered elements, root included
+
+    def enter(self, tag, attrib):  # noqa: ARG002
+        self._path.append(tag)
+        return self.predicate(tuple(self._path[1:]))
+
+    def leave(self):
+        self._path.pop()
+
+    def results(self, section, token):  # noqa: ARG002
+        yield section
+
+
+def _root_selector():
+    return _PathSelector(lambda path: not path)
+
+
+def _compile_path_filter(path_filter):
+    """
+    Convert path filter into selector of `_SectionBuilder`.
+
+    :param path_filter: None (children of root), `Query`, query string (see `Query`, e.g. 'test[name=tcp]/*//stream')
+        or predicate over tuple of section names leading from root (excluded) to tested section
+    """
+    if path_filter is None:
+        path_filter = '*'
+    if isinstance(path_filter, str):
+        path_filter = compile_query(path_filter.rstrip('/'))
+    if isinstance(path_filter, Query):
+        return path_filter.selector()
+    return _PathSelector(path_filter)
+
+
+class _SectionBuilder:
+    """
+    Parser target which builds sections directly from expat callbacks. Every element is converted into section as
+    soon as it is closed, so no ElementTree is ever created. Child elements of nodes with attribute type="list" are
+    loaded as list value of their parent section.
+
+    Only subtrees chosen by `selector` are built. Selector is notified about every element outside of built subtrees
+    by `enter(tag, attrib)` and `leave()` calls; a truthy token returned from `enter` selects the element. Complete
+    selected sections are collected in `ready` list together with their tokens, which is expected to be drained by
+    the caller while the document is still being parsed.
+    """
+
+    def __init__(self, selector, readonly=False):
+        self.selector = selector
+        self.readonly = readonly
+        self._build = FrozenSection._build if readonly else Section._build
+        self.ready = []
+        # opened elements: (tag, attributes, already built subsections or None, selection token, is entered)
+        self._stack = []
+        self._list_depth = 0
+        self._list_values = None
+
+    def start(self, tag, attrib):
+        if self._list_depth:
+            if self._list_depth == 1 and self._list_values is not None:
+                self._list_values.append(attrib['value'])
+            self._list_depth += 1
+            return
+
+        building = bool(self._stack) and self._stack[-1][2] is not None
+        token = None if building else self.selector.enter(tag, attrib)
+        entered = not building
+        building = building or bool(token)
+
+        if self._stack and attrib.get('type', '') == LIST_TYPE:
+            self._list_depth = 1
+            self._list_values = [] if building else None
+        self._stack.append((tag, attrib, [] if building else None, token, entered))
+
+    def end(self, tag):  # noqa: ARG002
+        if self._list_depth > 1:
+            self._list_depth -= 1
+            return
+
+        tag, attrib, subsections, token, entered = self._stack.pop()
+        if entered:
+            self.selector.leave()
+        if subsections is None:
+            self._list_depth = 0
+            return
+
+        if self._list_depth:
+            params = [(k, v) for k, v in attrib.items() if k != 'type']
+            # values of frozen sections are immutable
+            params.append(('value', tuple(self._list_values) if self.readonly else self._list_values))
+            sec = self._build(tag, params, ())
+            self._list_depth = 0
+            self._list_values = None
+        else:
+            sec = self._build(tag, attrib.items(), subsections)
+
+        if token:
+            self.ready.append((sec, token))
+        else:
+            self._stack[-1][2].append(sec)
+
+    def close(self):
+        pass
+
+
+def _iter_parsed_sections(source, selector=None, readonly=False, chunk_size=64 * 1024):
+    """
+    Incrementally parse XML from binary file object and yield sections chosen by selector as soon as they are
+    complete.
+
+    :param source: file object opened in binary mode
+    :param selector: selector of `_SectionBuilder`, defaults to the root section
+    :param readonly: build frozen sections (see `FrozenSection`)
+    :param chunk_size: size of chunks fed to the parser
+    """
+    selector = _root_selector() if selector is None else selector
+    builder = _SectionBuilder(selector, readonly)
+    parser = ET.XMLParser(target=builder)
+    for chunk in iter(lambda: source.read(chunk_size), b''):
+        parser.feed(chunk)
+        for sec, token in builder.ready:
+            yield from selector.results(sec, token)
+        builder.ready.clear()
+    parser.close()
+    for sec, token in builder.ready:
+        yield from selector.results(sec, token)
+
+
+def _escape_attr(value):
+    return (
+        value.replace('&', '&amp;')
+        .replace('<', '&lt;')
+        .replace('"', '&quot;')
+        .replace('>', '&gt;')
+        .replace('\n', '&#10;')
+        .replace('\r', '&#13;')
+        .replace('\t', '&#9;')
+    )
+
+
+def _write_sections(f, root, indent='  '):
+    """
+    Write section tree into text file in a single pass. The layout is the same as the one produced by
+    `minidom.writexml(indent='  ', addindent='  ', newl='\\n')`. List params are written as `item` child elements of
+    the section marked by attribute type="list".
+
+    :param f: file opened in text mode
+    :param root: root section
+    :param indent: indentation of one level
+    """
+    f.write('<?xml version="1.0" ?>\n')
+    stack = [(root, 1)]  # sections to be written, or closing tags (as strings)
+    while stack:
+        sec, depth = stack.pop()
+        prefix = indent * depth
+        if isinstance(sec, str):
+            f.write(f'{prefix}</{sec}>\n')
+            continue
+
+        attrs = {}
+        items = []
+        for index, val in sec._param_map().items():
+            if isinstance(val, (list, tuple)):
+                attrs['type'] = LIST_TYPE
+                items.extend(val)
+            else:
+                attrs[index] = str(val)
+        attrs_str = ''.join(f' {k}="{_escape_attr(v)}"' for k, v in attrs.items())
+
+        subsections = sec._subsection_list()
+        if not items and not subsections:
+            f.write(f'{prefix}<{sec.name}{attrs_str}/>\n')
+            continue
+
+        f.write(f'{prefix}<{sec.name}{attrs_str}>\n')
+        item_prefix = prefix + indent
+        for item in items:
+            f.write(f'{item_prefix}<item value="{_escape_attr(str(item))}"/>\n')
+        stack.append((sec.name, depth))
+        stack.extend((subsec, depth + 1) for subsec in reversed(subsections))
+
+
+def _iter_file_sections(path, selector, readonly, fs):
+    with fs.open(path, 'rb') as f:
+        yield from _iter_parsed_sections(f, selector, readonly)
 
 
 @readonly_check_methods('__setattr__', 'save')
+@track_changes_methods('__setattr__')
 class XMLFile:
-    def __init__(self, path, root_section=None, readonly=False):
+    def __init__(self, path, root_section=None, readonly=False, fs=LOCAL_FS):
         self.path = path
         self.root = Section('root') if not root_section else root_section
+        self._fs = fs
+        self._modified = False
         self._readonly = readonly
 
     @classmethod
-    def open(cls, path, readonly=False):
-        if not os.path.exists(path) and not os.path.isfile(path):
+    def open(cls, path, readonly=False, cache=None, fs=None):
+        """
+        :param path: path to XML file
+        :param readonly: open file in readonly mode, section tree is loaded as frozen snapshot (see `FrozenSection`)
+        :param cache: optional `SectionCache` used to skip parsing of unchanged files
+        :param fs: filesystem of the file (see `nepta.dataformat.vfs`), read-only filesystem implies readonly mode
+        """
+        fs = fs or LOCAL_FS
+        if not fs.exists(path) and not fs.isfile(path):
             raise DataFormatFileNotFoundError('File %s does not exists' % path)
+        readonly = readonly or not fs.writable
+        if fs is not LOCAL_FS:
+            cache = None  # cache validates entries by stat of local files
+
+        if cache is not None:
+            root = cache.load(path, readonly)
+            if root is not None:
+                return cls(path, root, readonly=readonly)
 
-        return cls(path, None, readonly=readonly)._load()
+        xml_file = cls(path, None, readonly=readonly, fs=fs)._load()
+        if cache is not None:
+            cache.store(path, xml_file.root)
+        return xml_file
 
     @classmethod
     def create(cls, path):
@@ -30,71 +246,69 @@ class XMLFile:
         open(path, 'w').close()
         return cls(path)
 
+    @classmethod
+    def iter_sections(cls, path, path_filter=None, readonly=True, fs=None):
+        """
+        Lazily yield sections matching path filter directly from the file without loading the whole section tree.
+        Each section is yielded with its complete subtree as soon as it is parsed, everything else is thrown away.
+        Sections matching the filter inside of already yielded subtree are yielded after it.
+
+        :param path: path to XML file
+        :param path_filter: query relative to root section (see `Query`, e.g. 'test[name=tcp]/*//stream'), or
+            predicate accepting tuple of section names. Defaults to children of root.
+        :param readonly: yield frozen sections (see `FrozenSection`)
+        :param fs: filesystem of the file (see `nepta.dataformat.vfs`)
+        """
+        fs = fs or LOCAL_FS
+        if not fs.exists(path) and not fs.isfile(path):
+            raise DataFormatFileNotFoundError(f'File {path} does not exists')
+
+        return _iter_file_sections(path, _compile_path_filter(path_filter), readonly, fs)
+
     @property
     def readonly(self):
         return self._readonly
 
+    @property
+    def modified(self):
+        """
+        True if the section tree was changed since the file was opened or saved.
+        """
+        return self._modified or self.root.modified
+
     def save(self):
         self._save()
+        self.root.reset_modified()
+        self._modified = False
 
     def _load(self):
-        # Recursively load all child nodes (and its params)
-        # and interpret them as sections
-        def load_sections(root_node):
-            params_list = OrderedDict(root_node.attrib.items())
-            sec = Section(root_node.tag, params_list)
-
-            for child_node in root_node:
-                if child_node.attrib.get('type', '') == 'list':
-                    sec.subsections.append(
-                        Section(
-                            child_node.tag,
-                            value=[sub_node.attrib['value'] for sub_node in child_node],
-                            params={k: v for k, v in child_node.attrib.items() if k != 'type'},
-                        )
-                    )
-                else:
-                    sec.subsections.append(load_sections(child_node))
-
-            sec.readonly = self.readonly
-            return sec
-
-        tree = ET.parse(self.path)
-        root = tree.getroot()
-        self.__dict__['root'] = load_sections(root)
+        # Sections are built bottom-up from the closing events of the parser, so the whole ElementTree is never
+        # kept in memory and deep trees do not hit the recursion limit.
+        with self._fs.open(self.path, 'rb') as f:
+            (self.__dict__['root'],) = _iter_parsed_sections(f, readonly=self.readonly)
         return self
 
     def _save(self):
-        def save_sections(sec):
-            el = ET.Element(sec.name)
-            for index, val in sec.params.items():
-                if isinstance(val, list):
-                    el.set('type', 'list')
-                    for item in val:
-                        el.append(ET.Element('item', value=item))
-                else:
-                    el.set(index, str(val))
-
-            for subsec in sec.subsections:
-                el.append(save_sections(subsec))
-
-            return el
-
-        root = save_sections(self.root)
-        xml_str = ET.tostring(root)
-        xml_minidom = minidom.parseString(xml_str)
-        xml_file = open(self.path, 'w')
-        xml_minidom.writexml(xml_file, indent='  ', addindent='  ', newl='\n')
-        xml_file.close()
+        # write into temporary file first, so the original file is not truncated if serialization fails
+        tmp_path = f'{self.path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                _write_sections(f, self.root)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, self.path)
 
 
 @readonly_check_methods('save', '__setitem__', 'update')
+@track_changes_methods('__setitem__', 'update')
 class MetaXMLFile:
     @classmethod
-    def open(cls, path, readonly=False):
-        file = XMLFile.open(path)
+    def open(cls, path, readonly=False, cache=None, fs=None):
+        file = XMLFile.open(path, cache=cache, fs=fs)
         meta_sec = file.root.subsections.filter('Settings')[0]
-        return cls(file, meta_sec, readonly)
+        return cls(file, meta_sec, readonly or file.readonly)
 
     @classmethod
     def create(cls, path):
@@ -110,14 +324,26 @@ class MetaXMLFile:
         self._meta_section_ptr = meta_section
         self._val_dict = {}
         self._readonly = readonly
+        self._modified = False
         for sec in meta_section:
-            self._val_dict[sec.name] = sec.params['value']
+            value = sec.params['value']
+            # list values of frozen sections are tuples, metas have the same values in all modes
+            self._val_dict[sec.name] = list(value) if isinstance(value, tuple) else value
+
+    @property
+    def modified(self):
+        """
+        True if any value was set since the file was opened or saved. In-place changes of list values are not
+        tracked.
+        """
+        return self._modified or self._xml_file.modified
 
     def save(self):
         self._meta_section_ptr.delete_subsections()
         for k, v in self._val_dict.items():
             self._meta_section_ptr.subsections.append(Section(k, value=v))
         self._xml_file.save()
+        self._modified = False
 
     def update(self, kw):
         return self._val_dict.update(kw)
@@ -141,14 +367,14 @@ class MetaXMLFile:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if not self._readonly:
+        if not self._readonly and self.modified:
             self.save()
 
 
 class NullFile:
     # TODO think about better solution of this
 
-    def __init__(self, path, *args):  # noqa: ARG002
+    def __init__(self, path, *args, **kwargs):  # noqa: ARG002
         self.file = path
 
     def throw(self):
@@ -0,0 +1,87 @@
+import io
+import os
+import random
+import shutil
+import tarfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from nepta.dataformat.archive_index import ArchiveIndex, get_archive_index
+from nepta.dataformat.compression import _GzipSeekableFile, get_codec
+from nepta.dataformat.exceptions import DataFormatBadTypeError, DataFormatFileNotFoundError
+
+
+class ArchiveIndexTest(TestCase):
+    TEST_DIR = 'tmp'
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+        rnd = random.Random(0)
+        self.files = {
+            f'root/dir{i}/file{j}': bytes(rnd.randrange(64) for _ in range(rnd.randrange(1, 5000)))
+            for i in range(5)
+            for j in range(10)
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def create_archive(self, codec_name):
+        path = os.path.join(self.TEST_DIR, f'archive.tar.{codec_name}')
+        with tarfile.open(path, f'w:{codec_name}') as tf:
+            root = tarfile.TarInfo('root')
+            root.type = tarfile.DIRTYPE
+            tf.addfile(root)
+            for name, content in self.files.items():
+                tarinfo = tarfile.TarInfo(name)
+                tarinfo.size = len(content)
+                tf.addfile(tarinfo, io.BytesIO(content))
+            link = tarfile.TarInfo('root/link')
+            link.type = tarfile.SYMTYPE
+            link.linkname = 'dir1/file2'
+            tf.addfile(link)
+        return path
+
+    def test_read(self):
+        for codec_name in ('gz', 'bz2', 'xz'):
+            path = self.create_archive(codec_name)
+            index = ArchiveIndex(path, get_codec(codec_name))
+            self.assertEqual(index.getnames(), ['root', *self.files, 'root/link'])
+
+            names = list(self.files)
+            random.Random(1).shuffle(names)
+            for name in names:
+                self.assertEqual(index.read(name), self.files[name])
+            with index.open('root/link') as f:
+                self.assertEqual(f.readline(), self.files['root/dir1/file2'].split(b'\n')[0] + b'\n')
+
+            self.assertRaises(DataFormatFileNotFoundError, index.open, 'root/missing')
+
+    def test_gzip_seek_points(self):
+        path = self.create_archive('gz')
+        with patch.object(_GzipSeekableFile, 'SPACING', 4096), patch.object(_GzipSeekableFile, 'CHUNK_SIZE', 512):
+            index = ArchiveIndex(path, get_codec('gz'))
+            self.assertGreater(len(index._seek_points), 10)
+            self.assertEqual([p[0] for p in index._seek_points], sorted(p[0] for p in index._seek_points))
+            self.assertEqual(index._seek_points.offsets, [p[0] for p in index._seek_points])
+
+            for name in reversed(list(self.files)):
+                self.assertEqual(index.read(name), self.files[name])
+
+            # the stream is seekable in both directions
+            with get_codec('gz').open_stream(path, index._seek_points) as stream:
+                stream.seek(index.members['root/dir4/file9'].offset_data)
+                self.assertEqual(stream.read(100), self.files['root/dir4/file9'][:100])
+                stream.seek(index.members['root/dir0/file1'].offset_data)
+                self.assertEqual(stream.read(100), self.files['root/dir0/file1'][:100])
+
+    def test_cache(self):
+        path = self.create_archive('xz')
+        index = get_archive_index(path, get_codec('xz'))
+        self.assertIs(get_archive_index(path, get_codec('xz')), index)
+        self.assertRaises(DataFormatBadTypeError, index.open, 'root')
+
+        # changed archive is indexed again
+        del self.files['root/dir0/file0']
+        os.utime(self.create_archive('xz'), ns=(0, 0))
+        self.assertNotIn('root/dir0/file0', get_archive_index(path, get_codec('xz')))
@@ -1,13 +1,19 @@
 import os
 import shutil
+import stat
+import tarfile
 from collections import defaultdict
 from unittest import TestCase
 
 from nepta.dataformat import AttachmentTypes, Compression
 from nepta.dataformat.attachments import AttachmentCollection
+from nepta.dataformat.cas import ContentStore, file_digest
 from nepta.dataformat.exceptions import (
     DataFormatBadTypeError,
+    DataFormatCompressionError,
     DataFormatDuplicateKeyError,
+    DataFormatFileExistsError,
+    DataFormatFileNotFoundError,
     DataFormatReadOnlyExceptionError,
 )
 
@@ -39,6 +45,8 @@ class AttachmentCollectionTest(TestCase):
     def test_open(self):
         ac = AttachmentCollection.open(self.EXIST)
         self.assertEqual(len(ac), 4)
+        self.assertEqual(len(ac.att_meta.root.subsections), 4)
+        self.assertEqual(len(AttachmentCollection.open(self.EXIST, readonly=True).att_meta.root['attachment']), 4)
 
         counter = defaultdict(int)
         for att in ac:
@@ -49,6 +57,33 @@ class AttachmentCollectionTest(TestCase):
         self.assertEqual(counter[AttachmentTypes.COMMAND], 3)
         self.assertEqual(counter[AttachmentTypes.DIRECTORY], 1)
 
+    def test_lazy_open(self):
+        ac = AttachmentCollection.open(self.EXIST)
+        self.assertEqual(ac.collection._attachments, [None] * 4)
+
+        commands = ac.filter(name=AttachmentTypes.COMMAND)
+        self.assertEqual([att.name for att in commands], [AttachmentTypes.COMMAND] * 3)
+        self.assertEqual(ac.collection._attachments.count(None), 1)
+        self.assertEqual(ac.filter(name=AttachmentTypes.COMMAND, origin=commands[1].origin), [commands[1]])
+        self.assertEqual(ac.filter(compression=Compression.NONE), list(ac))
+        self.assertIs(ac.by_uuid(commands[2].uuid), commands[2])
+        self.assertIsNone(ac.by_uuid('missing'))
+        self.assertRaises(DataFormatBadTypeError, ac.filter, size=1)
+
+        # indexes are updated by new attachments
+        att = ac.new(AttachmentTypes.COMMAND, commands[1].origin, alias='cmd', compression=Compression.XZ)
+        self.assertEqual(ac.filter(name=AttachmentTypes.COMMAND, origin=commands[1].origin), [commands[1], att])
+        self.assertEqual(ac.filter(compression=Compression.XZ), [att])
+        self.assertIs(ac['cmd'], att)
+        self.assertEqual(ac.alias_map, {'cmd': att})
+        self.assertRaises(KeyError, ac.__getitem__, 'missing')
+        ac.save()
+
+        ac_check = AttachmentCollection.open(self.EXIST)
+        self.assertEqual(list(ac_check), list(ac))
+        self.assertEqual(ac_check.filter(compression=Compression.XZ), [att])
+        self.assertEqual(ac_check['cmd'], att)
+
     def test_create(self):
         ac = AttachmentCollection.create(self.NEW)
 
@@ -107,6 +142,18 @@ class AttachmentCollectionTest(TestCase):
 
         self.assertRaises(DataFormatDuplicateKeyError, ac1.new, AttachmentTypes.FILE, 'asdf', 'net')
 
+        alias_map = ac1.alias_map
+        self.assertIs(ac1.alias_map, alias_map)
+        att4 = ac1.new(AttachmentTypes.FILE, 'hosts', 'hosts')
+        self.assertIs(ac1.alias_map['hosts'], att4)
+        self.assertNotIn('hosts', alias_map)
+
+        # the former signature with alias map is still accepted
+        with self.assertWarns(DeprecationWarning):
+            ac2 = AttachmentCollection(ac1.path, ac1.att_meta, list(ac1), ac1.alias_map, True)
+        self.assertEqual(ac2['net'], att2)
+        self.assertRaises(DataFormatReadOnlyExceptionError, ac2.new, AttachmentTypes.FILE, 'readonly')
+
     def test_compression(self):
         ac = AttachmentCollection.create(self.NEW)
 
@@ -120,3 +167,260 @@ class AttachmentCollectionTest(TestCase):
 
         self.assertTrue(os.path.exists(att1.path.full_path + '.tar.bz2'))
         self.assertTrue(os.path.exists(att2.path.full_path + '.tar.xz'))
+
+    def test_parallel_compression(self):
+        for use_processes in (False, True):
+            ac = AttachmentCollection.create(self.NEW)
+            atts = []
+            for i, compression in enumerate((Compression.ZIP, Compression.BZIP2, Compression.XZ) * 2):
+                att = ac.new(AttachmentTypes.COMMAND, f'cmd {i}', compression=compression)
+                att.path.write(f'output {i}\n' * 1000)
+                atts.append(att)
+            # archive path occupied by directory, this compression fails
+            os.mkdir(atts[-1].archive_path)
+
+            with self.assertRaises(DataFormatCompressionError) as cm:
+                ac.save(max_workers=3, use_processes=use_processes)
+            self.assertEqual(list(cm.exception.errors), [atts[-1]])
+            self.assertTrue(ac.modified)
+            self.assertTrue(os.path.exists(atts[-1].path.full_path))
+            # no temporary archive is left behind
+            self.assertEqual(
+                sorted(os.listdir(os.path.dirname(atts[-1].path.full_path))),
+                sorted(os.path.basename(p) for p in (atts[-1].path.full_path, atts[-1].archive_path)),
+            )
+
+            for i, att in enumerate(atts[:-1]):
+                self.assertFalse(os.path.exists(att.path.full_path))
+                with tarfile.open(att.archive_path) as tf:
+                    self.assertEqual(tf.getnames(), [att.uuid])
+                    self.assertEqual(tf.extractfile(att.uuid).read(), f'output {i}\n'.encode() * 1000)
+
+            # failed attachment is compressed by the next save
+            os.rmdir(atts[-1].archive_path)
+            ac.save()
+            self.assertFalse(os.path.exists(atts[-1].path.full_path))
+            self.assertTrue(tarfile.is_tarfile(atts[-1].archive_path))
+            shutil.rmtree(self.NEW)
+            os.mkdir(self.NEW)
+
+    def test_compression_levels(self):
+        ac = AttachmentCollection.create(self.NEW)
+        content = ''.join(f'{i} {i * i} {i % 7}\n' for i in range(20000))
+        sizes = {}
+        for compression, level in (
+            (Compression.ZIP, 1),
+            (Compression.ZIP, 9),
+            (Compression.XZ, 0),
+            (Compression.XZ, None),
+        ):
+            att = ac.new(
+                AttachmentTypes.FILE, f'data {compression} {level}', compression=compression, compression_level=level
+            )
+            att.path.write(content)
+            sizes[compression, level] = att
+        ac.save()
+
+        for att in sizes.values():
+            with att.open_archive() as tf:
+                self.assertEqual(tf.extractfile(att.uuid).read(), content.encode())
+        size = {key: os.path.getsize(att.archive_path) for key, att in sizes.items()}
+        self.assertGreater(size[Compression.ZIP, 1], size[Compression.ZIP, 9])
+        self.assertGreater(size[Compression.XZ, 0], size[Compression.XZ, None])
+
+        ac_check = AttachmentCollection.open(self.NEW)
+        self.assertEqual(list(ac_check), list(sizes.values()))
+        self.assertEqual(ac_check.collection[0].compression_level, 1)
+
+        self.assertRaises(
+            DataFormatBadTypeError,
+            ac.new,
+            AttachmentTypes.FILE,
+            'x',
+            compression=Compression.BZIP2,
+            compression_level=0,
+        )
+        self.assertRaises(DataFormatBadTypeError, ac.new(AttachmentTypes.FILE, 'y').open_archive)
+
+    def test_optional_codecs(self):
+        for compression in (Compression.ZSTD, Compression.LZ4):
+            ac = AttachmentCollection.create(self.NEW)
+            if not compression.codec.available:
+                self.assertRaises(DataFormatBadTypeError, ac.new, AttachmentTypes.FILE, 'x', compression=compression)
+            else:
+                att = ac.new(AttachmentTypes.DIRECTORY, 'dir', compression=compression, compression_level=3)
+                shutil.copytree(self.EXIST, att.path.full_path)
+                ac.save()
+                self.assertTrue(att.archive_path.endswith(f'.tar.{compression.value}'))
+                with att.open_archive() as tf:
+                    names = {member.name for member in tf}
+                self.assertIn(f'{att.uuid}/attachments.xml', names)
+            shutil.rmtree(self.NEW)
+            os.mkdir(self.NEW)
+
+    def test_writer(self):
+        ac = AttachmentCollection.create(self.NEW)
+        att1 = ac.new(AttachmentTypes.COMMAND, 'dmesg', compression=Compression.XZ)
+        with att1.open_writer() as writer:
+            for i in range(100):
+                writer.write(f'line {i}\n'.encode())
+        att2 = ac.new(AttachmentTypes.DIRECTORY, 'sosreport', compression=Compression.ZIP)
+        big = os.urandom(1024 * 1024)
+        with att2.open_writer(spool_size=4) as writer:
+            with writer.open('var/log/messages', size=5) as member:
+                member.write(b'hello')
+            with writer.open('var/log/big', size=len(big)) as member:
+                member.write(big)
+                # content of declared size is streamed into the archive, not spooled
+                self.assertGreater(os.path.getsize(writer._tmp_archive), len(big) // 2)
+            with writer.open('var/log/boot.log') as member:
+                member.write(b'spooled content')
+            writer.add(os.path.join(self.EXIST, 'attachments.xml'), 'attachments.xml')
+        ac.save()
+
+        # nothing is written uncompressed
+        self.assertFalse(os.path.exists(att1.path.full_path))
+        self.assertEqual(os.listdir(os.path.dirname(att2.archive_path)), [os.path.basename(att2.archive_path)])
+        with tarfile.open(att1.archive_path) as tf:
+            self.assertEqual(tf.getnames(), [att1.uuid])
+            self.assertEqual(tf.extractfile(att1.uuid).read(), ''.join(f'line {i}\n' for i in range(100)).encode())
+        with att2.open_archive() as tf:
+            names = [name[len(att2.uuid) :] for name in tf.getnames()]
+            self.assertEqual(
+                names,
+                ['', '/var', '/var/log', '/var/log/messages', '/var/log/big', '/var/log/boot.log', '/attachments.xml'],
+            )
+            self.assertEqual(tf.extractfile(f'{att2.uuid}/var/log/big').read(), big)
+            self.assertEqual(tf.extractfile(f'{att2.uuid}/var/log/boot.log').read(), b'spooled content')
+
+        # failed writer keeps the previous archive
+        with self.assertRaises(ValueError), att2.open_writer() as writer:
+            writer.open('short', size=10).write(b'abc')
+            writer.close()
+        with att2.open_archive() as tf:
+            self.assertIn(f'{att2.uuid}/var/log/messages', tf.getnames())
+        self.assertEqual(len(os.listdir(os.path.dirname(att2.archive_path))), 1)
+
+        with att1.open_writer() as writer:
+            writer.write(b'x')
+            self.assertRaises(DataFormatBadTypeError, writer.open, 'member')
+        self.assertRaises(DataFormatBadTypeError, ac.new(AttachmentTypes.FILE, 'raw').open_writer)
+        att3 = ac.new(AttachmentTypes.FILE, 'written', compression=Compression.ZIP)
+        att3.path.write('uncompressed')
+        self.assertRaises(DataFormatFileExistsError, att3.open_writer)
+
+    def test_members(self):
+        ac = AttachmentCollection.create(self.NEW)
+        atts = [ac.new(AttachmentTypes.DIRECTORY, str(c), compression=c) for c in (Compression.NONE, Compression.XZ)]
+        for att in atts:
+            shutil.copytree(self.EXIST, att.path.full_path)
+        file_att = ac.new(AttachmentTypes.COMMAND, 'uname', compression=Compression.ZIP)
+        file_att.path.write('Linux\n')
+        ac.save()
+
+        expected = sorted(
+            os.path.relpath(os.path.join(root, file), self.EXIST).replace(os.sep, '/')
+            for root, _, files in os.walk(self.EXIST)
+            for file in files
+        )
+        meta = os.path.join(self.EXIST, 'attachments.xml')
+        for att in atts:
+            self.assertEqual(sorted(att.members()), expected)
+            with open(meta, 'rb') as f:
+                self.assertEqual(att.read_member('attachments.xml'), f.read())
+            with att.open_member(f'./{expected[-1]}') as f:
+                self.assertEqual(f.read(), att.read_member(expected[-1]))
+            self.assertRaises(DataFormatFileNotFoundError, att.open_member, 'missing')
+            self.assertRaises(DataFormatBadTypeError, att.open_member, '../attachments.xml')
+            self.assertRaises(DataFormatBadTypeError, att.open_member)
+
+        self.assertEqual(file_att.read_member(), b'Linux\n')
+        self.assertRaises(DataFormatBadTypeError, file_att.members)
+        self.assertRaises(DataFormatBadTypeError, file_att.read_member, 'file')
+
+    def test_deduplication(self):
+        store = ContentStore(os.path.join(self.TEST_DIR, 'cas'))
+        config = os.path.join(self.EXIST, 'attachments.xml')
+        ac1 = AttachmentCollection.create(self.NEW, content_store=store)
+        att1 = ac1.new(AttachmentTypes.FILE, 'config')
+        shutil.copy(config, att1.path.full_path)
+        att2 = ac1.new_from(self.EXIST, 'copy of package')
+        ac1.save()
+
+        # the same content is stored once and the store object is linked to attachments
+        digest = file_digest(config)
+        self.assertTrue(os.path.samefile(att1.path.full_path, store.object_path(digest)))
+        self.assertTrue(os.path.samefile(att1.path.full_path, os.path.join(att2.path.full_path, 'attachments.xml')))
+        self.assertFalse(os.access(att1.path.full_path, os.W_OK) and os.getuid())
+
+        # content already in the store is not copied by the next package
+        os.mkdir(os.path.join(self.TEST_DIR, 'ac3'))
+        self.addCleanup(shutil.rmtree, os.path.join(self.TEST_DIR, 'ac3'))
+        self.addCleanup(shutil.rmtree, store.root)
+        ac2 = AttachmentCollection.create(os.path.join(self.TEST_DIR, 'ac3'), content_store=store)
+        att3 = ac2.new_from(config, 'config')
+        self.assertEqual(os.stat(att3.path.full_path).st_nlink, 4)
+        self.assertEqual(att3.read_member(), att1.read_member())
+
+        # modification replaces the file, other links are kept
+        att3.path.write('changed')
+        self.assertEqual(att3.path.read(), 'changed')
+        self.assertEqual(att1.read_member(), att2.read_member('attachments.xml'))
+        self.assertTrue(os.stat(att3.path.full_path).st_mode & stat.S_IWUSR)
+        os.chmod(att3.path.full_path, 0o750)
+        att3.path.write('executable')
+        self.assertEqual(stat.S_IMODE(os.stat(att3.path.full_path).st_mode), 0o750)
+        self.assertEqual(os.listdir(os.path.dirname(att3.path.full_path)), [att3.uuid])
+
+        ac1_check = AttachmentCollection.open(self.NEW)
+        self.assertEqual(list(ac1_check), list(ac1))
+
+        compressed = ac2.new_from(self.EXIST, 'compressed', compression=Compression.ZIP)
+        self.assertFalse(os.path.exists(compressed.path.full_path))
+        self.assertEqual(compressed.members(), att2.members())
+
+    def test_deduplicate(self):
+        ac = AttachmentCollection.open(self.EXIST)
+        atts = [ac.new(AttachmentTypes.FILE, f'file {i}') for i in range(3)]
+        for att in atts:
+            att.path.write('same content')
+        series = ac.new(AttachmentTypes.SERIES, 'series')
+        ac.new(AttachmentTypes.SERIES, 'series 2')
+        ac.save()
+        self.assertEqual(os.stat(atts[0].path.full_path).st_nlink, 1)
+
+        self.assertGreater(ac.deduplicate(), len(atts))
+        self.assertTrue(all(os.path.samefile(atts[0].path.full_path, att.path.full_path) for att in atts))
+        self.assertEqual(os.stat(series.path.full_path).st_nlink, 1)
+        self.assertFalse(ac.modified)
+
+    def test_series(self):
+        ac = AttachmentCollection.create(self.NEW)
+        att = ac.new(AttachmentTypes.SERIES, 'iperf3 throughput', alias='throughput', typecode='q')
+        with att.series_writer() as writer:
+            writer.extend(range(10))
+            writer.append(10)
+        ac.save()
+
+        att_check = AttachmentCollection.open(self.NEW)['throughput']
+        self.assertEqual(att_check, att)
+        self.assertEqual(att_check.typecode, 'q')
+        with att_check.series_reader() as reader:
+            self.assertEqual(list(reader), list(range(11)))
+
+        self.assertRaises(DataFormatBadTypeError, ac.new, AttachmentTypes.SERIES, 'cpu', typecode='x')
+        self.assertRaises(DataFormatBadTypeError, ac.new, AttachmentTypes.SERIES, 'cpu', compression=Compression.XZ)
+        self.assertRaises(DataFormatBadTypeError, ac.new(AttachmentTypes.FILE, 'file').series_reader)
+        self.assertEqual(len(ac), 2)
+
+        # fields at their defaults are not written into metadata
+        series = ac.new(AttachmentTypes.SERIES, 'memory')
+        ac.new(AttachmentTypes.FILE, 'log', compression=Compression.XZ)
+        ac.save()
+        with open(os.path.join(self.NEW, AttachmentCollection.META_FILE)) as f:
+            meta = f.read()
+        self.assertEqual(meta.count('typecode='), 1)
+        self.assertNotIn('compression_level=', meta)
+        ac_check = AttachmentCollection.open(self.NEW)
+        self.assertEqual(ac_check.filter(typecode='d'), [series])
+        self.assertEqual(ac_check.by_uuid(series.uuid).typecode, 'd')
@@ -0,0 +1,98 @@
+import os
+import shutil
+from unittest import TestCase
+
+from nepta.dataformat import DataPackage, SectionCache
+from nepta.dataformat.section import Section
+from nepta.dataformat.xml_file import MetaXMLFile, XMLFile
+
+
+def dump_tree(sec):
+    return sec.name, list(sec.params.items()), [dump_tree(subsec) for subsec in sec.subsections]
+
+
+class SectionCacheTest(TestCase):
+    EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'examples')
+    TEST_DIR = 'tmp'
+    CACHE_DIR = os.path.join(TEST_DIR, 'cache')
+    PKG = os.path.join(TEST_DIR, 'pkg')
+    STORE = os.path.join(PKG, 'store.xml')
+    META = os.path.join(PKG, 'meta.xml')
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+        shutil.copytree(self.EXAMPLE_DIR, self.PKG)
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_sidecar(self):
+        cache = SectionCache()
+        self.assertIsNone(cache.load(self.STORE))
+
+        parsed = XMLFile.open(self.STORE, cache=cache)
+        self.assertTrue(os.path.exists(os.path.join(self.PKG, '.store.xml.cache')))
+
+        cached = cache.load(self.STORE, readonly=True)
+        self.assertIsNotNone(cached)
+        self.assertTrue(cached.readonly)
+        self.assertEqual(dump_tree(parsed.root), dump_tree(cached))
+        self.assertEqual(dump_tree(parsed.root), dump_tree(XMLFile.open(self.STORE, cache=cache).root))
+
+    def test_list_params(self):
+        cache = SectionCache(self.CACHE_DIR)
+        parsed = MetaXMLFile.open(self.META, cache=cache)
+        cached = MetaXMLFile.open(self.META, cache=cache)
+        self.assertEqual(list(parsed), list(cached))
+        self.assertEqual(cached['OtherHostNames'], ['struska1.com', 'struska2.com'])
+
+    def test_writable_after_readonly(self):
+        path = os.path.join(self.TEST_DIR, 'list.xml')
+        root = Section('root')
+        root.subsections.append(Section('list', value=['a', 'b']))
+        XMLFile(path, root).save()
+        cache = SectionCache(self.CACHE_DIR)
+        frozen = XMLFile.open(path, readonly=True, cache=cache)
+        self.assertEqual(frozen.root.subsections[0].params['value'], ('a', 'b'))
+
+        # tree cached by readonly open has to be writable when opened again
+        self.assertIsNotNone(cache.load(path))
+        xml = XMLFile.open(path, cache=cache)
+        values = xml.root.subsections[0].params['value']
+        values.append('c')
+        self.assertEqual(values, ['a', 'b', 'c'])
+        self.assertEqual(cache.load(path, readonly=True).subsections[0].params['value'], ('a', 'b'))
+
+    def test_stale(self):
+        cache = SectionCache(self.CACHE_DIR)
+        xml = XMLFile.open(self.STORE, cache=cache)
+        xml.root.subsections.append(Section('food', special='yes'))
+        xml.save()
+
+        self.assertIsNone(cache.load(self.STORE))
+        xml = XMLFile.open(self.STORE, cache=cache)
+        self.assertEqual(len(xml.root['food']), 6)
+        self.assertEqual(len(cache.load(self.STORE)['food']), 6)
+
+    def test_eviction(self):
+        cache = SectionCache(self.CACHE_DIR)
+        XMLFile.open(self.STORE, cache=cache)
+        XMLFile.open(self.META, cache=cache)
+        store_entry = cache.cache_path(self.STORE)
+        meta_entry = cache.cache_path(self.META)
+        os.utime(store_entry, (0, 0))
+
+        cache = SectionCache(self.CACHE_DIR, max_size=max(map(os.path.getsize, (store_entry, meta_entry))) + 1)
+        cache.evict()
+        self.assertIsNone(cache.load(self.STORE))
+        self.assertIsNotNone(cache.load(self.META))
+
+    def test_package(self):
+        cache = SectionCache(self.CACHE_DIR)
+        with DataPackage.open(self.PKG, readonly=True, cache=cache):
+            pass
+        self.assertEqual(len(os.listdir(self.CACHE_DIR)), 2)
+
+        with DataPackage.open(self.PKG, readonly=True, cache=cache) as p:
+            self.assertEqual(p.metas['Family'], 'RHEL7')
+            self.assertEqual(len(p.store.root['food']), 5)
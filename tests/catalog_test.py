@@ -0,0 +1,77 @@
+import os
+import shutil
+from unittest import TestCase
+
+from nepta.dataformat import AttachmentTypes, Compression, DataPackage
+from nepta.dataformat.catalog import Catalog
+from nepta.dataformat.exceptions import DataFormatBadTypeError
+
+
+class CatalogTest(TestCase):
+    TEST_DIR = 'tmp'
+    ROOT = os.path.join(TEST_DIR, 'results')
+    DB_PATH = os.path.join(TEST_DIR, 'catalog.db')
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+        self.paths = {}
+        for name, family, tag, packed in (
+            ('p1', 'RHEL9', 'X', False),
+            ('p2', 'RHEL9', 'Y', False),
+            ('p3', 'RHEL8', 'X', True),
+        ):
+            path = os.path.abspath(os.path.join(self.ROOT, 'runs', name))
+            with DataPackage.create(path, packed=packed) as p:
+                p.metas['Family'] = family
+                p.metas['SpecificTag'] = tag
+                p.attachments.new(AttachmentTypes.FILE, 'dmesg', 'dmesg').path.write('log')
+                if name == 'p2':
+                    p.attachments.new(AttachmentTypes.DIRECTORY, '/etc', 'etc', Compression.ZIP)
+            self.paths[name] = path
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_find(self):
+        with Catalog(self.DB_PATH) as catalog:
+            self.assertEqual(catalog.refresh(self.ROOT), (3, 0))
+            self.assertEqual(len(catalog), 3)
+            self.assertIn(self.paths['p1'], catalog)
+            self.assertEqual(catalog.find(Family='RHEL9'), [self.paths['p1'], self.paths['p2']])
+            self.assertEqual(catalog.find(Family='RHEL9', SpecificTag='X'), [self.paths['p1']])
+            self.assertEqual(catalog.find(SpecificTag='X'), [self.paths['p1'], self.paths['p3']])
+            self.assertEqual(catalog.find(Family='Fedora'), [])
+            self.assertEqual(catalog.find(attachment={'alias': 'etc', 'compression': 'gz'}), [self.paths['p2']])
+            self.assertEqual(catalog.find(attachment={'name': AttachmentTypes.FILE}), sorted(self.paths.values()))
+            self.assertEqual(catalog.find(root=os.path.join(self.ROOT, 'runs', 'p1')), [self.paths['p1']])
+            self.assertEqual(catalog.find(root=os.path.join(self.ROOT, 'run')), [])
+            self.assertRaises(DataFormatBadTypeError, catalog.find, attachment={'size': 1})
+
+            self.assertEqual(catalog.metas(self.paths['p3'])['SpecificTag'], 'X')
+            attachments = catalog.attachments(self.paths['p2'])
+            self.assertEqual([att['alias'] for att in attachments], ['dmesg', 'etc'])
+            self.assertEqual(attachments[0]['compression'], str(Compression.NONE))
+
+    def test_refresh(self):
+        with Catalog(self.DB_PATH) as catalog:
+            catalog.refresh(self.ROOT)
+            self.assertEqual(catalog.refresh(self.ROOT), (0, 0), 'Unchanged packages should not be indexed again')
+
+            with DataPackage.open(self.paths['p1']) as p:
+                p.metas['SpecificTag'] = 'Z'
+            os.utime(os.path.join(self.paths['p1'], 'meta.xml'), ns=(0, 4 * 10**18))
+            shutil.rmtree(self.paths['p2'])
+            os.makedirs(os.path.join(self.ROOT, 'broken'))
+            for name in DataPackage.PACKAGE_FILES:
+                with open(os.path.join(self.ROOT, 'broken', name), 'w') as f:
+                    f.write('<broken')
+            self.assertEqual(catalog.refresh(self.ROOT), (1, 1))
+
+        # catalog is persistent
+        with Catalog(self.DB_PATH) as catalog:
+            self.assertEqual(catalog.find(SpecificTag='Z'), [self.paths['p1']])
+            self.assertEqual(catalog.find(Family='RHEL9'), [self.paths['p1']])
+            self.assertNotIn(os.path.join(self.ROOT, 'broken'), catalog)
+            # refresh of subtree keeps packages outside of it
+            self.assertEqual(catalog.refresh(os.path.join(self.ROOT, 'runs', 'p1')), (0, 0))
+            self.assertEqual(len(catalog), 2)
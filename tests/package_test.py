@@ -1,9 +1,18 @@
 import os
 import shutil
+import tarfile
+import zipfile
 from unittest import TestCase
-
-from nepta.dataformat import AttachmentTypes, DataPackage, FileFlags
-from nepta.dataformat.exceptions import DataFormatReadOnlyExceptionError
+from unittest.mock import patch
+
+from nepta.dataformat import AttachmentTypes, Compression, DataPackage, FileFlags
+from nepta.dataformat.exceptions import (
+    DataFormatBadTypeError,
+    DataFormatFileNotFoundError,
+    DataFormatReadOnlyExceptionError,
+)
+from nepta.dataformat.package import PackageEntry
+from nepta.dataformat.packed import pack
 from nepta.dataformat.section import Section
 from nepta.dataformat.xml_file import MetaXMLFile, NullFile, XMLFile
 
@@ -171,6 +180,47 @@ class BasicPackageTests(TestCase):
             for attch in p1.attachments:
                 self.assertTrue(os.path.exists(os.path.join(self.OPEN_PATH, str(attch.path))))
 
+    def test_close_unmodified(self):
+        # unmodified files have to stay untouched, otherwise the comment would be lost
+        store_path = os.path.join(self.OPEN_PATH, 'store.xml')
+        with open(store_path, 'a') as f:
+            f.write('<!-- original -->')
+
+        with DataPackage.open(self.OPEN_PATH) as p:
+            self.assertFalse(p.store.modified)
+            p.metas['Family'] = 'RHEL9'
+            att = p.attachments.new(AttachmentTypes.FILE, 'new file')
+            att.path.write('content')
+            self.assertTrue(p.modified)
+
+        with open(store_path) as f:
+            self.assertIn('<!-- original -->', f.read())
+
+        with DataPackage.open(self.OPEN_PATH) as p:
+            self.assertEqual(p.metas['Family'], 'RHEL9')
+            self.assertFalse(p.modified)
+            p.store.root.subsections.append(Section('food'))
+
+        with open(store_path) as f:
+            self.assertNotIn('<!-- original -->', f.read())
+
+    def test_close_compresses_reopened(self):
+        with DataPackage.create(self.CREATE_PATH) as p:
+            p.attachments.new(AttachmentTypes.FILE, 'log', compression=Compression.ZIP)
+
+        with DataPackage.open(self.CREATE_PATH) as p:
+            self.assertFalse(p.attachments.modified)
+            att = next(iter(p.attachments))
+            att.path.write('content')
+            # content written after reopening has to be compressed by close
+            self.assertTrue(p.attachments.modified)
+
+        with DataPackage.open(self.CREATE_PATH) as p:
+            att = next(iter(p.attachments))
+            self.assertFalse(p.attachments.modified)
+            self.assertFalse(os.path.exists(att.path.full_path))
+            self.assertTrue(os.path.exists(att.archive_path))
+
     def test_is_package(self):
         self.assertFalse(DataPackage.is_package('/etc/'))
         self.assertFalse(DataPackage.is_package(os.path.join(self.OPEN_PATH, 'attch.xml')))
@@ -190,6 +240,11 @@ class BasicPackageTests(TestCase):
             self.assertIsInstance(p.store, NullFile)
             self.assertIsInstance(p.attachments, NullFile)
 
+    def test_iter_store_sections(self):
+        with DataPackage.open(self.OPEN_PATH, FileFlags.META, readonly=True) as p:
+            prices = [sec.params for sec in p.iter_store_sections('food/price')]
+        self.assertEqual(len(prices), 5)
+
     def test_ro(self):
         p = DataPackage.open(self.OPEN_PATH, readonly=True)
         self.assertRaises(DataFormatReadOnlyExceptionError, p.__setattr__, 'store', None)
@@ -198,3 +253,107 @@ class BasicPackageTests(TestCase):
         self.assertRaises(DataFormatReadOnlyExceptionError, p.store.save)
         self.assertRaises(DataFormatReadOnlyExceptionError, p.attachments.new, AttachmentTypes.DIRECTORY, 'cat .')
         p.close()
+
+        # readonly flag of constructor is positional
+        p = DataPackage(self.OPEN_PATH, p.metas, p.store, p.attachments, p.remote_packages, True)
+        self.assertRaises(DataFormatReadOnlyExceptionError, p.__setattr__, 'store', None)
+
+    def test_open_remote_package(self):
+        with DataPackage.create(self.CREATE_PATH) as p:
+            rem_path = p.remote_packages.new('host1').path.full_path
+            os.rmdir(rem_path)
+            with DataPackage.create(rem_path) as rem:
+                rem.metas['Family'] = 'RHEL9'
+                rem.store.root.subsections.append(Section('food', label='Junky food'))
+                rem.attachments.new(AttachmentTypes.FILE, 'cat ~/.bashrc', 'bashrc')
+
+        with DataPackage.open(self.CREATE_PATH, readonly=True) as p:
+            with p.remote_packages.open_package('host1') as rem:
+                self.assertEqual(rem.metas['Family'], 'RHEL9')
+                self.assertEqual(rem.store.root.subsections[0].params['label'], 'Junky food')
+                self.assertEqual(rem.attachments['bashrc'].origin, 'cat ~/.bashrc')
+                self.assertEqual([sec.params['label'] for sec in rem.iter_store_sections('food')], ['Junky food'])
+                self.assertRaises(DataFormatReadOnlyExceptionError, rem.store.save)
+            self.assertRaises(DataFormatFileNotFoundError, p.remote_packages.open_package, 'host2')
+        self.assertFalse(os.path.exists(os.path.join(self.CREATE_PATH, 'remote_packages')))
+
+    def test_open_bundle(self):
+        bundles = {'top.tar': ('w', '.'), 'dir.tar.xz': ('w:xz', 'result'), 'dir.tgz': ('w:gz', 'result')}
+        for name, (mode, arcname) in bundles.items():
+            with tarfile.open(os.path.join(self.TEST_DIR, name), mode) as tf:
+                tf.add(self.OPEN_PATH, arcname)
+        with zipfile.ZipFile(os.path.join(self.TEST_DIR, 'dir.zip'), 'w') as zf:
+            for root, _, files in os.walk(self.OPEN_PATH):
+                for file in files:
+                    path = os.path.join(root, file)
+                    zf.write(path, os.path.join('result', os.path.relpath(path, self.OPEN_PATH)))
+        content = sorted(os.listdir(self.TEST_DIR))
+
+        with DataPackage.open(self.OPEN_PATH) as p:
+            metas = dict(p.metas)
+            prices = [dict(sec.params) for sec in p.iter_store_sections('food/price')]
+            attachments = [str(att.path) for att in p.attachments]
+
+        for name in (*bundles, 'dir.zip'):
+            path = os.path.join(self.TEST_DIR, name)
+            self.assertTrue(DataPackage.is_package(path))
+            with DataPackage.open(path) as p:
+                self.assertEqual(dict(p.metas), metas)
+                self.assertEqual([dict(sec.params) for sec in p.iter_store_sections('food/price')], prices)
+                self.assertEqual([str(att.path) for att in p.attachments], attachments)
+                self.assertTrue(all(p.fs.exists(att.path.full_path) for att in p.attachments))
+                self.assertRaises(DataFormatReadOnlyExceptionError, p.store.save)
+        self.assertEqual(sorted(os.listdir(self.TEST_DIR)), content, 'Bundles should not be extracted')
+
+        with tarfile.open(os.path.join(self.TEST_DIR, 'two.tar'), 'w') as tf:
+            tf.add(self.OPEN_PATH, 'result1')
+            tf.add(self.OPEN_PATH, 'result2')
+        self.assertFalse(DataPackage.is_package(os.path.join(self.TEST_DIR, 'two.tar')))
+        self.assertRaises(DataFormatFileNotFoundError, DataPackage.open, os.path.join(self.TEST_DIR, 'two.tar'))
+
+        # e.g. library of codec of bundle is not installed
+        path = os.path.join(self.TEST_DIR, 'dir.tar.xz')
+        with patch.object(DataPackage, '_bundle_fs', side_effect=DataFormatBadTypeError('lzma is not available')):
+            self.assertFalse(DataPackage.is_package(path))
+            self.assertRaises(DataFormatFileNotFoundError, DataPackage.open, path)
+
+        # corrupt or truncated archives
+        with open(os.path.join(self.TEST_DIR, 'dir.tgz'), 'rb') as f:
+            tgz = f.read()
+        junk = {'junk.zip': b'junk' * 100, 'junk.tar': b'junk' * 100, 'truncated.tgz': tgz[: len(tgz) // 2]}
+        for name, data in junk.items():
+            path = os.path.join(self.TEST_DIR, name)
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.assertFalse(DataPackage.is_package(path))
+            self.assertRaises(DataFormatFileNotFoundError, DataPackage.open, path)
+
+    def test_discover(self):
+        root = os.path.join(self.TEST_DIR, 'results')
+        paths = [os.path.join(root, *parts) for parts in (('a', 'b', 'p1'), ('a', 'p2'), ('p3',), ('.hidden', 'p4'))]
+        for path in paths:
+            shutil.copytree(self.EXAMPLE_DIR, path)
+        os.makedirs(os.path.join(root, 'empty', 'dir'))
+        with open(os.path.join(root, 'a', 'meta.xml'), 'w') as f:
+            f.write('<root/>')
+        pack(paths[2], os.path.join(root, 'a', 'p5.pkg'))
+
+        self.assertEqual(list(DataPackage.discover(root)), [PackageEntry(path) for path in paths[:3]])
+        self.assertEqual(
+            list(DataPackage.discover(root, packed=True)),
+            [PackageEntry(os.path.join(root, 'a', 'p5.pkg'), True)] + [PackageEntry(path) for path in paths[:3]],
+        )
+        self.assertEqual(
+            sorted(DataPackage.discover(root, max_workers=4, packed=True), key=lambda entry: entry.path),
+            sorted(DataPackage.discover(root, packed=True), key=lambda entry: entry.path),
+        )
+        self.assertEqual(list(DataPackage.discover(paths[0])), [PackageEntry(paths[0])])
+        self.assertEqual(list(DataPackage.discover(os.path.join(root, 'missing'))), [])
+
+        packages = DataPackage.discover(root, max_workers=4)
+        entry = next(packages)
+        packages.close()
+        with entry.open() as p:
+            self.assertEqual(p.metas['Family'], 'RHEL7')
+        os.utime(os.path.join(entry.path, 'store.xml'), ns=(0, 4 * 10**18))
+        self.assertEqual(entry.mtime_ns(), 4 * 10**18)
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import struct
+from unittest import TestCase
+
+from nepta.dataformat import AttachmentTypes, DataPackage
+from nepta.dataformat.exceptions import (
+    DataFormatBadTypeError,
+    DataFormatFileExistsError,
+    DataFormatFileNotFoundError,
+    DataFormatReadOnlyExceptionError,
+)
+from nepta.dataformat.packed import MAGIC, PackedFile, is_packed, pack, unpack
+from nepta.dataformat.section import Section
+
+
+class PackedTest(TestCase):
+    EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'examples')
+    TEST_DIR = 'tmp'
+    SRC_DIR = os.path.join(TEST_DIR, 'src')
+    PACKED = os.path.join(TEST_DIR, 'pkg.packed')
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def _tree(self, directory):
+        tree = {}
+        for root, dirs, files in os.walk(directory):
+            for name in dirs + files:
+                path = os.path.join(root, name)
+                st = os.lstat(path)
+                rel_path = os.path.relpath(path, directory)
+                if os.path.islink(path):
+                    tree[rel_path] = ('link', os.readlink(path))
+                elif os.path.isdir(path):
+                    tree[rel_path] = ('dir', st.st_mode, int(st.st_mtime))
+                else:
+                    with open(path, 'rb') as f:
+                        tree[rel_path] = ('file', st.st_mode, int(st.st_mtime), f.read())
+        return tree
+
+    def test_roundtrip(self):
+        os.makedirs(os.path.join(self.SRC_DIR, 'sub', 'empty'))
+        with open(os.path.join(self.SRC_DIR, 'sub', 'a.txt'), 'wb') as f:
+            f.write(b'a' * 1000)
+        os.chmod(os.path.join(self.SRC_DIR, 'sub', 'a.txt'), 0o640)
+        os.link(os.path.join(self.SRC_DIR, 'sub', 'a.txt'), os.path.join(self.SRC_DIR, 'b.txt'))
+        os.symlink('sub/a.txt', os.path.join(self.SRC_DIR, 'c.txt'))
+        open(os.path.join(self.SRC_DIR, 'empty.txt'), 'w').close()
+        os.utime(os.path.join(self.SRC_DIR, 'sub'), (1000, 1000))
+
+        pack(self.SRC_DIR, self.PACKED)
+        self.assertTrue(is_packed(self.PACKED))
+        self.assertFalse(is_packed(os.path.join(self.SRC_DIR, 'b.txt')))
+        self.assertLess(os.path.getsize(self.PACKED), 2000, 'Hardlinked content should be stored once')
+
+        dst_dir = os.path.join(self.TEST_DIR, 'dst')
+        unpack(self.PACKED, dst_dir)
+        self.assertEqual(self._tree(self.SRC_DIR), self._tree(dst_dir))
+        self.assertTrue(os.path.samefile(os.path.join(dst_dir, 'b.txt'), os.path.join(dst_dir, 'sub', 'a.txt')))
+        self.assertRaises(DataFormatFileExistsError, unpack, self.PACKED, dst_dir)
+
+    def test_read(self):
+        os.makedirs(os.path.join(self.SRC_DIR, 'sub'))
+        content = bytes(range(256)) * 100
+        with open(os.path.join(self.SRC_DIR, 'sub', 'data'), 'wb') as f:
+            f.write(content)
+        pack(self.SRC_DIR, self.PACKED)
+
+        with PackedFile(self.PACKED) as packed:
+            self.assertEqual(packed.getnames(), ['sub', 'sub/data'])
+            self.assertEqual(packed.read('sub/data'), content)
+            with packed.open('sub/data') as f:
+                f.seek(1000)
+                self.assertEqual(f.read(10), content[1000:1010])
+                f.seek(-6, os.SEEK_END)
+                self.assertEqual(f.read(), content[-6:])
+            view = packed.view('sub/data')
+            self.assertEqual(view[256:512].tobytes(), bytes(range(256)))
+            view.release()
+            self.assertRaises(DataFormatFileNotFoundError, packed.read, 'missing')
+            self.assertRaises(DataFormatBadTypeError, packed.read, 'sub')
+        self.assertRaises(DataFormatBadTypeError, PackedFile, os.path.join(self.SRC_DIR, 'sub', 'data'))
+
+    def _write_packed(self, toc, content=b''):
+        # packed file with arbitrary table of contents, header is magic, offset and size of the table
+        data = json.dumps(toc).encode()
+        with open(self.PACKED, 'wb') as f:
+            f.write(struct.pack('<8sQQ', MAGIC, 24 + len(content), len(data)))
+            f.write(content)
+            f.write(data)
+
+    def test_malicious(self):
+        outside = os.path.abspath(os.path.join(self.TEST_DIR, 'outside'))
+        os.mkdir(outside)
+        entry = {'mode': 0o644, 'mtime': 0}
+        pwned = dict(entry, name='x/pwned', type='file', offset=24, size=5)
+        tocs = [
+            [dict(entry, name='x', type='symlink', target=outside), pwned],
+            [dict(entry, name='x', type='symlink', target='../outside'), pwned],
+            [dict(entry, name='y', type='symlink', target='.'), dict(entry, name='x', type='symlink', target='y/..')],
+            [dict(pwned, name='../outside/pwned')],
+            [dict(pwned, name='/pwned')],
+            [dict(entry, name='pwned', type='link', target='../outside/file')],
+        ]
+        for i, toc in enumerate(tocs):
+            self._write_packed(toc, b'pwned')
+            dst_dir = os.path.join(self.TEST_DIR, f'dst{i}')
+            self.assertRaises(DataFormatBadTypeError, unpack, self.PACKED, dst_dir)
+            self.assertEqual(os.listdir(outside), [])
+            self.assertFalse(any(os.path.islink(os.path.join(dst_dir, name)) for name in os.listdir(dst_dir)))
+
+        # symlink already present in the directory is not followed
+        dst_dir = os.path.join(self.TEST_DIR, 'dst')
+        os.mkdir(dst_dir)
+        os.symlink(outside, os.path.join(dst_dir, 'x'))
+        self._write_packed([pwned], b'pwned')
+        with PackedFile(self.PACKED) as packed:
+            self.assertRaises(DataFormatBadTypeError, packed.extractall, dst_dir)
+        self.assertEqual(os.listdir(outside), [])
+
+    def test_package(self):
+        with DataPackage.create(self.PACKED, packed=True) as p:
+            p.metas['Family'] = 'RHEL9'
+            p.store.root.subsections.append(Section('food', label='Junky food'))
+            att = p.attachments.new(AttachmentTypes.FILE, 'cat ~/.bashrc', 'bashrc')
+            att.path.write('content')
+        self.assertRaises(DataFormatFileExistsError, DataPackage.create, self.PACKED, packed=True)
+        self.assertEqual(os.listdir(self.TEST_DIR), ['pkg.packed'], 'Working directory should be removed')
+        self.assertTrue(DataPackage.is_package(self.PACKED))
+
+        with DataPackage.open(self.PACKED, readonly=True) as p:
+            self.assertEqual(p.metas['Family'], 'RHEL9')
+            self.assertEqual(p.store.root.subsections[0].params['label'], 'Junky food')
+            att = p.attachments['bashrc']
+            with p.fs.open(att.path.full_path) as f:
+                self.assertEqual(f.read(), 'content')
+            self.assertRaises(DataFormatReadOnlyExceptionError, p.store.save)
+        self.assertEqual(os.listdir(self.TEST_DIR), ['pkg.packed'])
+
+        os.utime(self.PACKED, (0, 0))
+        with DataPackage.open(self.PACKED) as p:
+            self.assertEqual(p.metas['Family'], 'RHEL9')
+        self.assertEqual(os.path.getmtime(self.PACKED), 0, 'Unmodified package should not be packed again')
+
+        with DataPackage.open(self.PACKED) as p:
+            p.metas['Family'] = 'Fedora'
+        self.assertEqual(os.listdir(self.TEST_DIR), ['pkg.packed'])
+        with DataPackage.open(self.PACKED, readonly=True) as p:
+            self.assertEqual(p.metas['Family'], 'Fedora')
+            self.assertEqual(len(p.attachments), 1)
+
+    def test_convert(self):
+        open_path = os.path.join(self.TEST_DIR, 'example')
+        shutil.copytree(self.EXAMPLE_DIR, open_path)
+        pack(open_path, self.PACKED)
+        with DataPackage.open(open_path, readonly=True) as p1, DataPackage.open(self.PACKED, readonly=True) as p2:
+            self.assertEqual(dict(p1.metas), dict(p2.metas))
+            self.assertEqual(
+                [dict(sec.params) for sec in p1.iter_store_sections('food/price')],
+                [dict(sec.params) for sec in p2.iter_store_sections('food/price')],
+            )
+            self.assertEqual([att.uuid for att in p1.attachments], [att.uuid for att in p2.attachments])
+            self.assertEqual([rem.host for rem in p1.remote_packages], [rem.host for rem in p2.remote_packages])
@@ -0,0 +1,90 @@
+import os
+import shutil
+from unittest import TestCase
+
+from nepta.dataformat.exceptions import DataFormatQueryError
+from nepta.dataformat.query import Query, compile_query
+from nepta.dataformat.section import Section
+from nepta.dataformat.xml_file import XMLFile
+
+
+class QueryTest(TestCase):
+    TEST_DIR = 'tmp'
+    PATH = os.path.join(TEST_DIR, 'store.xml')
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+        self.root = Section('root')
+        for test_name in ('tcp', 'udp'):
+            test = Section('test', {'name': test_name})
+            for host_name in ('a', 'b'):
+                host = Section('host', {'name': host_name})
+                for i in range(3):
+                    stream = Section('stream', id=i, proto=test_name)
+                    stream.subsections.append(Section('stream', id=f'{i}.nested'))
+                    host.subsections.append(stream)
+                test.subsections.append(host)
+            self.root.subsections.append(test)
+        self.root.subsections.append(Section('summary', result='pass'))
+
+        xml = XMLFile.create(self.PATH)
+        xml.root = self.root
+        xml.save()
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def check_query(self, expression, expected):
+        self.assertEqual([(sec.name, dict(sec.params)) for sec in self.root.find(expression)], expected)
+        streamed = XMLFile.iter_sections(self.PATH, expression)
+        self.assertEqual(
+            [(sec.name, {k: str(v) for k, v in sec.params.items()}) for sec in streamed],
+            [(name, {k: str(v) for k, v in params.items()}) for name, params in expected],
+        )
+
+    def test_steps(self):
+        self.check_query('summary', [('summary', {'result': 'pass'})])
+        self.check_query('/summary', [('summary', {'result': 'pass'})])
+        self.check_query('test/*', [('host', {'name': n}) for n in ('a', 'b', 'a', 'b')])
+        self.check_query('host', [])
+        self.assertEqual(len(list(self.root.find('*/*/stream'))), 12)
+
+    def test_predicates(self):
+        self.check_query('test[name=udp]/host[name="b"]/stream[id=1]', [('stream', {'id': 1, 'proto': 'udp'})])
+        self.check_query("*[result='pass']", [('summary', {'result': 'pass'})])
+        self.check_query('test[name!=tcp]', [('test', {'name': 'udp'})])
+        self.check_query('*[result]', [('summary', {'result': 'pass'})])
+        self.check_query('*[missing]', [])
+        self.check_query('test[name=tcp][name=udp]', [])
+
+    def test_descendant(self):
+        self.assertEqual(len(list(self.root.find('//stream'))), 24)
+        self.assertEqual(len(list(self.root.find('test//stream/stream'))), 12)
+        self.check_query(
+            'test[name=tcp]//stream[id=2]//*',
+            [('stream', {'id': '2.nested'}), ('stream', {'id': '2.nested'})],
+        )
+
+        # nested matches follow their ancestors in document order
+        self.check_query(
+            'test[name=udp]/host[name=a]//stream',
+            [
+                entry
+                for i in range(3)
+                for entry in (('stream', {'id': i, 'proto': 'udp'}), ('stream', {'id': f'{i}.nested'}))
+            ],
+        )
+
+    def test_first(self):
+        self.assertEqual(self.root.find_first('//stream[proto=udp]').params['id'], 0)
+        self.assertIsNone(self.root.find_first('//missing'))
+        self.assertEqual(compile_query('test').first(self.root).params['name'], 'tcp')
+
+    def test_compile(self):
+        self.assertIs(compile_query('test//stream'), compile_query('test//stream'))
+        query = Query('test[path="a/b]"]')
+        self.assertEqual(len(query.steps), 1)
+        self.assertEqual(query.steps[0].predicates[0].value, 'a/b]')
+
+        for expression in ('', 'test/', 'test///stream', 'test[name', 'test[name=tcp]x', '[name=tcp]'):
+            self.assertRaises(DataFormatQueryError, compile_query, expression)
@@ -1,7 +1,9 @@
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 
+from nepta.dataformat.exceptions import DataFormatCompressionError
 from nepta.dataformat.remote_package import RemotePackageCollection
 
 
@@ -48,3 +50,152 @@ class RemotePackageTest(TestCase):
         for rem_pkg in pkg2:
             self.assertIn(rem_pkg.host, hosts, 'Remote package meta: host is missing')
             self.assertTrue(os.path.exists(rem_pkg.path.full_path), 'Remote packages are not extracted correctly')
+
+    def test_save_unmodified(self):
+        pkg = RemotePackageCollection.create(self.PATH)
+        with open(os.path.join(pkg.new('host1').path.full_path, 'log'), 'w') as f:
+            f.write('log')
+        pkg.save()
+
+        tar_path = os.path.join(self.PATH, RemotePackageCollection.ARCHIVE_DIR, 'host1.tar.xz')
+        os.utime(tar_path, (0, 0))
+        pkg = RemotePackageCollection.open(self.PATH)
+        self.assertFalse(pkg.modified)
+        pkg.save()
+        self.assertEqual(os.path.getmtime(tar_path), 0, 'Unmodified archive should not be recreated')
+        self.assertFalse(os.path.exists(os.path.join(self.PATH, RemotePackageCollection.RMPKG_DIR)))
+
+        pkg = RemotePackageCollection.open(self.PATH)
+        with open(os.path.join(pkg.collection[0].path.full_path, 'log'), 'a') as f:
+            f.write('more logs')
+        self.assertTrue(pkg.modified)
+        pkg.save()
+        self.assertNotEqual(os.path.getmtime(tar_path), 0)
+
+        pkg = RemotePackageCollection.open(self.PATH)
+        with open(os.path.join(pkg.collection[0].path.full_path, 'log')) as f:
+            self.assertEqual(f.read(), 'logmore logs')
+
+    def test_incremental(self):
+        pkg = RemotePackageCollection.create(self.PATH)
+        for host in ('host1', 'host2', 'host3'):
+            with open(os.path.join(pkg.new(host).path.full_path, 'log'), 'w') as f:
+                f.write(host)
+        pkg.save()
+        archive_dir = os.path.join(self.PATH, RemotePackageCollection.ARCHIVE_DIR)
+        self.assertEqual(sorted(os.listdir(archive_dir)), ['host1.tar.xz', 'host2.tar.xz', 'host3.tar.xz'])
+        for name in os.listdir(archive_dir):
+            os.utime(os.path.join(archive_dir, name), (0, 0))
+
+        # nothing is extracted until a package is accessed
+        pkg = RemotePackageCollection.open(self.PATH)
+        self.assertFalse(os.path.exists(os.path.join(self.PATH, RemotePackageCollection.RMPKG_DIR)))
+        self.assertFalse(pkg.modified)
+        host2 = pkg.collection[1]
+        with open(os.path.join(host2.path.full_path, 'log'), 'a') as f:
+            f.write(' changed')
+        self.assertEqual(os.listdir(os.path.join(self.PATH, RemotePackageCollection.RMPKG_DIR)), ['host2'])
+        pkg.new('host4')
+        self.assertTrue(pkg.modified)
+        pkg.save()
+
+        # only changed and new packages are archived
+        mtimes = {name: os.path.getmtime(os.path.join(archive_dir, name)) for name in os.listdir(archive_dir)}
+        self.assertEqual(mtimes['host1.tar.xz'], 0)
+        self.assertEqual(mtimes['host3.tar.xz'], 0)
+        self.assertNotEqual(mtimes['host2.tar.xz'], 0)
+        self.assertIn('host4.tar.xz', mtimes)
+
+        pkg = RemotePackageCollection.open(self.PATH)
+        self.assertEqual([rem_pkg.host for rem_pkg in pkg], ['host1', 'host2', 'host3', 'host4'])
+        with open(os.path.join(pkg.collection[1].path.full_path, 'log')) as f:
+            self.assertEqual(f.read(), 'host2 changed')
+        pkg.save()
+
+        pkg = RemotePackageCollection.open(self.PATH, readonly=True)
+        self.assertEqual(len(list(pkg)), 4)
+        self.assertFalse(os.path.exists(os.path.join(self.PATH, RemotePackageCollection.RMPKG_DIR)))
+
+    def test_legacy_archive(self):
+        example_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'examples')
+        for name in (RemotePackageCollection.META_FILE, RemotePackageCollection.LEGACY_ARCHIVE):
+            shutil.copy(os.path.join(example_dir, name), self.PATH)
+        legacy = os.path.join(self.PATH, RemotePackageCollection.LEGACY_ARCHIVE)
+
+        pkg = RemotePackageCollection.open(self.PATH)
+        with open(os.path.join(pkg.collection[0].path.full_path, 'log')) as f:
+            self.assertEqual(f.read(), 'log\n')
+        self.assertFalse(pkg.modified)
+        pkg.save()
+        self.assertTrue(os.path.exists(legacy))
+
+        # the first change converts the package to per-host archives
+        pkg = RemotePackageCollection.open(self.PATH)
+        pkg.new('host')
+        pkg.save()
+        self.assertFalse(os.path.exists(legacy))
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.PATH, RemotePackageCollection.ARCHIVE_DIR))),
+            ['host.tar.xz', 'obrabec2.tar.xz', 'vales1.tar.xz', 'vales2.tar.xz'],
+        )
+        pkg = RemotePackageCollection.open(self.PATH)
+        for rem_pkg in pkg.collection[:3]:
+            self.assertTrue(os.path.exists(os.path.join(rem_pkg.path.full_path, 'log')))
+
+    def test_concurrent(self):
+        hosts = [f'host{i}' for i in range(6)]
+        paths = [os.path.join(self.PATH, f'pkg{i}') for i in range(3)]
+
+        def build(path):
+            os.mkdir(path)
+            pkg = RemotePackageCollection.create(path)
+            for host in hosts:
+                with open(os.path.join(pkg.new(host).path.full_path, 'log'), 'w') as f:
+                    f.write(f'{path} {host}')
+            pkg.save(max_workers=4)
+
+        cwd = os.getcwd()
+        with ThreadPoolExecutor(len(paths)) as executor:
+            list(executor.map(build, paths))
+        self.assertEqual(os.getcwd(), cwd)
+
+        for path in paths:
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(path, RemotePackageCollection.ARCHIVE_DIR))),
+                [f'{host}.tar.xz' for host in hosts],
+            )
+
+        # collection shared by threads extracts packages on access
+        pkg = RemotePackageCollection.open(paths[0])
+        with ThreadPoolExecutor(4) as executor:
+            rem_pkgs = list(executor.map(pkg.collection.__getitem__, [0, 1, 1, 2, 2, 2]))
+        for rem_pkg in rem_pkgs:
+            with open(os.path.join(rem_pkg.path.full_path, 'log')) as f:
+                self.assertEqual(f.read(), f'{paths[0]} {rem_pkg.host}')
+        self.assertEqual(pkg._extracted_hosts(), hosts[:3])
+        self.assertFalse(pkg.modified)
+
+        pkg.unarchive(max_workers=4)
+        self.assertEqual(pkg._extracted_hosts(), hosts)
+        self.assertFalse(pkg.modified)
+        with open(os.path.join(pkg.collection[5].path.full_path, 'log'), 'a') as f:
+            f.write(' changed')
+        pkg.save(max_workers=4)
+        self.assertFalse(os.path.exists(os.path.join(paths[0], RemotePackageCollection.RMPKG_DIR)))
+        self.assertEqual(RemotePackageCollection.open(paths[0])._changed_hosts(), [])
+
+    def test_archive_failure(self):
+        pkg = RemotePackageCollection.create(self.PATH)
+        for host in ('host1', 'host2'):
+            pkg.new(host)
+        os.makedirs(os.path.join(self.PATH, RemotePackageCollection.ARCHIVE_DIR, 'host2.tar.xz', 'blocker'))
+
+        with self.assertRaises(DataFormatCompressionError) as cm:
+            pkg.save(max_workers=2)
+        self.assertEqual(list(cm.exception.errors), ['host2'])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.PATH, RemotePackageCollection.ARCHIVE_DIR))),
+            ['host1.tar.xz', 'host2.tar.xz'],
+        )
+        # extracted packages are kept, so nothing is lost
+        self.assertEqual(pkg._extracted_hosts(), ['host1', 'host2'])
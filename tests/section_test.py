@@ -1,12 +1,23 @@
+import copy
+import math
 import os
+import pickle
 import shutil
-from unittest import TestCase
+from collections import OrderedDict
+from array import array
+from sys import intern
+from unittest import TestCase, skipIf
 
-from nepta.dataformat.exceptions import DataFormatReadOnlyExceptionError
-from nepta.dataformat.safe_types import DataFormatList, DataFormatOrderedDict
-from nepta.dataformat.section import Section, SectionCollection
+from nepta.dataformat.exceptions import DataFormatBadTypeError, DataFormatReadOnlyExceptionError
+from nepta.dataformat.safe_types import DataFormatList, DataFormatOrderedDict, FrozenParams
+from nepta.dataformat.section import FrozenSection, FrozenSectionCollection, Section, SectionCollection
 from nepta.dataformat.xml_file import XMLFile
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 class SectionTest(TestCase):
     EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'examples')
@@ -47,6 +58,144 @@ class SectionTest(TestCase):
         self.assertRaises(DataFormatReadOnlyExceptionError, Section.__setattr__, subsec, 'name', 'asdf')
         self.assertRaises(DataFormatReadOnlyExceptionError, Section.__setattr__, subsec, 'params', {})
 
+    def test_pickle_readonly(self):
+        root = XMLFile.open(self.EXIST).root
+        root.subsections[0].params['ports'] = [1, 2]
+        root.subsections.filter('nonexistent')
+        stack = [root]
+        while stack:
+            sec = stack.pop()
+            sec.readonly = True
+            stack.extend(sec.subsections)
+
+        for restored in (pickle.loads(pickle.dumps(root)), copy.deepcopy(root)):
+            self.assertEqual(restored.str_tree(), root.str_tree())
+            self.assertTrue(restored.readonly)
+            self.assertTrue(restored.modified)
+            self.assertIsInstance(restored.subsections[0].params, DataFormatOrderedDict)
+            self.assertRaises(DataFormatReadOnlyExceptionError, restored.subsections[0].params.pop, 'ports')
+            self.assertRaises(DataFormatReadOnlyExceptionError, restored.subsections.append, Section('new'))
+
+        params = copy.copy(root.subsections[0].params)
+        self.assertEqual(params, root.subsections[0].params)
+        self.assertRaises(DataFormatReadOnlyExceptionError, params.clear)
+        sections = pickle.loads(pickle.dumps(root.subsections.sections))
+        self.assertEqual([sec.str_tree() for sec in sections], [sec.str_tree() for sec in root.subsections])
+        self.assertRaises(DataFormatReadOnlyExceptionError, sections.pop)
+
+        restored = pickle.loads(pickle.dumps(XMLFile.open(self.EXIST).root))
+        self.assertFalse(restored.modified)
+        restored.subsections[0].params['key'] = 'value'
+        self.assertTrue(restored.modified)
+
+    def test_modified(self):
+        root = XMLFile.open(self.EXIST).root
+        self.assertFalse(root.modified)
+
+        subsec = root.subsections[0]
+        subsec.params['key'] = 'value'
+        self.assertTrue(subsec.modified)
+        self.assertTrue(root.modified)
+        root.reset_modified()
+        self.assertFalse(root.modified)
+
+        subsec.subsections.append(Section('new'))
+        self.assertTrue(root.modified)
+        root.reset_modified()
+
+        subsec.name = 'renamed'
+        self.assertTrue(root.modified)
+        root.reset_modified()
+
+        # plain dict assigned to params is tracked and saved as well
+        subsec.params = {'plain': 'dict'}
+        self.assertIsInstance(subsec.params, DataFormatOrderedDict)
+        self.assertTrue(root.modified)
+        xml = XMLFile(self.EXIST, root)
+        xml.save()
+        self.assertFalse(root.modified)
+        subsec.params['other'] = 'value'
+        self.assertTrue(root.modified)
+        self.assertEqual(XMLFile.open(self.EXIST).root.subsections[0].params['plain'], 'dict')
+
+        root.delete_subsections()
+        self.assertTrue(root.modified)
+
+        self.assertTrue(Section('new').modified)
+
+    def test_lazy_containers(self):
+        root = XMLFile.open(self.EXIST).root
+        leaf = root.subsections[0].subsections[0]
+        self.assertFalse(hasattr(leaf, '__dict__'))
+        self.assertIsNone(leaf._subsections)
+        self.assertEqual(list(leaf), [])
+        self.assertIsNone(leaf._subsections)
+        self.assertIs(leaf.name, intern(''.join(('Date', 'Time'))))
+
+        # empty containers are created on demand and they behave like regular ones
+        self.assertEqual(len(leaf.subsections), 0)
+        leaf.subsections.append(Section('new', key='value'))
+        self.assertEqual(leaf.subsections[0].params['key'], 'value')
+        self.assertTrue(root.modified)
+
+        root = XMLFile.open(self.EXIST, readonly=True).root
+        leaf = root.subsections[0].subsections[0]
+        self.assertRaises(DataFormatReadOnlyExceptionError, leaf.subsections.append, Section('new'))
+        self.assertFalse(root.modified)
+
+    def test_frozen(self):
+        root = XMLFile.open(self.EXIST, readonly=True).root
+        self.assertIsInstance(root, FrozenSection)
+        self.assertIsInstance(root.subsections, FrozenSectionCollection)
+        self.assertIsInstance(root.params, FrozenParams)
+        self.assertRaises(DataFormatReadOnlyExceptionError, root.subsections.append, Section('new'))
+        self.assertRaises(DataFormatReadOnlyExceptionError, root.params.update, {'key': 'value'})
+        self.assertRaises(DataFormatReadOnlyExceptionError, setattr, root, 'name', 'new')
+        self.assertRaises(DataFormatReadOnlyExceptionError, setattr, root, 'readonly', False)
+
+        # leaves share empty containers
+        leaves = [sec for sec in root.find('//*') if not len(sec.subsections)]
+        self.assertIs(leaves[0].subsections, leaves[-1].subsections)
+        self.assertEqual(root.subsections.filter('Settings')[0]['Family'][0].params['value'], 'RHEL7')
+        self.assertEqual(pickle.loads(pickle.dumps(root)).str_tree(), root.str_tree())
+
+        mutable = XMLFile.open(self.EXIST).root
+        frozen = mutable.freeze()
+        self.assertIs(frozen.freeze(), frozen)
+        self.assertEqual(frozen.str_tree(), root.str_tree())
+        mutable.subsections[0].params['key'] = 'value'
+        self.assertNotIn('key', frozen.subsections[0].params)
+        self.assertIsInstance(frozen.params, OrderedDict)
+        self.assertRaises(DataFormatReadOnlyExceptionError, frozen.subsections[0].params.move_to_end, 'key')
+        self.assertEqual(Section('stream', ports=[1, 2]).freeze().params['ports'], (1, 2))
+
+        # frozen subtree can be part of mutable tree
+        mutable.reset_modified()
+        mutable.subsections.append(root.subsections[0])
+        self.assertTrue(mutable.modified)
+        mutable.reset_modified()
+        self.assertFalse(mutable.modified)
+        self.assertIs(mutable.freeze().subsections[-1], root.subsections[0])
+
+    def test_typed(self):
+        sec = Section('stream', value='0.5', count='3', enabled='Yes', disabled='False')
+        self.assertEqual(sec.get_float('value'), 0.5)
+        self.assertEqual(sec.get_int('count'), 3)
+        self.assertIs(sec.get_bool('enabled'), True)
+        self.assertIs(sec.get_bool('disabled'), False)
+        self.assertIsNone(sec.get_int('missing'))
+        self.assertEqual(sec.get_typed('missing', int, 7), 7)
+        self.assertRaises(ValueError, sec.get_bool, 'value')
+
+        # cached conversion is invalidated by change of the param
+        self.assertEqual(sec.get_typed('count', lambda v: [v]), ['3'])
+        self.assertIs(sec.get_bool('enabled'), True)
+        sec.params['enabled'] = 'off'
+        self.assertIs(sec.get_bool('enabled'), False)
+
+        root = XMLFile.open(self.EXIST, readonly=True).root
+        self.assertEqual(root.find_first('//Family').get_typed('value', len), 5)
+
     def test_section_tree(self):
         xml1 = XMLFile.open(self.EXIST, readonly=True)
         print()
@@ -70,6 +219,104 @@ class SectionCollectionTest(TestCase):
     def tearDownClass(cls):
         shutil.rmtree(cls.TEST_DIR)
 
+    def test_filter_index(self):
+        col = SectionCollection()
+        for i in range(100):
+            col.append(Section('odd' if i % 2 else 'even', value=str(i), mod=str(i % 10), items=['a']))
+
+        def linear(name=None, **params):
+            return [
+                s
+                for s in col
+                if (name is None or s.name == name) and all(s.params.get(k, object()) == v for k, v in params.items())
+            ]
+
+        for name, params in [
+            ('odd', {}),
+            ('even', {'mod': '4'}),
+            ('odd', {'mod': '4'}),
+            (None, {'value': '42'}),
+            (None, {'mod': '3', 'value': '13'}),
+            ('missing', {}),
+            (None, {'items': ['a'], 'mod': '1'}),
+            (None, {'items': ['a']}),
+        ]:
+            self.assertEqual(list(col.filter(name, **params)), linear(name, **params))
+
+        # index is updated by append
+        col.append(Section('odd', value='101', mod='4'))
+        self.assertEqual(list(col.filter('odd', mod='4')), linear('odd', mod='4'))
+        self.assertEqual(col.filter('odd', mod='4')[-1].params['value'], '101')
+
+        # index is invalidated by change of any section
+        col[0].params['mod'] = '9'
+        col[1].name = 'even'
+        self.assertEqual(list(col.filter('even', mod='9')), linear('even', mod='9'))
+        self.assertEqual(col.filter('even', mod='9')[0], col[0])
+
+        # index is not invalidated by changes of other trees, also when filtered sections are appended to them
+        index = col._get_index()
+        other = Section('other')
+        for sec in col.filter('odd', mod='3'):
+            other.subsections.append(Section('copy', value=sec.params['value']))
+            other.subsections.append(sec)
+        self.assertIs(col._get_index(), index)
+
+        # sections shared by both trees invalidate indexes of both
+        other.subsections.extend_records('pad', [{}] * SectionCollection.INDEX_MIN_SIZE)
+        self.assertEqual(len(other.subsections.filter('odd', mod='3')), 10)
+        other.subsections.filter('odd')[0].params['mod'] = '0'
+        self.assertEqual(list(col.filter('odd', mod='3')), linear('odd', mod='3'))
+        self.assertEqual(len(other.subsections.filter('odd', mod='3')), 9)
+        col.sections[1].params = {'mod': '3'}
+        self.assertEqual(list(col.filter(mod='3')), linear(mod='3'))
+        col.sections.pop()
+        self.assertEqual(list(col.filter('odd')), linear('odd'))
+
+    def test_extend(self):
+        col = SectionCollection()
+        for i in range(20):
+            col.append(Section('old', value=str(i)))
+        col.filter('old')
+        col.reset_modified()
+
+        col.extend_records('stream', ({'id': i, 'unit': 'Mbps'} for i in range(3)))
+        col.extend_columns('stream', {'id': array('l', [3, 4]), 'unit': ['Gbps', 'Gbps']})
+        self.assertTrue(col.modified)
+        self.assertEqual(len(col), 25)
+        self.assertEqual(
+            [list(s.params.items()) for s in col.filter('stream', unit='Gbps')],
+            [[('id', 3), ('unit', 'Gbps')], [('id', 4), ('unit', 'Gbps')]],
+        )
+        self.assertEqual(col.filter('stream', id=1)[0].params['unit'], 'Mbps')
+        self.assertRaises(ValueError, col.extend_columns, 'stream', {'id': [1, 2], 'unit': ['Mbps']})
+
+        root = XMLFile.open(self.EXIST, readonly=True).root
+        self.assertRaises(DataFormatReadOnlyExceptionError, root.subsections.extend_records, 'stream', [{}])
+
+    def test_to_columns(self):
+        col = SectionCollection()
+        col.extend_records('stream', [{'id': str(i), 'value': f'{i}.5'} for i in range(3)])
+        col.append(Section('stream', id='3'))
+
+        columns = col.to_columns(['value'])
+        self.assertEqual(columns['value'][:3].tolist(), [0.5, 1.5, 2.5])
+        self.assertTrue(math.isnan(columns['value'][3]))
+        self.assertEqual(col.to_columns(['id'], typecode='q')['id'], array('q', [0, 1, 2, 3]))
+        self.assertRaises(ValueError, col.to_columns, ['value'], 'q')
+        self.assertRaises(DataFormatBadTypeError, col.to_columns, ['missing'], 'q')
+        self.assertEqual(col.to_columns(['missing'], 'l', default=-1)['missing'], array('l', [-1] * 4))
+
+        frozen = XMLFile.open(self.EXIST, readonly=True).root.subsections
+        self.assertEqual(len(frozen.to_columns(['value'])['value']), 5)
+
+    @skipIf(np is None, 'numpy is not installed')
+    def test_to_columns_numpy(self):
+        col = SectionCollection()
+        col.extend_columns('stream', {'value': ['1.0', '2.0', '4.0']})
+        self.assertEqual(col.to_columns(['value'], as_numpy=True)['value'].mean(), 7 / 3)
+        self.assertEqual(len(SectionCollection().to_columns(['value'], as_numpy=True)['value']), 0)
+
     def test_readonly(self):
         xml1 = XMLFile.open(self.EXIST, readonly=True)
         root_subs = xml1.root.subsections
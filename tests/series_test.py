@@ -0,0 +1,90 @@
+import os
+import shutil
+import struct
+from array import array
+from unittest import TestCase
+
+from nepta.dataformat.exceptions import DataFormatBadTypeError
+from nepta.dataformat.series import HEADER_SIZE, SeriesReader, SeriesWriter, create_series
+
+
+class SeriesTest(TestCase):
+    TEST_DIR = 'tmp'
+    PATH = os.path.join(TEST_DIR, 'samples')
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+        create_series(self.PATH, 'd')
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_empty(self):
+        with SeriesReader(self.PATH) as reader:
+            self.assertEqual(reader.typecode, 'd')
+            self.assertEqual(len(reader), 0)
+            self.assertEqual(reader.to_array(), array('d'))
+
+    def test_incremental(self):
+        writer = SeriesWriter(self.PATH, buffer_size=4)
+        writer.extend([0.5, 1.5, 2.5])
+        with SeriesReader(self.PATH) as reader:
+            self.assertEqual(len(reader), 0)
+
+        # flushed blocks are visible to new readers, the samples are memory mapped
+        writer.append(3.5)
+        writer.append(4.5)
+        with SeriesReader(self.PATH) as reader:
+            self.assertEqual(reader.values.tolist(), [0.5, 1.5, 2.5, 3.5])
+            self.assertEqual(reader[-1], 3.5)
+            self.assertIsNotNone(reader._mmap)
+
+        writer.close()
+        with SeriesReader(self.PATH) as reader:
+            self.assertEqual(reader.to_array(), array('d', [0.5, 1.5, 2.5, 3.5, 4.5]))
+
+    def test_incomplete_sample(self):
+        with SeriesWriter(self.PATH) as writer:
+            writer.extend([1.0, 2.0])
+        with open(self.PATH, 'ab') as f:
+            f.write(b'\x00\x01\x02')
+
+        with SeriesReader(self.PATH) as reader:
+            self.assertEqual(list(reader), [1.0, 2.0])
+        with SeriesWriter(self.PATH) as writer:
+            writer.append(3.0)
+        self.assertEqual(os.path.getsize(self.PATH), HEADER_SIZE + 3 * 8)
+        with SeriesReader(self.PATH) as reader:
+            self.assertEqual(list(reader), [1.0, 2.0, 3.0])
+
+    def test_foreign_byteorder(self):
+        samples = array('d', [1.0, 2.0])
+        samples.byteswap()
+        with open(self.PATH, 'r+b') as f:
+            header = bytearray(f.read(HEADER_SIZE))
+            header[7:8] = b'>' if header[7:8] == b'<' else b'<'
+            f.seek(0)
+            f.write(header)
+            f.write(samples)
+
+        with SeriesReader(self.PATH) as reader:
+            self.assertEqual(list(reader), [1.0, 2.0])
+        self.assertRaises(DataFormatBadTypeError, SeriesWriter, self.PATH)
+
+    def test_invalid(self):
+        self.assertRaises(DataFormatBadTypeError, create_series, self.PATH, 'u')
+        with open(self.PATH, 'wb') as f:
+            f.write(struct.pack('<4s12x', b'XXXX'))
+        self.assertRaises(DataFormatBadTypeError, SeriesReader, self.PATH)
+        self.assertRaises(DataFormatBadTypeError, SeriesWriter, self.PATH)
+
+    def test_foreign_itemsize(self):
+        # item size differs from this platform, e.g. 'l' series created on platform with 8 bytes long
+        with open(self.PATH, 'r+b') as f:
+            header = bytearray(f.read(HEADER_SIZE))
+            header[6] = 4
+            f.seek(0)
+            f.write(header)
+            f.write(bytes(8))
+        self.assertRaises(DataFormatBadTypeError, SeriesReader, self.PATH)
+        self.assertRaises(DataFormatBadTypeError, SeriesWriter, self.PATH)
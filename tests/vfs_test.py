@@ -0,0 +1,96 @@
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+from unittest import TestCase
+
+from nepta.dataformat.exceptions import DataFormatFileNotFoundError, DataFormatReadOnlyExceptionError
+from nepta.dataformat.vfs import LOCAL_FS, TarFS, ZipFS, is_bundle, open_bundle
+
+
+class TarFSTest(TestCase):
+    TEST_DIR = 'tmp'
+    ARCHIVE = os.path.join(TEST_DIR, 'pkg.tar.gz')
+    MOUNT_POINT = os.path.join(TEST_DIR, 'pkg')
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+        with tarfile.open(self.ARCHIVE, 'w:gz') as tf:
+            for name, content in (('dir/a.txt', b'a'), ('dir/sub/b.txt', b'bb'), ('c.txt', b'ccc')):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tf.addfile(info, io.BytesIO(content))
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_tree(self):
+        fs = TarFS(self.ARCHIVE, self.MOUNT_POINT)
+        self.assertTrue(fs.isdir(self.MOUNT_POINT))
+        self.assertTrue(fs.isdir(os.path.join(self.MOUNT_POINT, 'dir', 'sub')))
+        self.assertTrue(fs.isfile(os.path.join(self.MOUNT_POINT, 'dir', 'a.txt')))
+        self.assertFalse(fs.isfile(os.path.join(self.MOUNT_POINT, 'dir')))
+        self.assertFalse(fs.exists(os.path.join(self.MOUNT_POINT, 'missing')))
+        self.assertFalse(fs.exists(os.path.join(self.TEST_DIR, 'c.txt')))
+        self.assertEqual(fs.listdir(self.MOUNT_POINT), ['c.txt', 'dir'])
+        self.assertEqual(fs.listdir(os.path.join(self.MOUNT_POINT, 'dir')), ['a.txt', 'sub'])
+        self.assertRaises(DataFormatFileNotFoundError, fs.listdir, os.path.join(self.MOUNT_POINT, 'c.txt'))
+
+    def test_open(self):
+        fs = TarFS(self.ARCHIVE, self.MOUNT_POINT)
+        with fs.open(os.path.join(self.MOUNT_POINT, 'dir', 'sub', 'b.txt')) as f:
+            self.assertEqual(f.read(), 'bb')
+        with fs.open(os.path.join(self.MOUNT_POINT, 'c.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'ccc')
+        self.assertRaises(DataFormatReadOnlyExceptionError, fs.open, os.path.join(self.MOUNT_POINT, 'c.txt'), 'w')
+        self.assertRaises(DataFormatFileNotFoundError, fs.read_bytes, os.path.join(self.TEST_DIR, 'c.txt'))
+        self.assertFalse(os.path.exists(self.MOUNT_POINT))
+
+    def test_cache(self):
+        fs = TarFS(self.ARCHIVE, self.MOUNT_POINT, cache_size=4)
+        a, b, c = (os.path.join(self.MOUNT_POINT, name) for name in ('dir/a.txt', 'dir/sub/b.txt', 'c.txt'))
+        self.assertIs(fs.read_bytes(a), fs.read_bytes(a))
+        fs.read_bytes(b)
+        fs.read_bytes(c)
+        self.assertEqual(list(fs._cache), ['c.txt'])
+        self.assertEqual(fs._cached_size, 3)
+
+    def test_local(self):
+        self.assertTrue(LOCAL_FS.writable)
+        self.assertTrue(LOCAL_FS.isfile(self.ARCHIVE))
+        self.assertEqual(LOCAL_FS.listdir(self.TEST_DIR), ['pkg.tar.gz'])
+
+    def test_stream(self):
+        fs = TarFS(self.ARCHIVE, self.MOUNT_POINT, cache_size=2)
+        with fs.open(os.path.join(self.MOUNT_POINT, 'c.txt'), 'rb') as f:
+            self.assertNotIsInstance(f, io.BytesIO, 'Files larger than cache should be streamed')
+            self.assertEqual(f.read(), b'ccc')
+        self.assertEqual(list(fs._cache), [])
+
+    def test_bundle(self):
+        zip_path = os.path.join(self.TEST_DIR, 'pkg.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr('top/dir/a.txt', 'a')
+            zf.writestr('top/b.txt', 'bb')
+            zf.writestr('other.txt', 'other')
+        self.assertTrue(is_bundle(zip_path))
+        self.assertTrue(is_bundle(self.ARCHIVE))
+        self.assertFalse(is_bundle(self.TEST_DIR))
+        for name in ('results.tar.backup', 'notes.tar.txt'):
+            # names containing '.tar.' without suffix of registered codec are not bundles
+            open(os.path.join(self.TEST_DIR, name), 'w').close()
+            self.assertFalse(is_bundle(os.path.join(self.TEST_DIR, name)))
+
+        fs = open_bundle(zip_path, 'top')
+        self.assertIsInstance(fs, ZipFS)
+        self.assertEqual(fs.listdir(zip_path), ['b.txt', 'dir'])
+        with fs.open(os.path.join(zip_path, 'dir', 'a.txt')) as f:
+            self.assertEqual(f.read(), 'a')
+        self.assertFalse(fs.exists(os.path.join(zip_path, 'other.txt')))
+        fs.close()
+
+        fs = open_bundle(self.ARCHIVE, 'dir')
+        self.assertIsInstance(fs, TarFS)
+        self.assertEqual(fs.listdir(self.ARCHIVE), ['a.txt', 'sub'])
+        self.assertEqual(fs.read_bytes(os.path.join(self.ARCHIVE, 'sub', 'b.txt')), b'bb')
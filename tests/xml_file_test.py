@@ -2,6 +2,7 @@ import operator
 import os
 import shutil
 from unittest import TestCase
+from unittest.mock import patch
 
 from nepta.dataformat import DataPackage, FileFlags
 from nepta.dataformat.exceptions import (
@@ -113,10 +114,98 @@ class XMLFileTest(TestCase):
         self.assertEqual(len(data_sec.subsections.filter(number='15.x')), 3)
         self.assertEqual(data_sec.subsections.filter(number='15.x')[0].name, 'test_temp')
 
+    def test_save_layout(self):
+        xml = XMLFile.create(self.NEW)
+        xml.root = Section('results', host='a&b')
+        xml.root.subsections.append(Section('hosts', value=['h1', 'h"2'], note='<x>'))
+        xml.root.subsections.append(Section('empty'))
+        test = Section('test', proto='tcp')
+        test.subsections.append(Section('stream', value=1.5))
+        xml.root.subsections.append(test)
+        xml.save()
+
+        with open(self.NEW) as f:
+            self.assertEqual(
+                f.read(),
+                '<?xml version="1.0" ?>\n'
+                '  <results host="a&amp;b">\n'
+                '    <hosts type="list" note="&lt;x&gt;">\n'
+                '      <item value="h1"/>\n'
+                '      <item value="h&quot;2"/>\n'
+                '    </hosts>\n'
+                '    <empty/>\n'
+                '    <test proto="tcp">\n'
+                '      <stream value="1.5"/>\n'
+                '    </test>\n'
+                '  </results>\n',
+            )
+        self.assertEqual(XMLFile.open(self.NEW).root['hosts'][0].params['value'], ['h1', 'h"2'])
+        os.remove(self.NEW)
+
+    def test_open_deep_tree(self):
+        depth = 5000
+        with open(self.NEW, 'w') as f:
+            f.write('<level>' * depth + '</level>' * depth)
+
+        sec = XMLFile.open(self.NEW).root
+        for _ in range(depth - 1):
+            self.assertEqual(len(sec.subsections), 1)
+            sec = sec.subsections[0]
+        self.assertEqual(sec.name, 'level')
+        self.assertEqual(len(sec.subsections), 0)
+        os.remove(self.NEW)
+
+    def test_iter_sections(self):
+        foods = list(XMLFile.iter_sections(self.EXIST))
+        self.assertEqual(len(foods), 5)
+        for food in foods:
+            self.assertEqual(food.name, 'food')
+            self.assertTrue(food.readonly)
+            self.assertEqual(len(food.subsections), 4)
+
+        names = list(XMLFile.iter_sections(self.EXIST, 'food/name'))
+        self.assertEqual(len(names), 5)
+        self.assertTrue(all(sec.name == 'name' for sec in names))
+        self.assertEqual(len(list(XMLFile.iter_sections(self.EXIST, '*/price'))), 5)
+        self.assertEqual(len(list(XMLFile.iter_sections(self.EXIST, 'food/missing'))), 0)
+        self.assertEqual(len(list(XMLFile.iter_sections(self.EXIST, lambda path: path[-1:] == ('calories',)))), 5)
+
+        root = list(XMLFile.iter_sections(self.EXIST, lambda path: not path))
+        self.assertEqual(len(root), 1)
+        self.assertEqual(len(root[0].subsections), 5)
+
+    def test_iter_sections_list(self):
+        sec = next(XMLFile.iter_sections(os.path.join(self.EXAMPLE_DIR, 'meta.xml'), 'Settings/OtherHostNames'))
+        self.assertEqual(sec.params['value'], ('struska1.com', 'struska2.com'))
+        sec = next(XMLFile.iter_sections(os.path.join(self.EXAMPLE_DIR, 'meta.xml'), 'Settings/OtherHostNames', False))
+        self.assertEqual(sec.params['value'], ['struska1.com', 'struska2.com'])
+        self.assertEqual(len(list(XMLFile.iter_sections(os.path.join(self.EXAMPLE_DIR, 'meta.xml'), '*/*/*'))), 0)
+
+    def test_modified(self):
+        new_path = os.path.join(self.TEST_DIR, 's3.xml')
+        self.assertTrue(XMLFile.create(new_path).modified)
+        os.remove(new_path)
+
+        xml = XMLFile.open(self.EXIST)
+        self.assertFalse(xml.modified)
+        xml.root.subsections[0].params['discount'] = '10%'
+        self.assertTrue(xml.modified)
+        xml.save()
+        self.assertFalse(xml.modified)
+
+        xml.root = Section('new_root')
+        self.assertTrue(xml.modified)
+
     def test_exceptions(self):
+        self.assertRaises(DataFormatFileNotFoundError, XMLFile.iter_sections, 'asdfasdf')
         self.assertRaises(DataFormatFileNotFoundError, XMLFile.open, 'asdfasdf')
         self.assertRaises(DataFormatFileExistsError, XMLFile.create, self.EXIST)
 
+        # error of opening temporary file is not hidden by its cleanup
+        xml = XMLFile(self.NEW, Section('root'))
+        with patch('nepta.dataformat.xml_file.open', side_effect=PermissionError, create=True):
+            self.assertRaises(PermissionError, xml.save)
+
     def test_readonly(self):
         ro_xml = XMLFile.open(self.EXIST, readonly=True)
 
@@ -212,6 +301,16 @@ class MetaXMLFileTest(TestCase):
             self.assertRaises(DataFormatReadOnlyExceptionError, MetaXMLFile.save, m1)
             self.assertRaises(DataFormatReadOnlyExceptionError, MetaXMLFile.__setitem__, m1, 'asdf', 'asdf')
 
+    def test_modified(self):
+        m = MetaXMLFile.open(self.EXIST)
+        self.assertFalse(m.modified)
+        m['Family'] = 'RHEL9'
+        self.assertTrue(m.modified)
+        m.save()
+        self.assertFalse(m.modified)
+        m.update({'Area': 'net'})
+        self.assertTrue(m.modified)
+
     def test_dict_api(self):
         m = MetaXMLFile.open(self.NEW)
 